@@ -49,6 +49,29 @@ def create_app():
     limiter.init_app(app)
     db.init_app(app)
 
+    # ----- tenant scope: ทุก query ของตารางที่มี workspace_id ถูกกรองด้วย wsid ใน JWT -----
+    from services.tenant import init_tenant_scope
+    init_tenant_scope(app)
+
+    # ----- storage: STORAGE_MODE=per_workspace -> ข้อมูลแต่ละร้านแยกไฟล์ SQLite (ตารางกลางอยู่ใน DB หลัก) -----
+    from services.workspace_db import init_workspace_storage
+    init_workspace_storage(app)
+
+    # ----- response cache: GET ที่อ่านบ่อย (ช่องทาง / สินค้า / plan / platform) ลบตามแท็กหลัง commit ของฝั่งเขียน -----
+    from services.cache import init_cache
+    init_cache(app)
+
+    # ----- งานเบื้องหลังในโปรเซส: ตัด stock หมดอายุ / checkpoint / ปล่อยใบจองหมดอายุ / พยากรณ์ยอดขาย (debug reloader รันเฉพาะโปรเซสลูก) -----
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from services.expiry import start_expiry_scheduler
+        start_expiry_scheduler(app)
+        from services.checkpoint import start_checkpoint_scheduler
+        start_checkpoint_scheduler(app)
+        from services.reservation import start_reservation_sweeper
+        start_reservation_sweeper(app)
+        from services.forecast import start_forecast_scheduler
+        start_forecast_scheduler(app)
+
     # ----- register blueprints (อย่าใส่ url_prefix ถ้า endpoint ภายในขึ้นต้น /api/ อยู่แล้ว) -----
     from routes.product_routes import product_bp
     from routes.stockin_routes import stockin_bp
@@ -57,6 +80,8 @@ def create_app():
     from routes.platform_routes import platform_bp
     from routes.auth_routes import auth_bp
     from routes.workspace_routes import workspace_bp
+    from routes.transfer_routes import transfer_bp
+    from routes.reservation_routes import reservation_bp
     # (ภายหลังจะเพิ่ม auth_bp ตรงนี้)
     app.register_blueprint(product_bp)
     app.register_blueprint(stockin_bp)
@@ -65,6 +90,8 @@ def create_app():
     app.register_blueprint(platform_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(workspace_bp)
+    app.register_blueprint(transfer_bp)
+    app.register_blueprint(reservation_bp)
 
     # ----- CLI: init-db / seed / clear -----
     @app.cli.command("init-db")
@@ -87,6 +114,134 @@ def create_app():
         db.session.commit()
         click.echo("✅ Cleared Platforms & Tiers")
 
+    @app.cli.command("rebuild-stock-levels")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @with_appcontext
+    def rebuild_stock_levels_cmd(workspace_id):
+        from models import StockBatch
+        from services.stock_level import rebuild_stock_levels, refresh_stockin_locks
+        from services.tenant import use_workspace
+        with use_workspace(workspace_id):
+            n = rebuild_stock_levels(workspace_id)
+            # backfill StockIn.locked จากยอดล็อตปัจจุบัน
+            locks = refresh_stockin_locks(*([StockBatch.workspace_id == workspace_id] if workspace_id else []))
+        db.session.commit()
+        click.echo(f"✅ Rebuilt {n} stock level rows, refreshed {locks} stock-in locks")
+
+    @app.cli.command("sweep-expired")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @click.option("--date", "as_of", type=click.DateTime(formats=["%Y-%m-%d"]), required=False, help="วันที่อ้างอิง (default วันนี้)")
+    @with_appcontext
+    def sweep_expired_cmd(workspace_id, as_of):
+        from services.expiry import sweep_all_workspaces
+        results = sweep_all_workspaces(as_of.date() if as_of else None, workspace_id)
+        for wsid, r in results.items():
+            if "error" in r:
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+            elif r["batches"]:
+                click.echo(f"✅ workspace {wsid}: expired {r['batches']} batches ({r['units']} units)")
+        click.echo(f"✅ Swept {len(results)} workspaces")
+
+    @app.cli.command("stock-checkpoint")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @click.option("--period", type=click.Choice(["DAILY", "MONTHLY"], case_sensitive=False), default="DAILY", show_default=True)
+    @click.option("--date", "as_of", type=click.DateTime(formats=["%Y-%m-%d"]), required=False, help="เวลาตัด = เที่ยงคืน (UTC) ของวันนี้ (default รอบล่าสุด)")
+    @with_appcontext
+    def stock_checkpoint_cmd(workspace_id, period, as_of):
+        from services.checkpoint import checkpoint_all_workspaces
+        results = checkpoint_all_workspaces(period, as_of, workspace_id)
+        for wsid, r in results.items():
+            if "error" in r:
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+            else:
+                click.echo(f"✅ workspace {wsid}: checkpoint @ {r['as_of']} ({r['rows']} rows)")
+
+    @app.cli.command("release-reservations")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @with_appcontext
+    def release_reservations_cmd(workspace_id):
+        from services.reservation import release_expired_all_workspaces
+        results = release_expired_all_workspaces(workspace_id=workspace_id)
+        for wsid, r in results.items():
+            if "error" in r:
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+            else:
+                click.echo(f"✅ workspace {wsid}: released {r['reservations']} reservations ({r['units']} units)")
+        click.echo(f"✅ Released expired reservations in {len(results)} workspaces")
+
+    @app.cli.command("demand-forecast")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @click.option("--date", "as_of", type=click.DateTime(formats=["%Y-%m-%d"]), required=False, help="ใช้ยอดขายถึงวันก่อนหน้านี้ (default วันนี้)")
+    @with_appcontext
+    def demand_forecast_cmd(workspace_id, as_of):
+        from services.forecast import forecast_all_workspaces
+        results = forecast_all_workspaces(as_of.date() if as_of else None, workspace_id)
+        for wsid, r in results.items():
+            if "error" in r:
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+            else:
+                click.echo(f"✅ workspace {wsid}: {r['products']} products forecast, {r['to_reorder']} to reorder")
+
+    @app.cli.command("reconcile-ledger")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @click.option("--full", is_flag=True, help="ตรวจทุกล็อต (default เฉพาะ movement ใหม่กว่ารอบก่อน)")
+    @click.option("--repair", is_flag=True, help="ซ่อม qty_remaining ledger / stock_level ที่ไม่ตรง")
+    @with_appcontext
+    def reconcile_ledger_cmd(workspace_id, full, repair):
+        from services.reconcile import reconcile_all_workspaces
+        results = reconcile_all_workspaces(full, repair, workspace_id)
+        for wsid, r in results.items():
+            if "error" in r:
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+                continue
+            click.echo(
+                f"{'✅' if not r['unresolved'] else '⚠️'} workspace {wsid} ({r['mode']} #{r['from_movement_id']}..#{r['to_movement_id']}): "
+                f"{len(r['batch_mismatches'])} batch / {len(r['level_mismatches'])} level mismatches, "
+                f"repaired {r['repaired']['adjust_movements']} batches + {r['repaired']['levels']} levels, "
+                f"{r['unresolved']} unresolved"
+            )
+            for b in r["batch_mismatches"]:
+                click.echo(f"   batch {b['batch_id']} (product {b['product_id']}): remaining {b['remaining_drift']:+d}, "
+                           f"received {b['received_drift']:+d}, allocation {b['allocation_drift']:+d}")
+
+    @app.cli.command("snapshot-export")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @click.option("--full", is_flag=True, help="เขียน dataset ใหม่ทั้งหมด (default เพิ่มเฉพาะแถวใหม่กว่า watermark)")
+    @click.option("--format", "fmt", type=click.Choice(["parquet", "arrow"]), required=False, help="default SNAPSHOT_FORMAT")
+    @click.option("--table", "tables", multiple=True, help="เฉพาะตารางนี้ (ใส่ซ้ำได้)")
+    @with_appcontext
+    def snapshot_export_cmd(workspace_id, full, fmt, tables):
+        from services.snapshot import snapshot_all_workspaces
+        results = snapshot_all_workspaces(not full, fmt, workspace_id, tables or None)
+        for wsid, r in results.items():
+            if "error" in r:
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+                continue
+            for table, t in r.items():
+                click.echo(f"✅ workspace {wsid} {table} ({t['mode']}): +{t['rows']} rows -> {t['file'] or '-'} (total {t['rows_total']})")
+
+    @app.cli.command("rebuild-search-index")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @with_appcontext
+    def rebuild_search_index_cmd(workspace_id):
+        from services.search import rebuild_all_workspaces
+        for wsid, r in rebuild_all_workspaces(workspace_id).items():
+            if isinstance(r, dict):
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+            else:
+                click.echo(f"✅ workspace {wsid}: {r} products indexed")
+
+    @app.cli.command("rebuild-barcodes")
+    @click.option("--workspace", "workspace_id", type=int, required=False, help="เฉพาะร้านนี้ (optional)")
+    @with_appcontext
+    def rebuild_barcodes_cmd(workspace_id):
+        from services.barcode import rebuild_all_workspaces
+        for wsid, r in rebuild_all_workspaces(workspace_id).items():
+            if isinstance(r, dict):
+                click.echo(f"❌ workspace {wsid}: {r['error']}", err=True)
+            else:
+                click.echo(f"✅ workspace {wsid}: {r} barcodes")
+
     @app.cli.command("create-owner")
     @click.option("--email", required=True)
     @click.option("--username", required=True)
@@ -16,4 +16,49 @@ class Config:
 
 
     # CORS
-    FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")
\ No newline at end of file
+    FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")
+
+    # Storage: "shared" (ทุกร้านอยู่ไฟล์เดียว) | "per_workspace" (แยก SQLite ต่อร้าน, ตารางกลางอยู่ DB หลัก)
+    STORAGE_MODE = os.getenv("STORAGE_MODE", "shared")
+    WORKSPACE_DB_DIR = os.getenv("WORKSPACE_DB_DIR")  # ไม่ตั้ง -> <โฟลเดอร์ DB หลัก>/workspaces
+    WORKSPACE_ENGINE_CACHE_SIZE = int(os.getenv("WORKSPACE_ENGINE_CACHE_SIZE", 128))
+    WORKSPACE_ENGINE_IDLE_SECONDS = int(os.getenv("WORKSPACE_ENGINE_IDLE_SECONDS", 300))
+
+    # ตัดล็อตหมดอายุอัตโนมัติในโปรเซส (วินาที; 0 = ปิด -> ใช้ `flask sweep-expired` ผ่าน cron แทน)
+    EXPIRY_SWEEP_INTERVAL_SECONDS = int(os.getenv("EXPIRY_SWEEP_INTERVAL_SECONDS", 0))
+
+    # checkpoint ยอดคงเหลือ (ใช้ตอบ stock-as-of) : รอบ DAILY | MONTHLY ; interval 0 = ปิด -> ใช้ `flask stock-checkpoint` ผ่าน cron
+    STOCK_CHECKPOINT_PERIOD = os.getenv("STOCK_CHECKPOINT_PERIOD", "DAILY")
+    STOCK_CHECKPOINT_INTERVAL_SECONDS = int(os.getenv("STOCK_CHECKPOINT_INTERVAL_SECONDS", 0))
+
+    # ใบจองสต็อก (ออเดอร์ยังไม่จ่าย): อายุ default/สูงสุด + รอบปล่อยใบที่หมดอายุในโปรเซส (0 = ปิด -> ใช้ `flask release-reservations` ผ่าน cron)
+    RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", 1800))
+    RESERVATION_MAX_TTL_SECONDS = int(os.getenv("RESERVATION_MAX_TTL_SECONDS", 7 * 24 * 3600))
+    RESERVATION_SWEEP_INTERVAL_SECONDS = int(os.getenv("RESERVATION_SWEEP_INTERVAL_SECONDS", 0))
+
+    # ความเร็วการขาย (EWMA รายวัน) ใช้คำนวณ days_of_cover ใน StockAlert : ยิ่งสูงยิ่งเชื่อยอดวันล่าสุด
+    REORDER_VELOCITY_ALPHA = float(os.getenv("REORDER_VELOCITY_ALPHA", 0.2))
+
+    # พยากรณ์ความต้องการ (งาน batch ต้องมี numpy) : ประวัติย้อนหลัง / MA / smoothing / horizon / lead time / z ของ safety stock
+    FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", 365))
+    FORECAST_MA_DAYS = int(os.getenv("FORECAST_MA_DAYS", 28))
+    FORECAST_SMOOTHING_ALPHA = float(os.getenv("FORECAST_SMOOTHING_ALPHA", 0.1))
+    FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", 14))
+    FORECAST_LEAD_TIME_DAYS = int(os.getenv("FORECAST_LEAD_TIME_DAYS", 7))
+    FORECAST_SERVICE_Z = float(os.getenv("FORECAST_SERVICE_Z", 1.65))
+    FORECAST_INTERVAL_SECONDS = int(os.getenv("FORECAST_INTERVAL_SECONDS", 0))
+
+    # response cache: lru (ในโปรเซส) | sqlite (ไฟล์ร่วมหลาย worker ; invalidate เห็นทุก worker) | none
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru")
+    CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH")  # ไม่ตั้ง -> instance/response_cache.db
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 2048))
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024))   # เฉพาะ lru
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 300))
+
+    # snapshot Parquet / Arrow สำหรับงานวิเคราะห์ (ต้องมี pyarrow) : โฟลเดอร์ (ไม่ตั้ง -> instance/snapshots) / รูปแบบ / แถวต่อ row group
+    SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR")
+    SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "parquet")
+    SNAPSHOT_ROW_GROUP_SIZE = int(os.getenv("SNAPSHOT_ROW_GROUP_SIZE", 100000))
+
+    # ตารางบาร์โค้ด (สแกนขาย / รับเข้า) cache ในโปรเซส: จำนวนร้านสูงสุดที่เก็บ map ไว้
+    BARCODE_CACHE_WORKSPACES = int(os.getenv("BARCODE_CACHE_WORKSPACES", 64))
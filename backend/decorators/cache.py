@@ -0,0 +1,44 @@
+# decorators/cache.py
+from functools import wraps
+from flask import make_response, request
+from services.cache import cache_tag, get_cache
+from services.tenant import current_workspace_id
+
+
+def _cache_key(wsid) -> str:
+    # (ร้าน, endpoint, path params, query string เรียงแล้ว)
+    view_args = sorted((request.view_args or {}).items())
+    query = sorted(request.args.items(multi=True))
+    return f"{wsid if wsid is not None else '-'}|{request.endpoint}|{view_args}|{query}"
+
+
+# GET ที่อ่านบ่อยแต่เปลี่ยนน้อย: เก็บ response 200 ไว้ใน cache ตาม (ร้าน, route, args)
+#   tags = ชื่อกลุ่มข้อมูล (ยิงลบจาก invalidate_after_commit / bump_versions) ; ttl = วินาที (None = CACHE_DEFAULT_TTL)
+#   per_workspace=False -> ข้อมูลกลาง ไม่ผูกร้าน (เช่น platform tiers)
+def cached(*tags: str, ttl: float | None = None, per_workspace: bool = True):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            wsid = current_workspace_id() if per_workspace else None
+            if cache is None or (per_workspace and wsid is None):
+                return fn(*args, **kwargs)
+
+            key = _cache_key(wsid)
+            hit = cache.get(key)
+            if hit is not None:
+                status, mimetype, body = hit
+                resp = make_response(body, status)
+                resp.mimetype = mimetype
+                resp.headers["X-Cache"] = "HIT"
+                return resp
+
+            since = cache.generation
+            resp = make_response(fn(*args, **kwargs))
+            if resp.status_code == 200 and not resp.is_streamed:
+                cache.set(key, resp.status_code, resp.mimetype, resp.get_data(),
+                          ttl=ttl, tags=[cache_tag(wsid, t) for t in tags], since=since)
+                resp.headers["X-Cache"] = "MISS"
+            return resp
+        return wrapper
+    return deco
@@ -0,0 +1,30 @@
+# decorators/etag.py
+from functools import wraps
+from flask import make_response, request
+from services.tenant import current_workspace_id
+from services.versioning import current_versions, make_etag
+
+
+# GET ที่อ่านข้อมูลกลุ่ม resources: ส่ง ETag จากเลขเวอร์ชันของร้าน ; If-None-Match ตรง -> 304 (ไม่รัน query หลัก)
+def conditional_get(*resources: str):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            wsid = current_workspace_id()
+            if wsid is None:
+                return fn(*args, **kwargs)
+
+            # อ่านเวอร์ชันก่อนรัน view: มีเขียนแทรกระหว่างนั้น -> ETag เก่ากว่าข้อมูล (รอบหน้าได้ 200 ใหม่) ไม่ใช่กลับกัน
+            etag = make_etag(wsid, current_versions(wsid, resources))
+            if request.if_none_match.contains_weak(etag):
+                resp = make_response("", 304)
+            else:
+                resp = make_response(fn(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag, weak=True)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            resp.vary.add("Authorization")
+            return resp
+        return wrapper
+    return deco
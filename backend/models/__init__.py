@@ -1,19 +1,39 @@
 # models/__init__.py
-from ._base import db, TimestampMixin, IDMixin, StrEnum
+from ._base import db, TimestampMixin, IDMixin, StrEnum, TenantScoped
 from .user import User, Membership
 from .workspace import Workspace
 from .warehouse import Warehouse
 from .auth import RefreshToken
 from .product import Product, ProductVariant, ProductImage
-from .stock import StockBatch, StockInEntry, StockMovement, StockIn, StockTransfer, StockTransferItem
+from .stock import StockBatch, StockInEntry, StockMovement, StockIn, StockTransfer, StockTransferItem, StockLevel
 from .sale import Sale, SaleItem, SaleItemBatch
 from .channel import SalesChannel, Platform, PlatformTier
+from .sequence import DocSequence
+from .cogs import CogsEntry
+from .checkpoint import StockCheckpoint, StockCheckpointBalance
+from .reservation import StockReservation, StockReservationItem, StockReservationBatch
+from .reorder import ProductVelocity, StockAlert
+from .forecast import DemandForecast
+from .reconcile import LedgerReconcileState
+from .version import ResourceVersion
+from .snapshot import SnapshotWatermark
+from .barcode import ProductBarcode
 
 __all__ = [
-  "db","TimestampMixin","IDMixin","StrEnum",
+  "db","TimestampMixin","IDMixin","StrEnum","TenantScoped",
   "User","Membership","Workspace","RefreshToken","Warehouse",
   "Product","ProductVariant","ProductImage",
-  "StockIn","StockInEntry","StockBatch","StockMovement","StockTransfer", "StockTransferItem",
+  "StockIn","StockInEntry","StockBatch","StockMovement","StockTransfer", "StockTransferItem", "StockLevel",
   "Sale","SaleItem","SaleItemBatch",
-  "SalesChannel", "Platform", "PlatformTier"
+  "SalesChannel", "Platform", "PlatformTier",
+  "DocSequence",
+  "CogsEntry",
+  "StockCheckpoint", "StockCheckpointBalance",
+  "StockReservation", "StockReservationItem", "StockReservationBatch",
+  "ProductVelocity", "StockAlert",
+  "DemandForecast",
+  "LedgerReconcileState",
+  "ResourceVersion",
+  "SnapshotWatermark",
+  "ProductBarcode",
 ]
\ No newline at end of file
@@ -1,7 +1,9 @@
 # models/_base.py
 from __future__ import annotations
 from datetime import datetime, timezone
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy import MetaData
 
 # ชื่อ constraint/index ให้คงที่ (ดีต่อ migration)
@@ -13,7 +15,27 @@ NAMING_CONVENTION = {
     "pk": "pk_%(table_name)s",
 }
 
-db = SQLAlchemy(metadata=MetaData(naming_convention=NAMING_CONVENTION))
+
+class RoutingSession(Session):
+    """
+    Session ที่ให้ storage เลือก engine ได้ (STORAGE_MODE=per_workspace -> ตารางของร้านไปไฟล์ของร้านนั้น)
+    storage ลงทะเบียนไว้ที่ app.extensions["workspace_storage"] (services/workspace_db.py)
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            storage = current_app.extensions.get("workspace_storage")
+            if storage is not None:
+                engine = storage.engine_for(mapper, clause)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(
+    metadata=MetaData(naming_convention=NAMING_CONVENTION),
+    session_options={"class_": RoutingSession},
+)
 
 def utc_now():
     return datetime.now(timezone.utc)
@@ -25,6 +47,9 @@ class TimestampMixin:
 class IDMixin:
     id = db.Column(db.Integer, primary_key=True)
 
+class TenantScoped:
+    """marker: ตารางที่มี workspace_id -> query ใน request ถูกกรองด้วย wsid ของ JWT อัตโนมัติ (services/tenant.py)"""
+
 class StrEnum:
     ROLE = ("OWNER", "ADMIN", "STAFF")
     PLAN = ("FREE", "PRO", "ENTERPRISE")
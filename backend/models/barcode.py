@@ -0,0 +1,26 @@
+from sqlalchemy import Index
+from ._base import db, utc_now, TenantScoped
+
+
+# ตาราง lookup สำหรับสแกนบาร์โค้ด: code = Product.sku + ProductVariant.sku_suffix (ตัดช่องว่าง + ตัวพิมพ์ใหญ่)
+#   1 แถวต่อ variant ; เก็บ pack_size / ราคา / is_active ซ้ำไว้ -> สแกนแล้วตอบได้จาก index เดียวไม่ต้อง join
+#   สร้างใหม่ทุกครั้งที่สินค้า / variant ถูกเขียน (services/barcode.sync_barcodes)
+class ProductBarcode(TenantScoped, db.Model):
+    __tablename__ = "product_barcode"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    code         = db.Column(db.String(120), nullable=False)
+    product_id   = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False, index=True)
+    variant_id   = db.Column(db.Integer, db.ForeignKey("product_variant.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    pack_size     = db.Column(db.Integer, nullable=False)
+    selling_price = db.Column(db.Float, nullable=False)
+    is_active     = db.Column(db.Boolean, nullable=False, default=True)
+
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now, nullable=False)
+
+    __table_args__ = (
+        # ไม่ unique: sku "A-1"+"" กับ "A"+"-1" ได้ code เดียวกัน -> ไม่ให้การบันทึกสินค้าล้มเพราะบาร์โค้ดชน (ตอบ ambiguous แทน)
+        Index("ix_barcode_ws_code", "workspace_id", "code"),
+    )
@@ -1,8 +1,8 @@
 from sqlalchemy import UniqueConstraint, Index
-from ._base import db
+from ._base import db, TenantScoped
 
 # ตารางเก็บข้อมูลช่องทาง platform แสดงค่าค่าคอมมิชชั่น/การชำระเงินที่โดนหักจาก platform ต่างๆ
-class SalesChannel(db.Model): 
+class SalesChannel(TenantScoped, db.Model): 
     __tablename__ = 'sales_channel'
     workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"),nullable=False, index=True)
     default_warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id", ondelete="SET NULL"))
@@ -0,0 +1,45 @@
+from sqlalchemy import Index, UniqueConstraint
+from ._base import db, utc_now, TenantScoped
+
+
+# ภาพถ่ายยอดคงเหลือ ณ เวลาตัด (as_of) ของร้าน — ใช้ตอบ "ของเหลือเท่าไหร่ ณ วันที่ D"
+# โดยอ่าน checkpoint ล่าสุดที่ <= D แล้ว replay เฉพาะ StockMovement หลังจากนั้น (ไม่ต้องไล่ ledger ตั้งแต่ต้น)
+class StockCheckpoint(TenantScoped, db.Model):
+    __tablename__ = "stock_checkpoint"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+
+    period = db.Column(db.String(10), nullable=False, default="DAILY")   # DAILY / MONTHLY (รอบที่สร้าง)
+    as_of  = db.Column(db.DateTime, nullable=False)   # เวลาตัด (UTC) : รวม movement ที่ created_at < as_of
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=utc_now, nullable=False)
+
+    balances = db.relationship("StockCheckpointBalance", back_populates="checkpoint",
+                               cascade="all, delete-orphan", passive_deletes=True, lazy="dynamic")
+
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "as_of", name="uq_checkpoint_ws_as_of"),
+    )
+
+
+# ยอดต่อ (warehouse, product, batch) ของ checkpoint — เก็บเฉพาะแถวที่ยอด != 0
+class StockCheckpointBalance(TenantScoped, db.Model):
+    __tablename__ = "stock_checkpoint_balance"
+    id = db.Column(db.Integer, primary_key=True)
+
+    checkpoint_id = db.Column(db.Integer, db.ForeignKey("stock_checkpoint.id", ondelete="CASCADE"), nullable=False)
+    checkpoint = db.relationship("StockCheckpoint", back_populates="balances")
+
+    # ไม่มี FK ไป batch/product (ล็อตถูกลบได้ แต่ยอดในอดีตต้องอยู่)
+    workspace_id = db.Column(db.Integer, nullable=False)
+    warehouse_id = db.Column(db.Integer, nullable=False)
+    product_id   = db.Column(db.Integer, nullable=False)
+    batch_id     = db.Column(db.Integer)
+
+    qty = db.Column(db.Integer, nullable=False)   # base units ณ as_of
+
+    __table_args__ = (
+        Index("ix_ckbal_checkpoint_product", "checkpoint_id", "product_id"),
+    )
@@ -0,0 +1,35 @@
+from sqlalchemy import CheckConstraint, Index
+from ._base import db, utc_now, TenantScoped
+
+
+# สมุดต้นทุนขาย (COGS) แบบ append-only: 1 แถวต่อ 1 allocation (SaleItemBatch) ตอนขาย
+# ลบบิล -> เพิ่มแถว REVERSAL (ติดลบ) ไม่แก้/ลบแถวเดิม ; กำไรต่อบิล/ช่องทาง/วัน = SUM ตาม index
+class CogsEntry(TenantScoped, db.Model):
+    __tablename__ = "cogs_ledger"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    warehouse_id = db.Column(db.Integer, nullable=False)
+
+    # อ้างอิงแบบไม่มี FK (บิลถูกลบได้ แต่ประวัติต้นทุนต้องอยู่)
+    sale_id      = db.Column(db.Integer, nullable=False)
+    sale_item_id = db.Column(db.Integer)
+    channel_id   = db.Column(db.Integer, nullable=False)
+    product_id   = db.Column(db.Integer, nullable=False)
+    batch_id     = db.Column(db.Integer)
+
+    entry_type = db.Column(db.String(10), nullable=False, default="SALE")  # SALE / REVERSAL
+    sale_date  = db.Column(db.DateTime, nullable=False)                   # snapshot วันที่ขาย (ใช้ group รายวัน)
+
+    qty         = db.Column(db.Integer, nullable=False)   # base units (+ขาย / -คืน)
+    unit_cost   = db.Column(db.Float, nullable=False)     # ต้นทุน/หน่วยย่อย ของล็อตที่ตัดจริง (FEFO)
+    cost_amount = db.Column(db.Float, nullable=False)     # qty * unit_cost
+
+    created_at = db.Column(db.DateTime, default=utc_now, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("qty != 0", name="ck_cogs_qty_nonzero"),
+        Index("ix_cogs_ws_date", "workspace_id", "sale_date"),
+        Index("ix_cogs_ws_channel_date", "workspace_id", "channel_id", "sale_date"),
+        Index("ix_cogs_ws_sale", "workspace_id", "sale_id"),
+    )
@@ -0,0 +1,35 @@
+from sqlalchemy import Index, UniqueConstraint
+from ._base import db, utc_now, TenantScoped
+
+
+# ผลพยากรณ์ความต้องการต่อสินค้า (งาน batch `flask demand-forecast` เขียนทับทั้งร้านทุกรอบ) — UI อ่านอย่างเดียว
+# หน่วยทั้งหมดเป็น base units ; วันอ้างอิง UTC
+class DemandForecast(TenantScoped, db.Model):
+    __tablename__ = "demand_forecast"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    product_id   = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
+
+    generated_at = db.Column(db.DateTime, default=utc_now, nullable=False)
+    history_from = db.Column(db.Date, nullable=False)     # ช่วงยอดขายที่ใช้ fit [history_from, history_to]
+    history_to   = db.Column(db.Date, nullable=False)
+
+    moving_avg_daily = db.Column(db.Float, nullable=False, default=0.0)   # ค่าเฉลี่ย N วันล่าสุด
+    level_daily      = db.Column(db.Float, nullable=False, default=0.0)   # exponential smoothing
+    weekday_factors  = db.Column(db.Text)                                 # JSON [จ..อา] (1.0 = เท่าค่าเฉลี่ย)
+    forecast_daily   = db.Column(db.Text)                                 # JSON ยอดรายวัน horizon วันถัดไป
+
+    horizon_days   = db.Column(db.Integer, nullable=False)
+    forecast_units = db.Column(db.Float, nullable=False, default=0.0)     # รวมทั้ง horizon
+    safety_stock   = db.Column(db.Float, nullable=False, default=0.0)
+
+    lead_time_days = db.Column(db.Integer, nullable=False)
+    available      = db.Column(db.Integer, nullable=False, default=0)     # on_hand - reserved ตอนคำนวณ
+    suggested_reorder_point = db.Column(db.Integer, nullable=False, default=0)   # ยอดขายช่วง lead time + safety stock
+    suggested_reorder_qty   = db.Column(db.Integer, nullable=False, default=0)   # สั่งเพิ่มให้พอ lead time + horizon
+
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "product_id", name="uq_forecast_ws_product"),
+        Index("ix_forecast_ws_reorder", "workspace_id", "suggested_reorder_qty", "product_id"),   # รายการที่ต้องสั่งก่อน
+    )
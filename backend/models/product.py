@@ -1,8 +1,8 @@
-from sqlalchemy import UniqueConstraint
-from ._base import db, utc_now
+from sqlalchemy import Index, UniqueConstraint
+from ._base import db, utc_now, TenantScoped
   
 # ตารางเก็บข้อมูล Product แต่ละตัว
-class Product(db.Model):
+class Product(TenantScoped, db.Model):
     __tablename__ = "product" 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -12,6 +12,7 @@ class Product(db.Model):
     cost_price = db.Column(db.Float, nullable=False) #ราคาต้นทุนสินค้า
     stock = db.Column(db.Integer, default=0) #จำนวนคงเหลือรวม
     has_expire = db.Column(db.Boolean, default=False) #เป็นสินค้ามีวันหมดอายุไหม
+    reorder_point = db.Column(db.Integer) #จุดสั่งซื้อ (base units) ยอดพร้อมขายรวมทุกคลัง <= ค่านี้ -> StockAlert ; None = ไม่เตือน
     
     # Timestamp fields (timezone-aware)
     created_at = db.Column(db.DateTime, nullable=False, default=utc_now)
@@ -26,6 +27,7 @@ class Product(db.Model):
 
     __table_args__ = (
         UniqueConstraint("workspace_id", "sku", name="uq_product_ws_sku"),
+        Index("ix_product_ws_created", "workspace_id", "created_at", "id"),   # list + keyset pagination ต่อร้าน
     )
 
     @property
@@ -53,7 +55,7 @@ class Product(db.Model):
 class ProductVariant(db.Model):  
     __tablename__ = 'product_variant'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False) #Id ของ Product
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True) #Id ของ Product
     sale_mode = db.Column(db.String(50),  nullable=False)  # ชื่อรูปแบบการขาย (single, pack, box) 
     sku_suffix = db.Column(db.String(50), nullable=False)  # optional เช่น -P5, -P10
     pack_size = db.Column(db.Integer, nullable=False)# จำนวนหน่วยที่ขายในแต่ละรูปแบบ เช่น 5, 10  [จำนวนหน่วยย่อยต่อแพ็ค (ใช้ตอนขาย)]
@@ -74,7 +76,7 @@ class ProductVariant(db.Model):
 class ProductImage(db.Model):
     __tablename__ = 'product_image'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False) #Id ของ Product
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True) #Id ของ Product
     image_filename = db.Column(db.String(200), nullable=False)  # เช่น 'image1.jpg'
     alt_text = db.Column(db.String(100)) 
     is_main = db.Column(db.Boolean, default=False)  
\ No newline at end of file
@@ -0,0 +1,19 @@
+from sqlalchemy import UniqueConstraint
+from ._base import db, utc_now, TenantScoped
+
+
+# high-water mark ของงานกระทบยอด ledger ต่อร้าน: ล็อตที่มี movement id > last_movement_id เท่านั้นที่ต้องตรวจรอบถัดไป
+class LedgerReconcileState(TenantScoped, db.Model):
+    __tablename__ = "ledger_reconcile_state"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+
+    last_run_at     = db.Column(db.DateTime, default=utc_now, nullable=False)
+    last_full_at    = db.Column(db.DateTime)                       # รอบตรวจทั้งร้านล่าสุด
+    last_mismatches = db.Column(db.Integer, nullable=False, default=0)   # ที่ยังค้าง (ไม่ได้ซ่อม) ของรอบล่าสุด
+
+    __table_args__ = (
+        UniqueConstraint("workspace_id", name="uq_reconcile_state_ws"),
+    )
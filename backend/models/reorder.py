@@ -0,0 +1,50 @@
+from sqlalchemy import Index, UniqueConstraint, text
+from ._base import db, utc_now, TenantScoped
+
+
+# ความเร็วการขายต่อสินค้า (EWMA รายวัน, base units/วัน) — อัปเดตทีละเหตุการณ์ขาย ไม่ต้องไล่ StockMovement ย้อนหลัง
+#   day_units = ยอดขายของ last_day ที่ยังสะสมอยู่ ; ข้ามวัน -> ปิดวันเดิมเข้า ewma_daily แล้วเริ่มวันใหม่
+class ProductVelocity(TenantScoped, db.Model):
+    __tablename__ = "product_velocity"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    product_id   = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
+
+    ewma_daily = db.Column(db.Float, nullable=False, default=0.0)   # ถึงสิ้นวัน last_day - 1
+    last_day   = db.Column(db.Date)
+    day_units  = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "product_id", name="uq_velocity_ws_product"),
+    )
+
+
+# แจ้งเตือนสต็อกต่ำกว่าจุดสั่งซื้อ (Product.reorder_point) : เปิดเมื่อยอดพร้อมขายลง <= จุดสั่งซื้อ, ปิดเองเมื่อเติมกลับขึ้นไป
+class StockAlert(TenantScoped, db.Model):
+    __tablename__ = "stock_alert"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    product_id   = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
+
+    alert_type = db.Column(db.String(20), nullable=False, default="LOW_STOCK")
+    status     = db.Column(db.String(10), nullable=False, default="OPEN")   # OPEN / RESOLVED
+
+    # snapshot ตอนเปิด
+    reorder_point  = db.Column(db.Integer, nullable=False)
+    available      = db.Column(db.Integer, nullable=False)    # on_hand - reserved (ทุกคลัง)
+    velocity_daily = db.Column(db.Float)
+    days_of_cover  = db.Column(db.Float)                     # available / velocity (None = ยังไม่มียอดขาย)
+
+    created_at  = db.Column(db.DateTime, default=utc_now, nullable=False)
+    resolved_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # สินค้าหนึ่งมีแจ้งเตือนที่เปิดอยู่ได้ใบเดียว
+        Index("uq_alert_ws_product_open", "workspace_id", "product_id", "alert_type", unique=True,
+              sqlite_where=text("status = 'OPEN'"), postgresql_where=text("status = 'OPEN'")),
+        Index("ix_alert_ws_status_created", "workspace_id", "status", "created_at"),
+    )
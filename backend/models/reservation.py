@@ -0,0 +1,90 @@
+from sqlalchemy import CheckConstraint, Index, text
+from ._base import db, utc_now, TenantScoped
+
+
+# ใบจองสต็อก (soft allocation) ของออเดอร์ที่ยังไม่จ่าย: ล็อตถูกกันไว้ (StockBatch.qty_reserved) แต่ยังไม่ตัดจริง
+# ACTIVE -> CONFIRMED (กลายเป็น Sale ตามล็อตที่จองไว้ ไม่ re-plan) | RELEASED (ยกเลิก) | EXPIRED (เลย expires_at)
+class StockReservation(TenantScoped, db.Model):
+    __tablename__ = "stock_reservation"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id", ondelete="RESTRICT"), nullable=False)
+    channel_id   = db.Column(db.Integer, db.ForeignKey("sales_channel.id", ondelete="RESTRICT"), nullable=False)
+    external_order_id = db.Column(db.String(64))   # เลขออเดอร์ marketplace (ถ้ามี)
+
+    status     = db.Column(db.String(10), nullable=False, default="ACTIVE")   # ACTIVE/CONFIRMED/RELEASED/EXPIRED
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    # ข้อมูลหัวบิลที่รู้แล้วตอนจอง (ใช้สร้าง Sale ตอนยืนยัน)
+    customer_name     = db.Column(db.String(100))
+    province          = db.Column(db.String(100))
+    shipping_fee      = db.Column(db.Float, default=0)
+    shop_discount     = db.Column(db.Float, default=0)
+    platform_discount = db.Column(db.Float, default=0)
+    coin_discount     = db.Column(db.Float, default=0)
+
+    sale_id = db.Column(db.Integer, db.ForeignKey("sale.id", ondelete="SET NULL"))   # หลัง CONFIRMED
+    created_at  = db.Column(db.DateTime, default=utc_now, nullable=False)
+    released_at = db.Column(db.DateTime)
+
+    items = db.relationship("StockReservationItem", back_populates="reservation",
+                            cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # 1 ออเดอร์ marketplace มีใบจองที่ยังเปิด/ยืนยันแล้วได้ใบเดียว (ใบที่ปล่อย/หมดอายุแล้วจองใหม่ได้)
+        Index("uq_resv_ws_channel_ext_order_open", "workspace_id", "channel_id", "external_order_id", unique=True,
+              sqlite_where=text("status IN ('ACTIVE', 'CONFIRMED')"),
+              postgresql_where=text("status IN ('ACTIVE', 'CONFIRMED')")),
+        # sweeper: ACTIVE ที่ expires_at เลยแล้ว
+        Index("ix_resv_status_expires", "status", "expires_at"),
+        Index("ix_resv_ws_created", "workspace_id", "created_at", "id"),
+    )
+
+
+class StockReservationItem(TenantScoped, db.Model):
+    __tablename__ = "stock_reservation_item"
+    id = db.Column(db.Integer, primary_key=True)
+
+    reservation_id = db.Column(db.Integer, db.ForeignKey("stock_reservation.id", ondelete="CASCADE"), nullable=False, index=True)
+    reservation = db.relationship("StockReservation", back_populates="items")
+
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="RESTRICT"), nullable=False)
+    variant_id = db.Column(db.Integer, db.ForeignKey("product_variant.id", ondelete="SET NULL"))
+
+    # snapshot ของบรรทัด (รูปเดียวกับ lines ของ services.sales.build_sale)
+    sale_mode     = db.Column(db.String(50))
+    pack_size     = db.Column(db.Integer, nullable=False)
+    quantity_pack = db.Column(db.Integer, nullable=False)
+    unit_price    = db.Column(db.Float, nullable=False)
+
+    workspace_id = db.Column(db.Integer, nullable=False)
+
+    batches = db.relationship("StockReservationBatch", back_populates="item",
+                              cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        CheckConstraint("pack_size > 0", name="ck_resv_item_pack_pos"),
+        CheckConstraint("quantity_pack > 0", name="ck_resv_item_qty_pos"),
+    )
+
+
+# ล็อตที่ถูกกันไว้ต่อบรรทัด (แผน FEFO ตอนจอง) — ยืนยันแล้วใช้แผนนี้ตัดจริงเลย
+class StockReservationBatch(TenantScoped, db.Model):
+    __tablename__ = "stock_reservation_batch"
+    id = db.Column(db.Integer, primary_key=True)
+
+    item_id = db.Column(db.Integer, db.ForeignKey("stock_reservation_item.id", ondelete="CASCADE"), nullable=False, index=True)
+    item = db.relationship("StockReservationItem", back_populates="batches")
+
+    reservation_id = db.Column(db.Integer, nullable=False, index=True)   # ซ้ำกับ item.reservation_id -> sweep ไม่ต้อง join
+    batch_id   = db.Column(db.Integer, db.ForeignKey("stock_batch.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    qty        = db.Column(db.Integer, nullable=False)   # base units
+
+    workspace_id = db.Column(db.Integer, nullable=False)
+    warehouse_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("qty > 0", name="ck_resv_batch_qty_pos"),
+    )
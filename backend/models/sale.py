@@ -1,9 +1,9 @@
 from sqlalchemy import CheckConstraint, Index
-from ._base import db, utc_now
+from ._base import db, utc_now, TenantScoped
 
 
 # ตารางเก็บข้อมูลประวัติการขายสินค้า # 1) หัวใบขาย
-class Sale(db.Model):
+class Sale(TenantScoped, db.Model):
     __tablename__ = 'sale'
     id = db.Column(db.Integer, primary_key=True)
 
@@ -21,6 +21,10 @@ class Sale(db.Model):
     # ลูกค้า/ที่อยู่ (optional)
     customer_name = db.Column(db.String(100))
     province      = db.Column(db.String(100))
+
+    # เลขออเดอร์จาก marketplace (ไฟล์ export) -> กัน import ซ้ำ
+    external_order_id = db.Column(db.String(64))
+    source_platform   = db.Column(db.String(20))   # shopee / lazada / tiktok
     # note          = db.Column(db.String(255))
 
     # ยอดเงินระดับบิล (สรุปหลังคำนวณ)
@@ -40,13 +44,15 @@ class Sale(db.Model):
     channel   = db.relationship("SalesChannel")
     __table_args__ = (
         Index("ix_sale_ws_wh_date", "workspace_id","warehouse_id","sale_date"),
+        Index("ix_sale_ws_date_id", "workspace_id","sale_date","id"),   # sale history + keyset pagination ต่อร้าน
+        db.UniqueConstraint("workspace_id","channel_id","external_order_id", name="uq_sale_ws_channel_ext_order"),
         # ถ้ามีเลขบิล/เลขภาษี
         # db.UniqueConstraint("workspace_id","invoice_no", name="uq_sale_ws_invoice"),
     )
 
 
 # 2) รายการขาย (1 รายการต่อ 1 variant — ไม่มี custom)
-class SaleItem(db.Model):
+class SaleItem(TenantScoped, db.Model):
     __tablename__ = 'sale_item'
     id = db.Column(db.Integer, primary_key=True)
 
@@ -79,10 +85,12 @@ class SaleItem(db.Model):
         CheckConstraint('pack_size_at_sale > 0', name='ck_saleitem_pack_size_pos'),
         CheckConstraint('quantity_pack > 0',     name='ck_saleitem_qty_pos'),
         CheckConstraint('base_units > 0',        name='ck_saleitem_base_pos'),
+        Index("ix_saleitem_ws_product_sale", "workspace_id", "product_id", "sale_id"),
+        Index("ix_saleitem_sale", "sale_id"),   # join หัวบิล -> รายการ (export / cascade delete)
     )
 
 # 3) แมประหว่าง SaleItem กับ StockBatch (ตัด FEFO หลายล็อตได้)
-class SaleItemBatch(db.Model):
+class SaleItemBatch(TenantScoped, db.Model):
     __tablename__ = 'sale_item_batch'
     id = db.Column(db.Integer, primary_key=True)
 
@@ -0,0 +1,11 @@
+from ._base import db, utc_now, TenantScoped
+
+# ตัวนับเลขเอกสารรายวันต่อร้าน เช่น GRN-20250801-001 (ใช้ซ้ำกับเลขบิลขาย/ใบโอนได้ด้วย prefix อื่น)
+class DocSequence(TenantScoped, db.Model):
+    __tablename__ = "doc_sequence"
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), primary_key=True)
+    prefix = db.Column(db.String(20), primary_key=True)   # GRN / INV / TRF ...
+    day = db.Column(db.Date, primary_key=True)
+
+    last_value = db.Column(db.Integer, nullable=False, default=0)  # เลขล่าสุดที่ออกไปแล้ว
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now, nullable=False)
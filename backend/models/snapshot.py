@@ -0,0 +1,21 @@
+from sqlalchemy import UniqueConstraint
+from ._base import db, utc_now, TenantScoped
+
+
+# watermark ของ snapshot (Parquet / Arrow) ต่อร้าน ต่อตาราง: รอบ incremental ส่งออกเฉพาะแถวที่ id > last_id
+class SnapshotWatermark(TenantScoped, db.Model):
+    __tablename__ = "snapshot_watermark"
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    table_name   = db.Column(db.String(50), nullable=False)
+    last_id      = db.Column(db.Integer, nullable=False, default=0)
+
+    rows_total   = db.Column(db.Integer, nullable=False, default=0)   # แถวทั้งหมดใน dataset ตั้งแต่รอบ full ล่าสุด
+    files_total  = db.Column(db.Integer, nullable=False, default=0)
+    last_run_at  = db.Column(db.DateTime, default=utc_now, nullable=False)
+    last_full_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "table_name", name="uq_snapshot_ws_table"),
+    )
@@ -1,8 +1,8 @@
 from sqlalchemy import CheckConstraint, Index, UniqueConstraint
-from ._base import IDMixin, TimestampMixin, db, utc_now
+from ._base import IDMixin, TimestampMixin, TenantScoped, db, utc_now
 
 # ตารางเก็บ history stock-in of Product = เก็บประวัติการรับเข้า(ซื้อ)ของสินค้านั้นๆ
-class StockIn(db.Model):
+class StockIn(TenantScoped, db.Model):
     __tablename__ = 'stock_in'
     id = db.Column(db.Integer, primary_key=True)
 
@@ -16,6 +16,9 @@ class StockIn(db.Model):
     # 👇 ใส่ expiry ของ “รอบรับเข้า” นี้ครั้งเดียว ใช้กับ entries ทั้งหมด
     expiry_date = db.Column(db.Date, nullable=True) 
 
+    # มีล็อตของใบนี้ถูกใช้/จองไปแล้ว (แก้ได้เฉพาะหัวบิล, ลบไม่ได้) — อัปเดตพร้อมการตัด/คืนล็อต (services.stock_level.refresh_stockin_locks)
+    locked = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
     # 1 StockIn -> N Entries
     entries = db.relationship("StockInEntry", back_populates="stockin", cascade="all, delete-orphan",passive_deletes=True)
 
@@ -29,7 +32,7 @@ class StockIn(db.Model):
     
 
 # ตารางเก็บข้อมูลประวัติการรับเข้าสินค้า ตามStock-in-id
-class StockInEntry(db.Model):
+class StockInEntry(TenantScoped, db.Model):
     __tablename__ = 'stock_in_entry'
     id = db.Column(db.Integer, primary_key=True)
 
@@ -49,6 +52,8 @@ class StockInEntry(db.Model):
     custom_sale_mode = db.Column(db.String(50), nullable=True)   # เช่น "doublePack"
     custom_pack_size = db.Column(db.Integer, nullable=True)      # เช่น 20
 
+    unit_cost = db.Column(db.Float, nullable=True)   # ต้นทุน/หน่วยย่อย ตอนรับเข้า (ไม่ส่ง -> product.cost_price)
+
     # snapshot ตอนรับเข้า (สำคัญ! กันกรณี variant เปลี่ยนในอนาคต)
     pack_size_at_receipt = db.Column(db.Integer, nullable=False)  # เช่น 10 เม็ด/ขวด/กล่อง ต่อ pack
 
@@ -67,9 +72,10 @@ class StockInEntry(db.Model):
         CheckConstraint('pack_size_at_receipt > 0', name='ck_entry_pack_size_positive'),
         CheckConstraint('quantity > 0', name='ck_entry_qty_positive'),
         Index("ix_stockin_ws_wh_prod_date", "workspace_id","warehouse_id","product_id"),
+        Index("ix_entry_ws_product_stockin", "workspace_id", "product_id", "stockin_id"),
     )
 
-class StockBatch(db.Model):
+class StockBatch(TenantScoped, db.Model):
     __tablename__ = 'stock_batch'
     id = db.Column(db.Integer, primary_key=True)
 
@@ -85,6 +91,10 @@ class StockBatch(db.Model):
 
     qty_received = db.Column(db.Integer, nullable=False, default=0)
     qty_remaining = db.Column(db.Integer, nullable=False, default=0)
+    qty_reserved = db.Column(db.Integer, nullable=False, default=0)   # ส่วนของ qty_remaining ที่ถูกจองไว้ (ขายได้ = remaining - reserved)
+
+    # ต้นทุน/หน่วยย่อย ของล็อต (ถัวเฉลี่ยถ่วงน้ำหนักถ้ารวมหลาย entry) -> ใช้ลง COGS ตอนขาย
+    unit_cost = db.Column(db.Float, nullable=True)
 
     created_at = db.Column(db.DateTime, default=utc_now, nullable=False)
 
@@ -92,6 +102,7 @@ class StockBatch(db.Model):
     warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id", ondelete="RESTRICT"),nullable=False, index=True)
     warehouse = db.relationship("Warehouse")
     
+    # ล็อตที่เกิดจากการโอนคลัง -> ชี้กลับไปล็อตต้นทาง (stockin/lot/expiry/unit_cost เดียวกัน)
     origin_batch_id = db.Column(db.Integer, db.ForeignKey("stock_batch.id"))
     origin_batch = db.relationship("StockBatch", remote_side="StockBatch.id")
 
@@ -103,15 +114,17 @@ class StockBatch(db.Model):
         db.Index('ix_batch_product_expiry', 'product_id', 'expiry_date'),
         CheckConstraint('qty_received >= 0',  name='ck_batch_qty_received_nonneg'),
         CheckConstraint('qty_remaining >= 0', name='ck_batch_qty_remaining_nonneg'),
-        # บังคับ "1 ก้อนต่อ (stockin, product, lot, expiry)"
+        # บังคับ "1 ก้อนต่อ (stockin, product, lot, expiry, warehouse)" — ล็อตที่โอนไปคลังอื่นเป็นก้อนใหม่ของคลังปลายทาง
         # หมายเหตุ: ถ้า lot_number เป็น NULL, DB ส่วนใหญ่จะอนุญาต NULL ซ้ำ → แนะนำ generate lot_number เสมอใน service
-        UniqueConstraint('stockin_id', 'product_id', 'lot_number', 'expiry_date', name='uq_batch_stockin_prod_lot_exp'),
+        UniqueConstraint('stockin_id', 'product_id', 'lot_number', 'expiry_date', 'warehouse_id', name='uq_batch_stockin_prod_lot_exp_wh'),
         CheckConstraint("qty_remaining >= 0", name="ck_batch_qty_nonneg"),
+        CheckConstraint("qty_reserved >= 0 AND qty_reserved <= qty_remaining", name="ck_batch_qty_reserved_range"),
         Index("ix_batch_ws_wh_prod_exp", "workspace_id","warehouse_id","product_id","expiry_date"),
+        Index("ix_batch_ws_expiry", "workspace_id","expiry_date"),   # expiry sweeper (range scan ตามวันหมดอายุ)
     )
 
 # 4) บันทึก movement (IN/OUT/EXPIRED/ADJUST/VOID)
-class StockMovement(db.Model):
+class StockMovement(TenantScoped, db.Model):
     __tablename__ = 'stock_movement'
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='RESTRICT'), nullable=False)
@@ -121,6 +134,7 @@ class StockMovement(db.Model):
     batch_qty_remaining = db.Column(db.Integer, nullable=False)
     ref_stockin_id = db.Column(db.Integer, db.ForeignKey('stock_in.id'))
     ref_sale_id    = db.Column(db.Integer, db.ForeignKey('sale.id'))
+    ref_transfer_id = db.Column(db.Integer, db.ForeignKey('stock_transfer.id'))   # โอนคลัง: OUT (ต้นทาง) + IN (ปลายทาง) คู่กัน
     note = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=utc_now, nullable=False)
 
@@ -130,23 +144,54 @@ class StockMovement(db.Model):
     __table_args__ = (
         CheckConstraint('qty != 0', name='ck_movement_qty_nonzero'),
         Index('ix_mov_product_created', 'product_id', 'created_at'),
+        Index('ix_mov_ws_product_created', 'workspace_id', 'product_id', 'created_at'),
+        Index('ix_mov_ws_created', 'workspace_id', 'created_at'),   # replay ช่วงเวลาหลัง checkpoint
+    )
+
+# 5) ยอดคงเหลือสะสมต่อ (workspace, warehouse, product) — อัปเดตใน transaction เดียวกับทุกการเขียน stock
+#    ใช้แทนการ SUM(StockBatch.qty_remaining) ทั้งตารางทุกครั้งที่เปิดหน้า list/report
+class StockLevel(TenantScoped, db.Model):
+    __tablename__ = 'stock_level'
+    id = db.Column(db.Integer, primary_key=True)
+
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id", ondelete="RESTRICT"), nullable=False)
+    product_id   = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    on_hand  = db.Column(db.Integer, nullable=False, default=0)   # base units คงเหลือ (รวมทุกล็อต)
+    reserved = db.Column(db.Integer, nullable=False, default=0)   # base units ที่ถูกจองไว้ (ยังไม่ตัดจริง)
+    nearest_expiry = db.Column(db.Date, nullable=True)            # วันหมดอายุใกล้สุดของล็อตที่ยังมีของ
+
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "warehouse_id", "product_id", name="uq_stock_level_ws_wh_prod"),
+        CheckConstraint('on_hand >= 0', name='ck_stock_level_on_hand_nonneg'),
+        CheckConstraint('reserved >= 0', name='ck_stock_level_reserved_nonneg'),
     )
 
 
-class StockTransfer(TimestampMixin, IDMixin, db.Model):
+class StockTransfer(TenantScoped, TimestampMixin, IDMixin, db.Model):
     __tablename__ = "stock_transfer"
 
     workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), nullable=False, index=True)
     from_warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouse.id", ondelete="RESTRICT"), nullable=False, index=True)
     to_warehouse_id   = db.Column(db.Integer, db.ForeignKey("warehouse.id", ondelete="RESTRICT"), nullable=False, index=True)
 
+    doc_number = db.Column(db.String(50))   # TRF-YYYYMMDD-NNN
     status = db.Column(db.String(20), nullable=False, default="DRAFT")  # DRAFT/CONFIRMED
     transfer_date = db.Column(db.Date, nullable=False)
+    confirmed_at = db.Column(db.DateTime)
     note = db.Column(db.String(255))
 
     from_warehouse = db.relationship("Warehouse", foreign_keys=[from_warehouse_id])
     to_warehouse   = db.relationship("Warehouse",   foreign_keys=[to_warehouse_id])
 
+    __table_args__ = (
+        CheckConstraint("from_warehouse_id != to_warehouse_id", name="ck_transfer_wh_differ"),
+        Index("ix_transfer_ws_created", "workspace_id", "created_at", "id"),
+    )
+
 class StockTransferItem(TimestampMixin, IDMixin, db.Model):
     __tablename__ = "stock_transfer_item"
 
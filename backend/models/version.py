@@ -0,0 +1,11 @@
+from ._base import db, utc_now, TenantScoped
+
+# เลขเวอร์ชันของข้อมูลแต่ละกลุ่มต่อร้าน (products / stock / sales / stockins / channels)
+#   ทุกการเขียนของกลุ่มนั้น +1 ใน transaction เดียวกัน -> GET ใช้ทำ ETag / ตอบ 304 โดยไม่ต้องแตะตารางหลัก
+class ResourceVersion(TenantScoped, db.Model):
+    __tablename__ = "resource_version"
+    workspace_id = db.Column(db.Integer, db.ForeignKey("workspace.id", ondelete="CASCADE"), primary_key=True)
+    resource = db.Column(db.String(20), primary_key=True)
+
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now, nullable=False)
@@ -1,9 +1,9 @@
 # models/warehouse.py
 from sqlalchemy import UniqueConstraint, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
-from ._base import db, IDMixin, TimestampMixin
+from ._base import db, IDMixin, TimestampMixin, TenantScoped
 
-class Warehouse(TimestampMixin, IDMixin, db.Model):
+class Warehouse(TenantScoped, TimestampMixin, IDMixin, db.Model):
     __tablename__ = "warehouse"
 
     workspace_id = db.Column(
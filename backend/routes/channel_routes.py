@@ -1,11 +1,16 @@
 from flask import  Blueprint, jsonify, request
 from models import Platform, PlatformTier, db,  SalesChannel
 from sqlalchemy.exc import SQLAlchemyError
+from flask_jwt_extended import jwt_required, get_jwt
+from services.versioning import CHANNELS, bump_versions
+from decorators.etag import conditional_get
+from decorators.cache import cached
 
 channel_bp = Blueprint('channel_bp', __name__, url_prefix='/api/channel')
 
 # 1. API POST - add new Sale Channel
 @channel_bp.route('/', methods=['POST'])
+@jwt_required()
 def create_stockin():
     try:
         data = request.form
@@ -18,12 +23,14 @@ def create_stockin():
         is_active = True
         
         new_channel = SalesChannel(
+            workspace_id = int(get_jwt()["wsid"]),
             channel_name = channel_name,
             store_desc = data.get("store_desc"),
             platform_tier_id = data.get("platform_tier_id"),
             is_active = is_active,
         )
         db.session.add(new_channel)
+        bump_versions(new_channel.workspace_id, CHANNELS)
         db.session.commit()
         
         return jsonify({"message": "✅ Sale Channel created successfully", "Channel_id": new_channel.id}), 201
@@ -38,6 +45,9 @@ def create_stockin():
 
 # 2. API GET - get all Channel
 @channel_bp.route('/', methods=['GET'])
+@jwt_required()
+@conditional_get(CHANNELS)
+@cached(CHANNELS)
 def get_all_channel():
     try:
         channels = db.session.query(
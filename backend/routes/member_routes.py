@@ -4,6 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt
 from models import db, Membership, User, Workspace
 from services.plan import within_quota_members, has_feature
 from decorators.guard import require_perm, enforce_quota, enforce_plan_feature
+from services.cache import PLAN, invalidate_after_commit
 from werkzeug.utils import secure_filename
 from extensions import ph
 import os
@@ -89,6 +90,7 @@ def delete_member(mem_id):
         return jsonify({"error": "cannot delete owner"}), 400
 
     db.session.delete(mem)
+    invalidate_after_commit(wsid, PLAN)
     db.session.commit()
     return jsonify({"ok": True})
 
@@ -144,6 +146,7 @@ def create_member():
 
         mem = Membership(workspace_id=wsid, user_id=user.id, role=role, is_primary=False)
         db.session.add(mem)
+        invalidate_after_commit(wsid, PLAN)
         db.session.commit()
 
         return jsonify({
@@ -1,9 +1,12 @@
 from flask import Blueprint, jsonify
 from models import Platform
+from services.cache import PLATFORMS
+from decorators.cache import cached
 
 platform_bp = Blueprint("platform_bp", __name__, url_prefix="/api/platforms")
 
 @platform_bp.route("/<string:platform_name>", methods=["GET"])
+@cached(PLATFORMS, ttl=3600, per_workspace=False)   # ข้อมูลกลาง (seed) แทบไม่เปลี่ยน
 def get_platform_by_name(platform_name):
     platform = Platform.query.filter(Platform.name.ilike(platform_name)).first()
     if not platform:
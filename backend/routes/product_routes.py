@@ -1,13 +1,28 @@
 from flask import abort, Blueprint, current_app, jsonify, request, send_from_directory
-from models import Sale, SaleItem, StockBatch, StockIn, StockInEntry, StockMovement, db, Product, ProductVariant, ProductImage
+from models import DemandForecast, SaleItem, StockAlert, StockBatch, StockIn, StockInEntry, StockLevel, StockMovement, db, Product, ProductVariant, ProductImage
 from werkzeug.utils import secure_filename
 from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy.exc import SQLAlchemyError
 import os
 import json
 import uuid
+from datetime import date, datetime, timezone
 from sqlalchemy import func
 from flask_jwt_extended import jwt_required, get_jwt
+from decorators.guard import require_perm
+from services.stock_level import stock_on_hand
+from services.checkpoint import end_of_day, invalidate_checkpoints, stock_as_of
+from services.pagination import keyset_page, parse_limit, wants_total
+from services.projection import row_serializer, variants_and_images
+from services.export import batches_export_query, movements_export_query, parse_export_args, stream_export
+from services.barcode import resolve_codes, sync_barcodes
+from services.search import search_products
+from services.snapshot import TABLES as SNAPSHOT_TABLES, dataset_dir as snapshot_dataset_dir, run_snapshot
+from services.versioning import PRODUCTS, SALES, STOCK, STOCKINS, bump_versions
+from decorators.etag import conditional_get
+from decorators.cache import cached
+from services.reorder import check_reorder_points
+from services.reconcile import reconcile_ledger
 
 product_bp = Blueprint('product_bp', __name__, url_prefix='/api/inventory')
 
@@ -36,6 +51,34 @@ def delete_image_file(filename):
     if os.path.exists(path):
         os.remove(path)
 
+def _own_product(product_id):
+    # สินค้าของร้านใน JWT เท่านั้น (ร้านอื่น = ไม่พบ) ; tenant scope กรองอยู่แล้ว แต่เช็คซ้ำกัน identity map
+    product = db.session.get(Product, product_id)
+    if product is None or product.workspace_id != int(get_jwt()["wsid"]):
+        return None
+    return product
+
+
+def _own_variant(variant_id):
+    # ProductVariant / ProductImage ไม่มี workspace_id (ไม่ถูก tenant scope) -> เช็คผ่านสินค้าแม่
+    variant = db.session.get(ProductVariant, variant_id)
+    if variant is None or _own_product(variant.product_id) is None:
+        return None
+    return variant
+
+
+def parse_reorder_point(x):
+    # ว่าง = ไม่ตั้งจุดสั่งซื้อ ; ต้องเป็นจำนวนเต็ม >= 0 (base units)
+    if x is None or str(x).strip() == '':
+        return None
+    try:
+        val = int(x)
+    except (TypeError, ValueError):
+        raise ValueError("reorder_point must be integer")
+    if val < 0:
+        raise ValueError("reorder_point must be >= 0")
+    return val
+
 def _get_receipts_dir():
     base = current_app.config.get("RECEIPTS_DIR")
     if base:
@@ -64,59 +107,53 @@ def _delete_receipt_file(filename: str | None):
 
 # API - ที่เกี่ยวกับ PRODUCTS ทั้งหมด
 # 1. API GET - get all product
+# projection เฉพาะคอลัมน์ที่ list ใช้ (ไม่ hydrate ORM object / relationship)
+PRODUCT_LIST_COLUMNS = (
+    Product.id, Product.name, Product.sku, Product.category, Product.unit,
+    Product.cost_price, Product.has_expire, Product.reorder_point, Product.created_at,
+)
+_product_list_row = row_serializer(*PRODUCT_LIST_COLUMNS)
+
 @product_bp.route('/', methods=['GET'])
+@jwt_required()
+@conditional_get(PRODUCTS, STOCK)
 def get_all_products():
     try:
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
-        offset = (page - 1) * limit
-
-        # สรุป stock ต่อสินค้า จาก StockBatch
-        stock_subq = (
-            db.session.query(
-                StockBatch.product_id.label('pid'),
-                func.coalesce(func.sum(StockBatch.qty_remaining), 0).label('stock_qty')
+        args = request.args
+        limit = parse_limit(args)
+        q = db.session.query(*PRODUCT_LIST_COLUMNS)
+
+        # ?cursor= -> keyset บน (created_at, id) (หน้าลึกเร็วเท่าหน้าแรก); ไม่ส่ง -> page/limit แบบเดิม
+        cursor_mode = "cursor" in args
+        if cursor_mode:
+            rows, next_cursor = keyset_page(q, (Product.created_at, Product.id), args.get("cursor"), limit)
+            page = None
+        else:
+            page = int(args.get('page', 1))
+            rows = (
+                q.order_by(Product.created_at.desc(), Product.id.desc())
+                .offset((page - 1) * limit)
+                .limit(limit)
+                .all()
             )
-            .group_by(StockBatch.product_id)
-            .subquery()
-        )
 
-        # ดึง Product + stock รวม (LEFT JOIN เผื่อสินค้าที่ไม่มี batch เลย → 0)
-        rows = (
-            db.session.query(
-                Product,
-                func.coalesce(stock_subq.c.stock_qty, 0).label('stock_total')
-            )
-            .outerjoin(stock_subq, stock_subq.c.pid == Product.id)
-            .options(
-                selectinload(Product.images),
-                selectinload(Product.variants),
-            )
-            .offset(offset)
-            .limit(limit)
-            .all()
-        )
+        total = None
+        if not cursor_mode or wants_total(args):
+            total = db.session.query(func.count(Product.id)).scalar()
 
-        total = db.session.query(func.count(Product.id)).scalar()
+        # stock (stock_level) + variants/images เฉพาะสินค้าในหน้านี้ : query ละครั้ง ไม่ว่าหน้าจะมีกี่ตัว
+        ids = [r.id for r in rows]
+        stock_map = stock_on_hand(ids)
+        variant_map, image_map = variants_and_images(ids)
 
         data = []
-        for p, stock_total in rows:
-            data.append({
-                "id": p.id,
-                "name": p.name,
-                "sku": p.sku,
-                "category": p.category,
-                "unit": p.unit,
-                "cost_price": p.cost_price,
-                # ใช้ stock_total จาก StockBatch (เลิกใช้ p.stock)
-                "stock": int(stock_total or 0),
-                "has_expire": getattr(p, "has_expire", None),
-                "variants": getattr(p, "serialized_variants", []),
-                "images": [
-                    {"filename": img.image_filename, "is_main": img.is_main}
-                    for img in p.images
-                ],
-            })
+        for r in rows:
+            item = _product_list_row(r)
+            del item["created_at"]
+            item["stock"] = stock_map.get(r.id, 0)
+            item["variants"] = variant_map.get(r.id, [])
+            item["images"] = image_map.get(r.id, [])
+            data.append(item)
 
         result = {
             "data": data,
@@ -124,11 +161,14 @@ def get_all_products():
                 "page": page,
                 "limit": limit,
                 "total": total,
-                "total_pages": (total + limit - 1) // limit
+                "total_pages": (total + limit - 1) // limit if total is not None else None,
+                "next_cursor": next_cursor if cursor_mode else None,
             }
         }
         return jsonify(result), 200
 
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"❌ Failed to fetch products: {str(e)}"}), 500
 
@@ -170,6 +210,7 @@ def create_product():
             unit         = data["unit"],
             cost_price   = data["cost_price"],
             has_expire   = str(data.get("has_expire", "false")).lower() == "true",
+            reorder_point = parse_reorder_point(data.get("reorder_point")),
         )
 
         # ✅ เพิ่ม Variants
@@ -200,9 +241,14 @@ def create_product():
                 filename = save_image(img)
                 db.session.add(ProductImage(product_id=new_product.id, image_filename=filename, is_main=False))
 
+        sync_barcodes(new_product.workspace_id, [new_product.id])
+        bump_versions(new_product.workspace_id, PRODUCTS)
         db.session.commit()
         return jsonify({"message": "✅ Product and variants created successfully!"}), 201
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 400
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
@@ -227,6 +273,7 @@ def uploaded_file(filename):
 
 # 4. API DELETE - delete product + relationship of product
 @product_bp.route('/<int:product_id>', methods=['DELETE'])
+@jwt_required()
 def delete_product(product_id):
     try:
         # กัน autoflush ระหว่างที่เรายังเตรียมข้อมูล/ตรวจเงื่อนไข
@@ -283,7 +330,7 @@ def delete_product(product_id):
                     "stockin_id": int(b.stockin_id or 0),
                 }
                 for b in batches
-                if (b.qty_remaining or 0) < (b.qty_received or 0)
+                if (b.qty_remaining or 0) - (b.qty_reserved or 0) < (b.qty_received or 0)
             ]
             if used_batches:
                 return jsonify({
@@ -302,6 +349,8 @@ def delete_product(product_id):
                     .update({StockInEntry.batch_id: None}, synchronize_session=False)
 
             # B) ลบ movement ที่อ้างใบรับเข้า (IN) ของสินค้า (ref_stockin_id)
+            #    (ledger ย้อนหลังเปลี่ยน -> checkpoint ที่ตัดหลังจากนั้นใช้ไม่ได้)
+            invalidate_checkpoints(product.workspace_id, StockMovement.product_id == product_id)
             if stockin_ids:
                 db.session.query(StockMovement)\
                     .filter(StockMovement.ref_stockin_id.in_(stockin_ids))\
@@ -317,6 +366,11 @@ def delete_product(product_id):
             for b in batches:
                 db.session.delete(b)
 
+            # D.1) ลบยอดคงเหลือสะสมของสินค้านี้ (ทุกคลัง)
+            db.session.query(StockLevel)\
+                .filter(StockLevel.product_id == product_id)\
+                .delete(synchronize_session=False)
+
             # E) ลบ StockInEntry ของสินค้านี้ทั้งหมด
             db.session.query(StockInEntry)\
                 .filter(StockInEntry.product_id == product_id)\
@@ -346,8 +400,9 @@ def delete_product(product_id):
             for v in list(product.variants):
                 db.session.delete(v)
 
-            # I) ลบ product หลัก
+            # I) ลบ product หลัก (บิลขาย/ใบรับเข้า/stock_level ของสินค้านี้หายไปด้วย)
             db.session.delete(product)
+            bump_versions(product.workspace_id, PRODUCTS, SALES, STOCKINS, STOCK)
 
         db.session.commit()
         return jsonify({"message": "✅ ลบสินค้าสำเร็จ!"}), 200
@@ -358,9 +413,14 @@ def delete_product(product_id):
     
 # 5. API GET - get product by ID
 @product_bp.route('/<int:product_id>', methods=['GET'])
+@jwt_required()
+@conditional_get(PRODUCTS, STOCK)
+@cached(PRODUCTS, STOCK)
 def get_product_by_id(product_id):
     try:
-        product = Product.query.get_or_404(product_id)
+        product = _own_product(product_id)
+        if not product:
+            return jsonify({"error": "❌ ไม่พบสินค้า"}), 404
         return jsonify({
             "id": product.id,
             "name": product.name,
@@ -368,8 +428,9 @@ def get_product_by_id(product_id):
             "category": product.category,
             "unit": product.unit,
             "cost_price": product.cost_price,
-            "stock": product.stock,
+            "stock": stock_on_hand([product.id]).get(product.id, 0),
             "has_expire":product.has_expire,
+            "reorder_point": product.reorder_point,
             "variants": product.serialized_variants,
             "images": [
                 {
@@ -385,9 +446,12 @@ def get_product_by_id(product_id):
         return jsonify({"error": "เกิดข้อผิดพลาดขณะดึงข้อมูลสินค้า"}), 500
 
 @product_bp.route('/<int:product_id>', methods=['PATCH'])
+@jwt_required()
 def update_product(product_id):
     try:
-        product = Product.query.get_or_404(product_id)
+        product = _own_product(product_id)
+        if not product:
+            return jsonify({"error": "❌ ไม่พบสินค้า"}), 404
         data = request.form
 
         # ---------- helpers ----------
@@ -421,6 +485,11 @@ def update_product(product_id):
                 # ถ้าอยาก ignore ให้ไม่ตั้งค่าเมื่อ None ก็ลบทิ้ง 2 บรรทัดนี้ได้
                 return jsonify({"error": "❌ has_expire must be boolean"}), 400
             product.has_expire = bv
+        reorder_changed = False
+        if 'reorder_point' in data:
+            rp = parse_reorder_point(data.get('reorder_point'))
+            reorder_changed = rp != product.reorder_point
+            product.reorder_point = rp
 
         # ---------- 2) upsert variants (no bulk delete) ----------
         variants_payload = json.loads(data.get("variants", "[]"))
@@ -507,6 +576,13 @@ def update_product(product_id):
                 .filter_by(image_filename=filename, product_id=product.id)\
                 .delete(synchronize_session=False)
 
+        if reorder_changed:
+            # เปลี่ยนจุดสั่งซื้อ -> เปิด/ปิด alert ทันทีตามยอดปัจจุบัน
+            db.session.flush()
+            check_reorder_points({(product.workspace_id, product.id)})
+
+        sync_barcodes(product.workspace_id, [product.id])
+        bump_versions(product.workspace_id, PRODUCTS)
         db.session.commit()
         return jsonify({"message": "✅ Product updated successfully!"}), 200
 
@@ -529,6 +605,7 @@ def update_product(product_id):
 
 # 7. API Checking Hard Delete in Edit Product
 @product_bp.route('/variant/<int:variant_id>', methods=['DELETE'])
+@jwt_required()
 def hard_delete_variant(variant_id):
     """
     API สำหรับลบ ProductVariant ถาวร (Hard Delete)
@@ -537,7 +614,7 @@ def hard_delete_variant(variant_id):
     """
     try:
         # 1. ค้นหา ProductVariant ที่ต้องการลบ
-        variant = db.session.get(ProductVariant, variant_id)
+        variant = _own_variant(variant_id)
         if not variant:
             return jsonify({"error": "❌ ProductVariant not found"}), 404
 
@@ -549,14 +626,17 @@ def hard_delete_variant(variant_id):
             }), 409 # HTTP 409 Conflict
 
         # 3. ⭐ ตรวจสอบความเกี่ยวข้องกับ Sale
-        related_saleorder = db.session.query(Sale).filter_by(variant_id=variant_id).first()
+        related_saleorder = db.session.query(SaleItem.id).filter_by(variant_id=variant_id).first()
         if related_saleorder:
             return jsonify({
                 "error": "❌ Cannot delete variant. It is linked to existing sales orders."
             }), 409 # HTTP 409 Conflict
 
         # 4. หากไม่มีข้อมูลเกี่ยวข้อง จึงดำเนินการลบ
+        product = variant.product
+        bump_versions(product.workspace_id, PRODUCTS)
         db.session.delete(variant)
+        sync_barcodes(product.workspace_id, [product.id])
         db.session.commit()
         
         return jsonify({"message": f"✅ ProductVariant {variant_id} deleted permanently"}), 200
@@ -565,4 +645,324 @@ def hard_delete_variant(variant_id):
         db.session.rollback()
         return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
     except Exception as e:
-        return jsonify({"error": f"❌ Unexpected error: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"❌ Unexpected error: {str(e)}"}), 500
+
+
+# 8. API GET - ยอดคงเหลือ ณ วันที่ (checkpoint ล่าสุด + replay movement หลังจากนั้น)
+@product_bp.route('/stock-as-of', methods=['GET'])
+@jwt_required()
+def get_stock_as_of():
+    """
+    query: date (yyyy-MM-dd, ยอด ณ สิ้นวัน UTC) หรือ at (ISO datetime) — ต้องส่งอย่างใดอย่างหนึ่ง
+           product_id (คั่นด้วย , ) [optional, ไม่ส่ง = ทุกสินค้า]
+           warehouse_id [optional], by_batch=1 [optional แยกรายล็อต]
+    """
+    try:
+        wsid = int(get_jwt()["wsid"])
+        args = request.args
+
+        if args.get("at"):
+            at = datetime.fromisoformat(args["at"].replace("Z", "+00:00"))
+            if at.tzinfo is not None:
+                at = at.astimezone(timezone.utc).replace(tzinfo=None)
+        elif args.get("date"):
+            at = end_of_day(date.fromisoformat(args["date"]))
+        else:
+            return jsonify({"error": "❌ date or at is required"}), 400
+
+        product_ids = None
+        if args.get("product_id"):
+            product_ids = [int(x) for x in args["product_id"].split(",") if x.strip()]
+        warehouse_id = int(args["warehouse_id"]) if args.get("warehouse_id") else None
+        by_batch = args.get("by_batch") in ("1", "true", "True")
+
+        result = stock_as_of(wsid, at, product_ids, warehouse_id, by_batch)
+        rows = result["rows"]
+
+        names = {
+            pid: (sku, name)
+            for pid, sku, name in db.session.query(Product.id, Product.sku, Product.name)
+            .filter(Product.id.in_({r["product_id"] for r in rows}))
+            .all()
+        } if rows else {}
+        for r in rows:
+            sku, name = names.get(r["product_id"], (None, None))
+            r["sku"] = sku
+            r["name"] = name
+
+        cp = result["checkpoint"]
+        return jsonify({
+            "as_of": at.isoformat(),
+            "checkpoint": {"id": cp.id, "as_of": cp.as_of.isoformat(), "period": cp.period} if cp else None,
+            "replayed_movements": result["replayed"],
+            "total_qty": sum(r["qty"] for r in rows),
+            "data": rows,
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch stock as of: {str(e)}"}), 500
+
+
+# 9. API GET - แจ้งเตือนสินค้าต่ำกว่าจุดสั่งซื้อ (?status=OPEN|RESOLVED & cursor/limit)
+@product_bp.route('/alerts', methods=['GET'])
+@jwt_required()
+def get_stock_alerts():
+    try:
+        args = request.args
+        status = (args.get("status") or "OPEN").upper()
+        if status not in ("OPEN", "RESOLVED"):
+            return jsonify({"error": "❌ status must be OPEN or RESOLVED"}), 400
+
+        q = db.session.query(StockAlert).filter(StockAlert.status == status)
+        limit = parse_limit(args)
+        alerts, next_cursor = keyset_page(q, (StockAlert.created_at, StockAlert.id), args.get("cursor"), limit)
+
+        pids = {a.product_id for a in alerts}
+        names = {
+            pid: (sku, name, rp)
+            for pid, sku, name, rp in db.session.query(Product.id, Product.sku, Product.name, Product.reorder_point)
+            .filter(Product.id.in_(pids))
+            .all()
+        } if pids else {}
+        # ยอดพร้อมขายปัจจุบันจาก stock_level (snapshot ใน alert คือค่าตอนเปิด)
+        available = {
+            pid: int(qty or 0)
+            for pid, qty in db.session.query(StockLevel.product_id, func.sum(StockLevel.on_hand - StockLevel.reserved))
+            .filter(StockLevel.product_id.in_(pids))
+            .group_by(StockLevel.product_id)
+            .all()
+        } if pids else {}
+
+        data = []
+        for a in alerts:
+            sku, name, rp = names.get(a.product_id, (None, None, None))
+            data.append({
+                "id": a.id,
+                "product_id": a.product_id,
+                "sku": sku,
+                "name": name,
+                "alert_type": a.alert_type,
+                "status": a.status,
+                "reorder_point": a.reorder_point,
+                "current_reorder_point": rp,
+                "available_at_alert": a.available,
+                "available": available.get(a.product_id, 0),
+                "velocity_daily": a.velocity_daily,
+                "days_of_cover": a.days_of_cover,
+                "created_at": a.created_at.isoformat() if a.created_at else None,
+                "resolved_at": a.resolved_at.isoformat() if a.resolved_at else None,
+            })
+        return jsonify({"data": data, "pagination": {"limit": limit, "next_cursor": next_cursor}}), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch stock alerts: {str(e)}"}), 500
+
+
+# 10. API GET - ผลพยากรณ์ยอดขาย + จำนวนแนะนำให้สั่ง (จากงาน `flask demand-forecast` ; เรียงที่ต้องสั่งมากสุดก่อน)
+@product_bp.route('/forecast', methods=['GET'])
+@jwt_required()
+def get_demand_forecast():
+    """query: product_id (คั่นด้วย , ) [optional], needs_reorder=1 [optional], cursor/limit"""
+    try:
+        args = request.args
+        q = db.session.query(DemandForecast)
+        if args.get("product_id"):
+            q = q.filter(DemandForecast.product_id.in_([int(x) for x in args["product_id"].split(",") if x.strip()]))
+        if args.get("needs_reorder") in ("1", "true", "True"):
+            q = q.filter(DemandForecast.suggested_reorder_qty > 0)
+
+        limit = parse_limit(args)
+        rows, next_cursor = keyset_page(
+            q, (DemandForecast.suggested_reorder_qty, DemandForecast.product_id), args.get("cursor"), limit,
+        )
+        names = {
+            pid: (sku, name, rp)
+            for pid, sku, name, rp in db.session.query(Product.id, Product.sku, Product.name, Product.reorder_point)
+            .filter(Product.id.in_({f.product_id for f in rows}))
+            .all()
+        } if rows else {}
+
+        data = []
+        for f in rows:
+            sku, name, rp = names.get(f.product_id, (None, None, None))
+            data.append({
+                "product_id": f.product_id,
+                "sku": sku,
+                "name": name,
+                "generated_at": f.generated_at.isoformat() if f.generated_at else None,
+                "history": {"from": f.history_from.isoformat(), "to": f.history_to.isoformat()},
+                "moving_avg_daily": f.moving_avg_daily,
+                "level_daily": f.level_daily,
+                "weekday_factors": json.loads(f.weekday_factors) if f.weekday_factors else None,
+                "forecast_daily": json.loads(f.forecast_daily) if f.forecast_daily else [],
+                "horizon_days": f.horizon_days,
+                "forecast_units": f.forecast_units,
+                "safety_stock": f.safety_stock,
+                "lead_time_days": f.lead_time_days,
+                "available": f.available,
+                "reorder_point": rp,
+                "suggested_reorder_point": f.suggested_reorder_point,
+                "suggested_reorder_qty": f.suggested_reorder_qty,
+            })
+        return jsonify({"data": data, "pagination": {"limit": limit, "next_cursor": next_cursor}}), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch demand forecast: {str(e)}"}), 500
+
+
+# 11. API POST - กระทบยอด ledger (ยอดล็อต vs ผลรวม movement / allocation ของบิลขาย / stock_level)
+@product_bp.route('/reconcile', methods=['POST'])
+@jwt_required()
+@require_perm("inventory.write")
+def reconcile_stock_ledger():
+    """body (JSON หรือ form): full=1 [ตรวจทั้งร้าน, default เฉพาะ movement ใหม่กว่ารอบก่อน], repair=1 [ซ่อมส่วนที่ซ่อมได้]"""
+    try:
+        wsid = int(get_jwt()["wsid"])
+        p = request.get_json(silent=True) or request.form
+        truthy = ("1", "true", "True", True, 1)
+        result = reconcile_ledger(wsid, full=p.get("full") in truthy, repair=p.get("repair") in truthy)
+        db.session.commit()
+        return jsonify(result), 200
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to reconcile stock ledger: {str(e)}"}), 500
+
+
+# 12. API GET - export stock movement (ledger) แบบ stream : ?format=csv|ndjson & date_from/date_to & channel_id/warehouse_id/product_id
+@product_bp.route('/movements/export', methods=['GET'])
+@jwt_required()
+def export_stock_movements():
+    try:
+        wsid = int(get_jwt()["wsid"])
+        f = parse_export_args(request.args)
+        return stream_export(movements_export_query(wsid, f), f["format"], f"stock_movements_{date.today():%Y%m%d}")
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to export movements: {str(e)}"}), 500
+
+
+# 13. API GET - export ล็อตสินค้า (stock_batch) แบบ stream : ?format=csv|ndjson & date_from/date_to (วันรับเข้า) & warehouse_id/product_id
+@product_bp.route('/batches/export', methods=['GET'])
+@jwt_required()
+def export_stock_batches():
+    try:
+        wsid = int(get_jwt()["wsid"])
+        f = parse_export_args(request.args)
+        return stream_export(batches_export_query(wsid, f), f["format"], f"stock_batches_{date.today():%Y%m%d}")
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to export batches: {str(e)}"}), 500
+
+
+# 14. API POST - snapshot Parquet/Arrow ของตารางขาย / ล็อต / movement (body: full=1, format=parquet|arrow, tables=[...])
+@product_bp.route('/snapshot', methods=['POST'])
+@jwt_required()
+@require_perm("inventory.write")
+def create_snapshot():
+    try:
+        wsid = int(get_jwt()["wsid"])
+        p = request.get_json(silent=True) or request.form
+        tables = p.getlist("tables") if hasattr(p, "getlist") else p.get("tables")
+        result = run_snapshot(
+            wsid,
+            incremental=p.get("full") not in ("1", "true", "True", True, 1),
+            fmt=p.get("format"),
+            tables=tables or None,
+        )
+        db.session.commit()
+        return jsonify({"workspace_id": wsid, "tables": result}), 200
+
+    except (ValueError, RuntimeError) as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to create snapshot: {str(e)}"}), 500
+
+
+# 15. API GET - ดาวน์โหลดไฟล์ snapshot ของร้าน (path จากผลของ #14 เช่น sale/part-000000000001.parquet)
+@product_bp.route('/snapshot/<string:table>/<path:filename>', methods=['GET'])
+@jwt_required()
+@require_perm("inventory.write")
+def download_snapshot(table, filename):
+    wsid = int(get_jwt()["wsid"])
+    if table not in SNAPSHOT_TABLES:
+        return jsonify({"error": f"❌ Unknown snapshot table: {table}"}), 404
+    # send_from_directory กัน path traversal ให้แล้ว
+    return send_from_directory(snapshot_dataset_dir(wsid, table), filename, as_attachment=True)
+
+
+# 16. API GET - ค้นหาสินค้า (FTS5: ชื่อ / SKU / หมวด / SKU ของ variant) ?q=vit c&limit=&cursor=
+#     คำท้ายเป็น prefix (typeahead) ; เรียงตามความเกี่ยวข้อง (bm25) ; หน้าถัดไปใช้ next_cursor
+@product_bp.route('/search', methods=['GET'])
+@jwt_required()
+@conditional_get(PRODUCTS, STOCK)
+def search_products_route():
+    try:
+        wsid = int(get_jwt()["wsid"])
+        args = request.args
+        limit = parse_limit(args)
+        hits, next_cursor = search_products(wsid, args.get("q", ""), limit, args.get("cursor"))
+
+        ids = [pid for pid, _ in hits]
+        rows = {r.id: r for r in db.session.query(*PRODUCT_LIST_COLUMNS).filter(Product.id.in_(ids))} if ids else {}
+        stock_map = stock_on_hand(ids)
+        variant_map, image_map = variants_and_images(ids)
+
+        data = []
+        for pid, rank in hits:
+            r = rows.get(pid)
+            if r is None:
+                continue
+            item = _product_list_row(r)
+            del item["created_at"]
+            item["stock"] = stock_map.get(pid, 0)
+            item["variants"] = variant_map.get(pid, [])
+            item["images"] = image_map.get(pid, [])
+            item["score"] = round(-rank, 4)   # bm25 ยิ่งน้อยยิ่งตรง -> กลับเครื่องหมายให้อ่านง่าย
+            data.append(item)
+
+        return jsonify({"data": data, "pagination": {"limit": limit, "next_cursor": next_cursor}}), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to search products: {str(e)}"}), 500
+
+
+# 17. API GET/POST - สแกนบาร์โค้ด (sku + sku_suffix) -> variant + ยอดคงเหลือ
+#     GET ?code=A&code=B&warehouse_id= (สแกนทีละตัว) ; POST {"codes": [...], "warehouse_id": 1} (ทีละชุด สูงสุด 200)
+@product_bp.route('/barcodes/resolve', methods=['GET', 'POST'])
+@jwt_required()
+def resolve_barcodes():
+    try:
+        wsid = int(get_jwt()["wsid"])
+        if request.method == 'POST':
+            p = request.get_json(silent=True) or {}
+            codes = p.get("codes") or ([p["code"]] if p.get("code") else [])
+            warehouse_id = p.get("warehouse_id")
+        else:
+            codes = request.args.getlist("code")
+            warehouse_id = request.args.get("warehouse_id")
+        if not isinstance(codes, list):
+            raise ValueError("codes must be a list")
+
+        results = resolve_codes(wsid, codes, int(warehouse_id) if warehouse_id else None)
+        return jsonify({"data": results}), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to resolve barcodes: {str(e)}"}), 500
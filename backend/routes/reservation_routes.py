@@ -0,0 +1,224 @@
+import json
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import selectinload
+from models import db, SalesChannel, StockReservation, StockReservationItem
+from services.fefo import AllocationConflict, run_with_fefo_retry
+from services.pagination import keyset_page, parse_limit
+from services.reservation import (HEADER_FIELDS, ReservationConflict, confirm_reservation,
+                                  create_reservation, release_reservation, resolve_reservation_lines)
+from services.stock_level import resolve_warehouse_id
+
+reservation_bp = Blueprint('reservation_bp', __name__, url_prefix='/api/reservation')
+
+_MONEY_FIELDS = ("shipping_fee", "shop_discount", "platform_discount", "coin_discount")
+
+
+def _payload():
+    return request.get_json(silent=True) or request.form
+
+
+def _header_from(p) -> dict:
+    header = {}
+    for k in HEADER_FIELDS:
+        if k in _MONEY_FIELDS:
+            header[k] = float(p.get(k) or 0)
+        else:
+            header[k] = p.get(k) or None
+    return header
+
+
+def _serialize_reservation(r: StockReservation) -> dict:
+    return {
+        "id": r.id,
+        "status": r.status,
+        "channel_id": r.channel_id,
+        "warehouse_id": r.warehouse_id,
+        "external_order_id": r.external_order_id,
+        "expires_at": r.expires_at.isoformat() if r.expires_at else None,
+        "released_at": r.released_at.isoformat() if r.released_at else None,
+        "sale_id": r.sale_id,
+        "customer_name": r.customer_name,
+        "province": r.province,
+        "items": [{
+            "product_id": it.product_id,
+            "variant_id": it.variant_id,
+            "pack_size": it.pack_size,
+            "quantity_pack": it.quantity_pack,
+            "unit_price": it.unit_price,
+            "batches": [{"batch_id": b.batch_id, "qty": b.qty} for b in it.batches],
+        } for it in r.items],
+    }
+
+
+# 1. API POST - จองสต็อกให้ออเดอร์ที่ยังไม่จ่าย (กันล็อตตาม FEFO ไว้จนถึง expires_at)
+@reservation_bp.route('/', methods=['POST'])
+@jwt_required()
+def create_stock_reservation():
+    """
+    body (JSON หรือ form): channel_id, items=[{variant_id, quantity_pack, unit_price}],
+        warehouse_id / external_order_id / ttl_seconds [optional],
+        customer_name, province, shipping_fee, shop_discount, platform_discount, coin_discount [optional]
+    """
+    try:
+        wsid = int(get_jwt()["wsid"])
+        p = _payload()
+
+        channel_id = p.get("channel_id")
+        if not channel_id:
+            return jsonify({"error": "❌ channel_id is required"}), 400
+        channel = db.session.get(SalesChannel, int(channel_id))
+        if not channel:
+            return jsonify({"error": "❌ SalesChannel not found"}), 404
+
+        items = p.get("items")
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except json.JSONDecodeError:
+                return jsonify({"error": "❌ items must be valid JSON"}), 400
+
+        cfg = current_app.config
+        ttl = int(p.get("ttl_seconds") or cfg.get("RESERVATION_TTL_SECONDS", 1800))
+        if ttl <= 0 or ttl > int(cfg.get("RESERVATION_MAX_TTL_SECONDS", 7 * 24 * 3600)):
+            return jsonify({"error": "❌ ttl_seconds out of range"}), 400
+
+        warehouse_id = resolve_warehouse_id(wsid, p.get("warehouse_id") or channel.default_warehouse_id)
+        lines = resolve_reservation_lines(wsid, items)
+        header = _header_from(p)
+        external_order_id = (p.get("external_order_id") or "").strip() or None
+
+        def _persist():
+            # ชนกับบิล/ใบจองอื่นกลางทาง -> savepoint rollback แล้ว re-plan ใหม่
+            with db.session.begin_nested():
+                return create_reservation(wsid, warehouse_id, channel.id, lines, header, ttl, external_order_id)
+
+        res = run_with_fefo_retry(_persist)
+        db.session.commit()
+        return jsonify({"message": "✅ Stock reserved", "reservation": _serialize_reservation(res)}), 201
+
+    except AllocationConflict as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}", "hint": "สต็อกถูกตัด/จองพร้อมกัน ลองใหม่อีกครั้ง"}), 409
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "❌ This order already has an open or confirmed reservation"}), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to reserve stock: {str(e)}"}), 500
+
+
+# 2. API POST - ยืนยันใบจอง -> สร้าง Sale จากล็อตที่กันไว้ (ไม่ re-plan)
+@reservation_bp.route('/<int:reservation_id>/confirm', methods=['POST'])
+@jwt_required()
+def confirm_stock_reservation(reservation_id: int):
+    """body [optional]: sale_date (ISO), shipping_fee / discounts / customer_name / province (ทับค่าตอนจอง)"""
+    try:
+        res = (
+            db.session.query(StockReservation)
+            .options(selectinload(StockReservation.items).selectinload(StockReservationItem.batches))
+            .filter(StockReservation.id == reservation_id)
+            .first()
+        )
+        if not res:
+            return jsonify({"error": "❌ Reservation not found"}), 404
+
+        p = _payload()
+        sale_date = datetime.fromisoformat(p["sale_date"]) if p.get("sale_date") else None
+        overrides = {k: v for k, v in _header_from(p).items() if p.get(k) not in (None, "")}
+
+        with db.session.begin_nested():
+            sale = confirm_reservation(res, sale_date, overrides)
+        db.session.commit()
+        return jsonify({
+            "message": "✅ Reservation confirmed",
+            "reservation_id": res.id,
+            "sale_id": sale.id,
+            "totals": {
+                "subtotal": sale.subtotal,
+                "customer_pay": sale.customer_pay,
+                "seller_receive": sale.seller_receive,
+            },
+        }), 200
+
+    except (AllocationConflict, ReservationConflict) as e:
+        # ใบจองหมดอายุ / ถูกยืนยัน-ยกเลิกไปก่อน / ยอดที่กันไว้หายไป
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 409
+    except ValueError as e:
+        # input ไม่ถูกต้อง (sale_date / ตัวเลข) หรือช่องทางไม่มี PlatformTier
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to confirm reservation: {str(e)}"}), 500
+
+
+# 3. API POST - ยกเลิกใบจอง (คืนยอดที่กันไว้)
+@reservation_bp.route('/<int:reservation_id>/release', methods=['POST'])
+@jwt_required()
+def release_stock_reservation(reservation_id: int):
+    try:
+        res = db.session.get(StockReservation, reservation_id)
+        if not res:
+            return jsonify({"error": "❌ Reservation not found"}), 404
+        if not release_reservation(res):
+            db.session.rollback()
+            return jsonify({"error": f"❌ Reservation is already {res.status}"}), 409
+        db.session.commit()
+        return jsonify({"message": "✅ Reservation released", "reservation_id": reservation_id}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to release reservation: {str(e)}"}), 500
+
+
+# 4. API GET - รายการใบจอง (?status=ACTIVE & cursor/limit)
+@reservation_bp.route('/', methods=['GET'])
+@jwt_required()
+def list_stock_reservations():
+    try:
+        args = request.args
+        q = (
+            db.session.query(StockReservation)
+            .options(selectinload(StockReservation.items).selectinload(StockReservationItem.batches))
+        )
+        if args.get("status"):
+            q = q.filter(StockReservation.status == args["status"].upper())
+        if args.get("channel_id"):
+            q = q.filter(StockReservation.channel_id == int(args["channel_id"]))
+
+        limit = parse_limit(args)
+        rows, next_cursor = keyset_page(
+            q, (StockReservation.created_at, StockReservation.id), args.get("cursor"), limit,
+        )
+        return jsonify({
+            "data": [_serialize_reservation(r) for r in rows],
+            "pagination": {"limit": limit, "next_cursor": next_cursor},
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch reservations: {str(e)}"}), 500
+
+
+# 5. API GET detail - ใบจอง + ล็อตที่กันไว้
+@reservation_bp.route('/<int:reservation_id>', methods=['GET'])
+@jwt_required()
+def get_stock_reservation(reservation_id: int):
+    try:
+        res = db.session.get(StockReservation, reservation_id)
+        if not res:
+            return jsonify({"error": "❌ Reservation not found"}), 404
+        return jsonify(_serialize_reservation(res)), 200
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch reservation: {str(e)}"}), 500
@@ -1,49 +1,33 @@
-import math
 import traceback
-from flask import  Blueprint, jsonify, request
+from flask import  Blueprint, current_app, jsonify, request
 from models import ProductVariant, SaleItem, SaleItemBatch, StockBatch, StockMovement, db,Product, SalesChannel, Sale
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy import func, distinct
+from services.stock_level import apply_stock_deltas, batch_deltas, refresh_stockin_locks, resolve_warehouse_id
+from services.fefo import AllocationConflict, plan_fefo_order, run_with_fefo_retry
+from services.sales import build_sale, persist_sales
+from services.cogs import profit_summary, resnapshot_sale_cogs, reverse_sale_cogs
+from services.checkpoint import invalidate_checkpoints
+from services.reorder import record_sales_velocity
+from services.bulk_stockin import iter_rows
+from services.pagination import keyset_page, parse_limit, wants_total
+from services.export import parse_export_args, sales_export_query, stream_export
+from services.versioning import SALES, STOCKINS, bump_versions
+from decorators.etag import conditional_get
+from services.marketplace_import import PLATFORM_COLUMNS, MarketplaceOrderImporter, group_orders, resolve_columns
+from flask_jwt_extended import jwt_required, get_jwt
 
 sale_bp = Blueprint('sale_bp', __name__, url_prefix='/api/sale')
 
 def _today_utc():
     return datetime.utcnow()
 
-def _is_expired(expiry: date | None) -> bool:
-    return bool(expiry and expiry < date.today())
-
-def _allocate_fefo(product_id: int, units_needed: int):
-    if units_needed <= 0:
-        return []
-    # FEFO: NULL expiry ไปท้าย
-    batches = (
-        db.session.query(StockBatch)
-        .filter(StockBatch.product_id == product_id, StockBatch.qty_remaining > 0)
-        .order_by((StockBatch.expiry_date.is_(None)).asc(), StockBatch.expiry_date.asc())
-        .with_for_update()  # SQLite จะ ignore; DB อื่นจะ lock แถวให้
-        .all()
-    )
-    plan, remain = [], units_needed
-    for b in batches:
-        if _is_expired(b.expiry_date):
-            continue
-        take = min(int(b.qty_remaining or 0), remain)
-        if take <= 0:
-            continue
-        plan.append((b.id, take))
-        remain -= take
-        if remain <= 0:
-            break
-    if remain > 0:
-        raise ValueError(f"Not enough stock: need {units_needed}, short {remain}")
-    return plan
-
 
 # 1. API POST - create sale order
 @sale_bp.route('/<int:product_id>', methods=['POST'])
+@jwt_required()
 def create_sale_single(product_id):
     try:
         p = request.form
@@ -94,91 +78,58 @@ def create_sale_single(product_id):
             .options(joinedload(ProductVariant.product))
             .get(variant_id)
         )
-        if not variant or int(variant.product_id) != int(product_id):
+        # variant ไม่มี workspace_id (ไม่ถูก tenant scope) -> เช็คร้านผ่านสินค้าแม่
+        if not variant or variant.product is None or variant.product.workspace_id != int(get_jwt()["wsid"]):
+            return jsonify({"error": "❌ ProductVariant not found"}), 404
+        if int(variant.product_id) != int(product_id):
             return jsonify({"error": "❌ variant_id does not belong to product_id"}), 400
 
         pack_size = int(variant.pack_size or 0)
         if pack_size <= 0:
             return jsonify({"error": "❌ variant.pack_size invalid"}), 400
 
-        sale_mode = variant.sale_mode or "variant"
-        qty_pack  = int(qty_pack)
-        base_units = pack_size * qty_pack
-        unit_price = float(unit_price)
-        line_total = unit_price * qty_pack
+        # ร้าน/คลังของบิล: warehouse_id ที่ส่งมา -> คลัง default ของช่องทาง -> คลัง default ของร้าน
+        workspace_id = variant.product.workspace_id
+        warehouse_id = resolve_warehouse_id(workspace_id, p.get("warehouse_id") or channel.default_warehouse_id)
 
-        # 4) วางแผน FEFO ก่อนทำจริง
-        plan = _allocate_fefo(product_id, base_units)  # [(batch_id, qty), ...]
+        line = {
+            "product_id": product_id,
+            "variant_id": variant.id,
+            "sale_mode": variant.sale_mode or "variant",
+            "pack_size": pack_size,
+            "quantity_pack": int(qty_pack),
+            "unit_price": float(unit_price),
+        }
+        base_units = pack_size * line["quantity_pack"]
+
+        header = dict(
+            workspace_id=workspace_id,
+            warehouse_id=warehouse_id,
+            channel_id=channel.id,
+            sale_date=sale_date,
+            customer_name=p.get("customer_name"),
+            province=p.get("province"),
+            # note=p.get("note"),
+            channel_name_at_sale=channel.channel_name,
+            commission_percent_at_sale=commission_pct,
+            transaction_percent_at_sale=transaction_pct,
+            shipping_fee=shipping_fee,
+            shop_discount=shop_discount,
+            platform_discount=platform_discount,
+            coin_discount=coin_discount,
+        )
 
-        # 5) Persist ทั้งบิล (หนึ่งรายการเดียว)
-        with db.session.begin_nested():
-            sale = Sale(
-                channel_id=channel.id,
-                sale_date=sale_date,
-                customer_name=p.get("customer_name"),
-                province=p.get("province"),
-                # note=p.get("note"),
-                channel_name_at_sale=channel.channel_name,
-                commission_percent_at_sale=commission_pct,
-                transaction_percent_at_sale=transaction_pct,
-                shipping_fee=shipping_fee,
-                shop_discount=shop_discount,
-                platform_discount=platform_discount,
-                coin_discount=coin_discount,
-            )
-            db.session.add(sale)
-            db.session.flush()
-
-            si = SaleItem(
-                sale_id=sale.id,
-                product_id=product_id,
-                variant_id=variant_id,
-                sale_mode_at_sale=sale_mode,
-                pack_size_at_sale=pack_size,
-                quantity_pack=qty_pack,
-                unit_price_at_sale=unit_price,
-                base_units=base_units,
-                line_total=line_total,
-            )
-            db.session.add(si)
-            db.session.flush()
-
-            # ตัดล็อตตามแผน
-            for (batch_id, cut_qty) in plan:
-                batch = db.session.get(StockBatch, batch_id)
-                if not batch:
-                    raise ValueError(f"Batch not found: {batch_id}")
-                if _is_expired(batch.expiry_date):
-                    raise ValueError(f"Batch expired while allocating: {batch_id}")
-                if int(batch.qty_remaining or 0) < int(cut_qty):
-                    raise ValueError("Concurrent update: batch not enough")
-
-                batch.qty_remaining = int(batch.qty_remaining) - int(cut_qty)
-
-                db.session.add(SaleItemBatch(
-                    sale_item_id=si.id,
-                    product_id=product_id,
-                    batch_id=batch.id,
-                    qty=int(cut_qty),
-                ))
-
-                db.session.add(StockMovement(
-                    product_id=product_id,
-                    batch_id=batch.id,
-                    movement_type="OUT",
-                    qty=-int(cut_qty),
-                    batch_qty_remaining=int(batch.qty_remaining),
-                    ref_sale_id=sale.id,
-                    note=f"SaleItem #{si.id}",
-                ))
-
-            # คิดยอดบิล (อย่างง่าย)
-            sale.subtotal = float(line_total)
-            sale.customer_pay = sale.subtotal - shop_discount  - platform_discount - coin_discount + shipping_fee
-            sale.commission_fee  = math.floor(sale.subtotal * (commission_pct / 100.0))
-            sale.transaction_fee = round((sale.customer_pay + platform_discount + coin_discount) * (transaction_pct / 100.0))
-            sale.vat_amount = (sale.commission_fee + sale.transaction_fee) * 7 / 107
-            sale.seller_receive = sale.subtotal - sale.commission_fee - sale.transaction_fee - shop_discount
+        def _persist():
+            # 4) วางแผน FEFO ก่อนทำจริง (ทั้งออเดอร์ใน query เดียว; ตอนนี้ 1 บิล = 1 รายการ)
+            plan = plan_fefo_order([(product_id, base_units)], workspace_id, warehouse_id)[0]  # [(batch_id, qty), ...]
+
+            # 5) Persist ทั้งบิล — ชนกับบิลอื่นกลางทาง savepoint จะ rollback แล้ว re-plan ใหม่
+            with db.session.begin_nested():
+                sale = build_sale(header, [line], [plan])
+                persist_sales([sale])
+            return sale, plan
+
+        sale, plan = run_with_fefo_retry(_persist)
         db.session.commit()
 
         # 6) Response
@@ -210,6 +161,9 @@ def create_sale_single(product_id):
             }
         }), 201
 
+    except AllocationConflict as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}", "hint": "สต็อกถูกตัดพร้อมกันหลายบิล ลองใหม่อีกครั้ง"}), 409
     except ValueError as e:
         db.session.rollback()
         return jsonify({"error": f"❌ {str(e)}"}), 400
@@ -220,39 +174,51 @@ def create_sale_single(product_id):
     
 # 2. API GET - get all sale orders by Product Id with pagination
 @sale_bp.route("/<int:product_id>", methods=["GET"])
+@jwt_required()
+@conditional_get(SALES, STOCKINS)
 def get_all_sale_orders(product_id):
     try:
-        # pagination
-        page  = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
-        offset = (page - 1) * limit
+        args = request.args
+        limit = parse_limit(args)
 
-        include_alloc = request.args.get('include_allocations') in ("1", "true", "True")
+        include_alloc = args.get('include_allocations') in ("1", "true", "True")
 
         # ดึงเฉพาะใบขายที่มี SaleItem ของ product นี้
         # (ในระบบคุณ 1 ใบ = 1 รายการอยู่แล้ว แต่เขียนให้เผื่ออนาคต)
+        # ใช้ EXISTS แทน JOIN -> 1 แถวต่อ 1 ใบเสมอ (LIMIT ไม่เพี้ยนเมื่อบิลมีหลายรายการของสินค้าเดียวกัน)
         q = (
             db.session.query(Sale)
-            .join(Sale.items)  # join SaleItem
-            .filter(SaleItem.product_id == product_id)
+            .filter(Sale.items.any(SaleItem.product_id == product_id))
             .options(
                 # โหลด items (และ variant snapshot) มาในครั้งเดียว
                 selectinload(Sale.items).selectinload(SaleItem.variant),
-                # ถ้าอยากได้ allocation (lot/qty ต่อ batch) ให้ joinedload batches ด้วย
-                joinedload(Sale.items).joinedload(SaleItem.batches) if include_alloc else selectinload(Sale.items),
+                # ถ้าอยากได้ allocation (lot/qty ต่อ batch) ให้โหลด batches ด้วย
+                selectinload(Sale.items).selectinload(SaleItem.batches) if include_alloc else selectinload(Sale.items),
             )
-            .order_by(Sale.sale_date.desc(), Sale.id.desc())
         )
 
-        # นับจำนวนใบขาย (distinct sale.id) สำหรับสินค้านี้
-        total = (
-            db.session.query(func.count(distinct(Sale.id)))
-            .join(Sale.items)
-            .filter(SaleItem.product_id == product_id)
-            .scalar()
-        )
+        # ?cursor= -> keyset บน (sale_date, id) แทน OFFSET; ไม่ส่ง -> page/limit แบบเดิม
+        cursor_mode = "cursor" in args
+        if cursor_mode:
+            sales_orders, next_cursor = keyset_page(q, (Sale.sale_date, Sale.id), args.get("cursor"), limit)
+            page = None
+        else:
+            page = int(args.get('page', 1))
+            sales_orders = (
+                q.order_by(Sale.sale_date.desc(), Sale.id.desc())
+                .offset((page - 1) * limit)
+                .limit(limit)
+                .all()
+            )
 
-        sales_orders = q.offset(offset).limit(limit).all()
+        # นับจำนวนใบขาย (distinct sale.id) สำหรับสินค้านี้ — โหมด cursor นับเฉพาะเมื่อขอ ?with_total=1
+        total = None
+        if not cursor_mode or wants_total(args):
+            total = (
+                db.session.query(func.count(distinct(SaleItem.sale_id)))
+                .filter(SaleItem.product_id == product_id)
+                .scalar()
+            )
 
         # ถ้าต้องการรายละเอียดล็อต (lot_number/expiry) ของ allocation
         # แนะนำให้มี relationship ใน SaleItemBatch: batch = db.relationship("StockBatch")
@@ -320,16 +286,20 @@ def get_all_sale_orders(product_id):
                 "page": page,
                 "limit": limit,
                 "total": total,
-                "total_pages": (total + limit - 1) // limit
+                "total_pages": (total + limit - 1) // limit if total is not None else None,
+                "next_cursor": next_cursor if cursor_mode else None,
             }
         }
         return jsonify(result), 200
 
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"❌ Unexpected error: {str(e)}"}), 500
 
 #3. API DELETE - delete a sale order
 @sale_bp.route("/<int:sale_id>", methods=["DELETE"])
+@jwt_required()
 def delete_sale(sale_id: int):
     try:
         force = request.args.get('force') in ('1','true','True')
@@ -347,6 +317,7 @@ def delete_sale(sale_id: int):
             return jsonify({"error": "❌ Sale not found"}), 404
 
         restored = []
+        restored_batches = []
 
         with db.session.begin_nested():
             # 1) คืนสต็อกจาก allocations เดิม
@@ -378,6 +349,7 @@ def delete_sale(sale_id: int):
                         target  = before + add_qty
 
                     b.qty_remaining = target
+                    restored_batches.append((b, add_qty))
                     restored.append({
                         "batch_id": b.id,
                         "lot_number": b.lot_number,
@@ -386,13 +358,28 @@ def delete_sale(sale_id: int):
                         "qty_remaining_after": int(target)
                     })
 
-            # 2) ลบ movement ที่อ้างใบขายนี้ทิ้งก่อน (กัน FK fail)
+            # 2) ลบ movement ที่อ้างใบขายนี้ทิ้งก่อน (กัน FK fail) ; checkpoint ที่ตัดหลัง movement เหล่านี้ใช้ไม่ได้แล้ว
+            invalidate_checkpoints(sale.workspace_id, StockMovement.ref_sale_id == sale.id)
             db.session.query(StockMovement)\
                 .filter(StockMovement.ref_sale_id == sale.id)\
                 .delete(synchronize_session=False)
 
-            # 3) ลบ sale (SaleItem/SaleItemBatch จะหายเพราะ cascade)
+            # 3) กลับรายการต้นทุนขาย (append แถว REVERSAL) แล้วลบ sale (SaleItem/SaleItemBatch จะหายเพราะ cascade)
+            reverse_sale_cogs(sale.workspace_id, sale.id)
+            if sale.sale_date:
+                # หักยอดขายออกจาก velocity (มีผลเฉพาะบิลของวันล่าสุดที่ยังไม่ปิดเข้า EWMA)
+                unsold = {}
+                for item in sale.items:
+                    for sib in item.batches:
+                        vkey = (sale.workspace_id, sib.product_id, sale.sale_date.date())
+                        unsold[vkey] = unsold.get(vkey, 0) - int(sib.qty or 0)
+                record_sales_velocity(unsold)
             db.session.delete(sale)
+            bump_versions(sale.workspace_id, SALES)
+
+            # 4) คืนยอดคงเหลือสะสม (stock_level) + ใบรับเข้าที่ไม่มีล็อตถูกใช้แล้วกลับมาแก้ได้
+            apply_stock_deltas(batch_deltas(restored_batches))
+            refresh_stockin_locks(StockBatch.id.in_([b.id for b, _ in restored_batches]))
 
         db.session.commit()
         return jsonify({
@@ -410,6 +397,8 @@ def delete_sale(sale_id: int):
     
 #4. API GET detail - get sale detail by Id
 @sale_bp.route("/detail/<int:sale_id>", methods=["GET"])
+@jwt_required()
+@conditional_get(SALES, STOCKINS)
 def get_sale_detail(sale_id: int):
     try:
         sale = (
@@ -501,6 +490,7 @@ def get_sale_detail(sale_id: int):
 
 #5. API PATCH - แก้ไข sale แค่ Header ห้ามแก้จำนวน quantity
 @sale_bp.route("/<int:sale_id>", methods=["PATCH"])
+@jwt_required()
 def patch_sale_header(sale_id: int):
     try:
         p = request.form
@@ -564,9 +554,142 @@ def patch_sale_header(sale_id: int):
         sale.customer_pay    = round(pre_vat + vat, 2)
         sale.seller_receive  = round(sale.customer_pay - sale.commission_fee - sale.transaction_fee, 2)
 
+        # COGS เก็บ sale_date / channel_id ซ้ำไว้ group กำไร -> ต้องตามหัวบิลใน transaction เดียวกัน
+        if "sale_date" in p or "channel_id" in p:
+            resnapshot_sale_cogs(sale)
+
+        bump_versions(sale.workspace_id, SALES)
         db.session.commit()
         return jsonify({"message": "✅ Sale updated (header)"}), 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": f"❌ Failed to patch sale: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"❌ Failed to patch sale: {str(e)}"}), 500
+
+
+#6. API POST - import ออเดอร์จากไฟล์ export ของ marketplace (Shopee / Lazada / TikTok)
+@sale_bp.route("/import/<string:platform>", methods=["POST"])
+@jwt_required()
+def import_marketplace_orders(platform: str):
+    """
+    form-data:
+      - file (CSV export ของ platform)      # required
+      - channel_id (int)                    # required: ช่องทางของ platform นั้น
+      - warehouse_id (int) [optional: ไม่ส่ง -> คลัง default ของช่องทาง -> คลัง default ของร้าน]
+    behavior:
+      - รวมแถวตามเลขออเดอร์ -> 1 ออเดอร์ = 1 Sale (SKU = product.sku + variant.sku_suffix)
+      - ออเดอร์ที่เคย import แล้ว / ยกเลิก จะถูกข้าม; SKU ไม่เจอ / สต็อกไม่พอ รายงานใน errors
+      - commit ทีละ chunk (IMPORT_CHUNK_ORDERS) -> รันไฟล์เดิมซ้ำได้
+    """
+    try:
+        platform = (platform or "").lower()
+        if platform not in PLATFORM_COLUMNS:
+            return jsonify({"error": f"❌ Unsupported platform: {platform}"}), 400
+
+        wsid = int(get_jwt()["wsid"])
+        upload = request.files.get("file")
+        if not upload:
+            return jsonify({"error": "❌ Missing file"}), 400
+        channel_id = request.form.get("channel_id")
+        if not channel_id:
+            return jsonify({"error": "❌ channel_id is required"}), 400
+
+        channel = (
+            db.session.query(SalesChannel)
+            .options(joinedload(SalesChannel.platform_tier))
+            .filter(SalesChannel.id == int(channel_id), SalesChannel.workspace_id == wsid)
+            .first()
+        )
+        if not channel:
+            return jsonify({"error": "❌ SalesChannel not found"}), 404
+        tier = channel.platform_tier
+        if not tier:
+            return jsonify({"error": "❌ SalesChannel has no PlatformTier bound"}), 400
+        if (tier.platform.name or "").lower() != platform:
+            return jsonify({"error": f"❌ SalesChannel is not a {platform} channel"}), 400
+
+        rows = iter_rows(upload.stream, "csv")
+        first = next(rows, None)
+        if first is None:
+            return jsonify({"error": "❌ Empty file"}), 400
+
+        try:
+            warehouse_id = resolve_warehouse_id(wsid, request.form.get("warehouse_id") or channel.default_warehouse_id)
+            header = first[1].keys() if isinstance(first[1], dict) else []
+            cols = resolve_columns(platform, header, current_app.config.get("MARKETPLACE_COLUMN_MAP"))
+        except ValueError as e:
+            return jsonify({"error": f"❌ {str(e)}"}), 400
+
+        def _all_rows():
+            yield first
+            yield from rows
+
+        importer = MarketplaceOrderImporter(platform, channel, wsid, warehouse_id, cols)
+        summary = importer.run(
+            group_orders(_all_rows(), platform, cols),
+            chunk_size=int(current_app.config.get("IMPORT_CHUNK_ORDERS", 500)),
+        )
+
+        status = 201 if summary["orders_created"] else 200
+        return jsonify({"message": "✅ Orders imported", "platform": platform, **summary}), status
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f"❌ Marketplace import failed ({platform})")
+        return jsonify({"error": f"❌ Failed to import orders: {str(e)}"}), 500
+
+
+#7. API GET - กำไรต่อบิล / ช่องทาง / วัน (seller_receive - COGS จาก cogs_ledger)
+@sale_bp.route("/profit", methods=["GET"])
+@jwt_required()
+def get_profit():
+    """
+    query: group_by = sale | channel | day (default day)
+           date_from, date_to (yyyy-MM-dd, รวมวันสุดท้าย) [optional]
+           limit (เฉพาะ group_by=sale, default 100)
+    """
+    try:
+        wsid = int(get_jwt()["wsid"])
+        args = request.args
+        group_by = (args.get("group_by") or "day").lower()
+
+        date_from = date.fromisoformat(args["date_from"]) if args.get("date_from") else None
+        date_to = date.fromisoformat(args["date_to"]) + timedelta(days=1) if args.get("date_to") else None
+
+        rows = profit_summary(
+            wsid, group_by,
+            datetime.combine(date_from, datetime.min.time()) if date_from else None,
+            datetime.combine(date_to, datetime.min.time()) if date_to else None,
+            limit=parse_limit(args, default=100),
+        )
+        return jsonify({
+            "group_by": group_by,
+            "data": rows,
+            "totals": {
+                "seller_receive": sum(r["seller_receive"] for r in rows),
+                "cogs": sum(r["cogs"] for r in rows),
+                "profit": sum(r["profit"] for r in rows),
+            },
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch profit: {str(e)}"}), 500
+
+
+#8. API GET - export ประวัติขาย (1 แถวต่อรายการสินค้า) แบบ stream : ?format=csv|ndjson & date_from/date_to & channel_id/warehouse_id/product_id
+@sale_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_sales():
+    try:
+        wsid = int(get_jwt()["wsid"])
+        f = parse_export_args(request.args)
+        return stream_export(sales_export_query(wsid, f), f["format"], f"sales_{date.today():%Y%m%d}")
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to export sales: {str(e)}"}), 500
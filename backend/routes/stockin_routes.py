@@ -6,7 +6,16 @@ import os
 import json
 from datetime import date, datetime, timezone
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
+from sqlalchemy import distinct, func, select
+from flask_jwt_extended import jwt_required, get_jwt
+from services.stock_level import apply_stock_deltas, batch_deltas, resolve_warehouse_id
+from services.doc_number import next_doc_number
+from services.bulk_stockin import BulkStockInImporter, iter_rows
+from services.pagination import keyset_page, parse_limit, wants_total
+from services.versioning import STOCK, STOCKINS, bump_versions
+from decorators.etag import conditional_get
+from services.cogs import add_batch_cost, parse_unit_cost
+from services.checkpoint import invalidate_checkpoints
 
 stockin_bp = Blueprint('stockin_bp', __name__, url_prefix='/api/stock-in')
 
@@ -43,26 +52,25 @@ def auto_lot(doc_number: str) -> str:
     base = (doc_number or "GRN").replace(' ', '').upper()
     return f"LOT-{base}"
 
-def generate_doc_number():
-    today = datetime.now().strftime("%Y%m%d")
-    prefix = f"GRN-{today}"
-
-    # หา doc_number ล่าสุดของวันนี้
-    last = (
-        db.session.query(StockIn)
-        .filter(StockIn.doc_number.like(f"{prefix}-%"))
-        .order_by(StockIn.doc_number.desc())
-        .first()
-    )
-
-    if last:
-        # ดึงเลขท้ายมา +1
-        last_num = int(last.doc_number.split("-")[-1])
-        next_num = last_num + 1
-    else:
-        next_num = 1
+def generate_doc_number(workspace_id: int):
+    today = date.today()
+    prefix = f"GRN-{today.strftime('%Y%m%d')}"
+
+    def _last_issued():
+        # ใช้ครั้งเดียวต่อวันต่อร้าน ตอนยังไม่มีตัวนับ (เลขที่เคยออกก่อนเปลี่ยนมาใช้ doc_sequence)
+        last = (
+            db.session.query(StockIn.doc_number)
+            .filter(StockIn.workspace_id == workspace_id, StockIn.doc_number.like(f"{prefix}-%"))
+            .order_by(StockIn.doc_number.desc())
+            .first()
+        )
+        try:
+            return int(last[0].split("-")[-1]) if last else 0
+        except ValueError:
+            return 0
 
-    return f"{prefix}-{next_num:03d}"
+    # ตัวนับรายวันต่อร้าน (atomic) แทนการ LIKE scan ทุกครั้ง
+    return next_doc_number(workspace_id, "GRN", today, seed=_last_issued)
 
 def _get_receipts_dir():
     base = current_app.config.get("RECEIPTS_DIR")
@@ -93,6 +101,7 @@ def _delete_receipt_file(filename: str | None):
 # API - ที่เกี่ยวกับ STOCKIN ทั้งหมด
 # 1. API POST - add new stockin
 @stockin_bp.route('/', methods=['POST'])
+@jwt_required()
 def create_stockin():
     """
     form-data:
@@ -102,11 +111,13 @@ def create_stockin():
       - note (str) [optional]
       - order_image (file) [optional]
       - doc_number (str) [optional แต่ควรมี; ถ้าไม่มีจะปล่อย None]
+      - warehouse_id (int) [optional: ไม่ส่ง -> ใช้คลัง default ของร้าน]
       - entries (json)  # required
         [
-          {"variant_id":10, "quantity":5,  "custom_sale_mode":null,        "custom_pack_size":null, "pack_size_at_receipt":12, "lot_number":"A1"},
+          {"variant_id":10, "quantity":5,  "custom_sale_mode":null,        "custom_pack_size":null, "pack_size_at_receipt":12, "lot_number":"A1", "unit_cost": 8.5},
           {"variant_id":null,"quantity":3,  "custom_sale_mode":"doublePack","custom_pack_size":20,  "pack_size_at_receipt":20, "lot_number":"A1"}
         ]
+      - unit_cost (float) [optional: ต้นทุน/หน่วยย่อย ของทั้งใบ; entry ไม่ส่ง -> ใช้ค่านี้ -> product.cost_price]
     behavior:
       - ทุก entry ใช้ product_id จาก header เสมอ
       - รวมเป็น batch เดียวกัน ถ้า (stockin_id, product_id, lot_number, expiry_date) ตรงกัน
@@ -129,6 +140,12 @@ def create_stockin():
         if not product:
             return jsonify({"error": "❌ Product not found"}), 404
 
+        workspace_id = product.workspace_id
+        try:
+            warehouse_id = resolve_warehouse_id(workspace_id, data.get("warehouse_id"))
+        except ValueError as e:
+            return jsonify({"error": f"❌ {str(e)}"}), 400
+
         # --- 2) parse created_at / expiry_date ---
         try:
             created_at = parse_iso_datetime(data.get("created_at"))
@@ -155,7 +172,7 @@ def create_stockin():
 
         doc_number = data.get("doc_number")
         if not doc_number:
-            doc_number = generate_doc_number()
+            doc_number = generate_doc_number(workspace_id)
 
         header_lot = (data.get("lot_number") or "").strip() or None
         if header_lot:
@@ -164,10 +181,16 @@ def create_stockin():
             
         default_lot = header_lot or auto_lot(doc_number or "GRN")
 
+        try:
+            header_cost = parse_unit_cost(data.get("unit_cost"), product.cost_price)
+        except ValueError as e:
+            return jsonify({"error": f"❌ {str(e)}"}), 400
+
         # --- 5) begin transaction ---
         with db.session.begin_nested():
             # 5.1 สร้าง header StockIn (expiry ทั้งใบ)
             new_stockin = StockIn(
+                workspace_id=workspace_id,
                 doc_number=doc_number,
                 created_at=created_at,
                 expiry_date=expiry_date,
@@ -214,7 +237,7 @@ def create_stockin():
                 if pack_size_at_receipt is None:
                     if variant_id:
                         variant = db.session.get(ProductVariant, variant_id)
-                        if not variant:
+                        if not variant or variant.product_id != header_product_id:
                             return jsonify({"error": f"❌ Entry #{idx}: Variant {variant_id} not found"}), 404
                         pack_size_at_receipt = int(variant.pack_size or 0)
                     else:
@@ -230,9 +253,13 @@ def create_stockin():
                 if pack_size_at_receipt <= 0:
                     return jsonify({"error": f"❌ Entry #{idx}: pack_size_at_receipt must be > 0"}), 400
 
-                # 5.4 base units
+                # 5.4 base units + ต้นทุน/หน่วยย่อย
                 base_qty = pack_size_at_receipt * quantity
                 total_base_qty += base_qty
+                try:
+                    unit_cost = parse_unit_cost(v.get("unit_cost"), header_cost)
+                except ValueError as e:
+                    return jsonify({"error": f"❌ Entry #{idx}: {str(e)}"}), 400
 
                 # 5.5 lot_number (optional) -> auto-generate ถ้าไม่ส่งมา
                 lot_number = (v.get("lot_number") or "").strip() or default_lot
@@ -257,12 +284,15 @@ def create_stockin():
                             expiry_date=new_stockin.expiry_date,
                             qty_received=0,
                             qty_remaining=0,
+                            workspace_id=workspace_id,
+                            warehouse_id=warehouse_id,
                         )
                         db.session.add(batch)
                         db.session.flush()
                     created_or_updated_batches[batch_key] = batch
 
-                # 5.7 อัปเดตยอด batch
+                # 5.7 อัปเดตยอด batch (ต้นทุนถัวเฉลี่ยก่อนบวกยอด)
+                add_batch_cost(batch, base_qty, unit_cost)
                 batch.qty_received += base_qty
                 batch.qty_remaining += base_qty
                 db.session.add(batch)
@@ -278,7 +308,10 @@ def create_stockin():
                     custom_pack_size=(None if variant_id else custom_pack_size),
                     pack_size_at_receipt=pack_size_at_receipt,
                     quantity=quantity,
+                    unit_cost=unit_cost,
                     batch_id=batch.id,
+                    workspace_id=workspace_id,
+                    warehouse_id=warehouse_id,
                 )
                 db.session.add(entry)
 
@@ -294,7 +327,13 @@ def create_stockin():
                     batch_qty_remaining=int(b.qty_remaining or 0),
                     ref_stockin_id=new_stockin.id,
                     note=f"StockIn {new_stockin.doc_number} lot {b.lot_number}",
+                    workspace_id=b.workspace_id,
+                    warehouse_id=b.warehouse_id,
                 ))
+
+            # 5.9 อัปเดตยอดคงเหลือสะสม (stock_level) ใน transaction เดียวกัน
+            apply_stock_deltas({(workspace_id, warehouse_id, header_product_id): total_base_qty})
+            bump_versions(workspace_id, STOCKINS)
         # try-commit
         try:
             db.session.commit()
@@ -329,86 +368,150 @@ def create_stockin():
         db.session.rollback()
         return jsonify({"error": f"❌ Unexpected error: {str(e)}"}), 500
     
+# 1.1 API POST - bulk stock-in จากไฟล์ CSV / NDJSON (หลายสินค้าในไฟล์เดียว)
+@stockin_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_stockin_bulk():
+    """
+    form-data:
+      - file (CSV หรือ NDJSON)                    # required
+      - format ('csv' | 'ndjson') [optional: ไม่ส่ง -> ดูจากนามสกุลไฟล์]
+      - warehouse_id (int) [optional: ไม่ส่ง -> คลัง default ของร้าน]
+      - created_at (ISO datetime) [optional], note (str) [optional]
+    คอลัมน์ต่อแถว:
+      doc_number, product_id | sku, variant_id | sku_suffix | (custom_sale_mode + custom_pack_size),
+      quantity, pack_size_at_receipt, lot_number, expiry_date, unit_cost (ต้นทุน/หน่วยย่อย; ว่าง -> product.cost_price)
+    behavior:
+      - แถวที่ doc_number เดียวกันรวมเป็นใบเดียว; ไม่ระบุ -> รวมเป็น GRN ใหม่ 1 ใบ
+      - แถวที่ผิดจะถูกข้ามและรายงานใน errors (แถวอื่นยังรับเข้าได้)
+    """
+    try:
+        wsid = int(get_jwt()["wsid"])
+        upload = request.files.get("file")
+        if not upload:
+            return jsonify({"error": "❌ Missing file"}), 400
+
+        fmt = (request.form.get("format") or "").lower()
+        if not fmt:
+            name = (upload.filename or "").lower()
+            fmt = "ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv"
+        if fmt not in ("csv", "ndjson"):
+            return jsonify({"error": "❌ format must be csv or ndjson"}), 400
+
+        try:
+            warehouse_id = resolve_warehouse_id(wsid, request.form.get("warehouse_id"))
+            created_at = parse_iso_datetime(request.form.get("created_at"))
+        except ValueError as e:
+            return jsonify({"error": f"❌ {str(e)}"}), 400
+
+        importer = BulkStockInImporter(
+            workspace_id=wsid,
+            warehouse_id=warehouse_id,
+            doc_number_factory=lambda: generate_doc_number(wsid),
+            lot_factory=auto_lot,
+            parse_date=parse_flexible_date,
+            created_at=created_at,
+            note=request.form.get("note", ""),
+        )
+        summary = importer.run(
+            iter_rows(upload.stream, fmt),
+            chunk_size=int(current_app.config.get("BULK_STOCKIN_CHUNK_SIZE", 500)),
+        )
+
+        if summary["rows_ok"] == 0:
+            db.session.rollback()
+            return jsonify({"error": "❌ No valid rows", **summary}), 400
+
+        bump_versions(wsid, STOCKINS)
+        db.session.commit()
+        return jsonify({"message": "✅ Bulk StockIn created", **summary}), 201
+
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Unexpected error: {str(e)}"}), 500
+
 # 2. API GET - get stockin by product ID
 @stockin_bp.route('/<int:product_id>', methods=['GET'])
+@jwt_required()
+@conditional_get(STOCKINS, STOCK)
 def get_stockins_by_product(product_id):
+    """
+    ประวัติรับเข้าของสินค้า แบ่งหน้าแบบ keyset บน (created_at, id) : ?cursor= & ?limit= (default 10, สูงสุด 100)
+    1 query ต่อหน้า: หัวใบ + entries / lots ของสินค้านี้รวมเป็น JSON ใน SQL (correlated subquery ต่อใบ)
+    -> 1 แถวต่อ 1 ใบ ไม่มี cartesian join ; locked อ่านจากคอลัมน์ StockIn.locked
+    """
     try:
-        # ถ้า StockIn.batches ไม่ได้เป็น dynamic (แนะนำ): eager load ได้
-        stockins = (
-            db.session.query(StockIn)
-            .join(StockIn.entries)
-            .filter(StockInEntry.product_id == product_id)
-            .options(
-                joinedload(StockIn.entries).joinedload(StockInEntry.variant),
-                joinedload(StockIn.entries).joinedload(StockInEntry.batch),
-                joinedload(StockIn.batches),  # ถ้าเป็น dynamic ให้ลบบรรทัดนี้ แล้วใช้ .all() ด้านล่าง
+        args = request.args
+        limit = parse_limit(args)
+
+        # entries ของสินค้านี้ในใบ (เรียงตาม id) -> JSON array
+        entry_rows = (
+            select(
+                func.json_object(
+                    "entry_id", StockInEntry.id,
+                    "sale_mode", func.coalesce(ProductVariant.sale_mode, StockInEntry.custom_sale_mode),
+                    "quantity", StockInEntry.quantity,
+                    "pack_size", StockInEntry.pack_size_at_receipt,
+                    "total_unit", StockInEntry.pack_size_at_receipt * StockInEntry.quantity,
+                    "lot_number", StockBatch.lot_number,
+                ).label("j")
             )
-            .order_by(StockIn.created_at.desc())
-            .all()
+            .select_from(StockInEntry)
+            .outerjoin(ProductVariant, ProductVariant.id == StockInEntry.variant_id)
+            .outerjoin(StockBatch, StockBatch.id == StockInEntry.batch_id)
+            .where(StockInEntry.stockin_id == StockIn.id, StockInEntry.product_id == product_id)
+            .order_by(StockInEntry.id)
+            .correlate(StockIn)
+            .subquery()
+        )
+        # lots = GROUP BY (lot, expiry) ของล็อตที่รับเข้าจริงในใบ (ไม่นับก้อนที่เกิดจากการโอนคลัง -> ยอดรับไม่บวม)
+        lot_rows = (
+            select(
+                func.json_object(
+                    "lot_number", StockBatch.lot_number,
+                    "expiry_date", StockBatch.expiry_date,
+                    "qty_received", func.sum(StockBatch.qty_received),
+                    "qty_remaining", func.sum(StockBatch.qty_remaining),
+                    "batch_ids", func.json_group_array(StockBatch.id),
+                ).label("j")
+            )
+            .where(
+                StockBatch.stockin_id == StockIn.id,
+                StockBatch.product_id == product_id,
+                StockBatch.origin_batch_id.is_(None),
+            )
+            .group_by(StockBatch.lot_number, StockBatch.expiry_date)
+            .order_by(func.min(StockBatch.id))
+            .correlate(StockIn)
+            .subquery()
         )
 
-        result = []
-        for si in stockins:
-            # ----- Entries (เฉพาะสินค้านี้) -----
-            entries_data = []
-            for e in si.entries:
-                if e.product_id != product_id:
-                    continue
-                pack_size = e.pack_size_at_receipt or 0
-                qty_pack  = e.quantity or 0
-                total_u   = pack_size * qty_pack
-                sale_mode = e.variant.sale_mode if e.variant else e.custom_sale_mode
-                lot_no    = e.batch.lot_number if e.batch else None
-
-                entries_data.append({
-                    "entry_id": e.id,
-                    "sale_mode": sale_mode,
-                    "quantity": qty_pack,
-                    "pack_size": pack_size,
-                    "total_unit": total_u,
-                    "lot_number": lot_no,
-                })
-
-            if not entries_data:
-                continue
-
-            # ----- Lots (สรุปจาก Batch ของสินค้านี้ในใบนี้) -----
-            # ถ้า si.batches เป็น dynamic: ใช้ batches_iter = si.batches.all()
-            batches_iter = si.batches if isinstance(si.batches, list) else si.batches.all()
-            lots_map = {}  # key: (lot, expiry) -> agg
-            for b in batches_iter:
-                if b.product_id != product_id:
-                    continue
-                key = (b.lot_number, b.expiry_date)
-                agg = lots_map.get(key)
-                if not agg:
-                    lots_map[key] = {
-                        "lot_number": b.lot_number,
-                        "expiry_date": b.expiry_date.isoformat() if b.expiry_date else None,
-                        "qty_received": int(b.qty_received or 0),
-                        "qty_remaining": int(b.qty_remaining or 0),
-                        "batch_ids": [b.id],
-                    }
-                else:
-                    agg["qty_received"]  += int(b.qty_received or 0)
-                    agg["qty_remaining"] += int(b.qty_remaining or 0)
-                    agg["batch_ids"].append(b.id)
-
-            lots = list(lots_map.values())
-
-            locked = any(
-            (b.qty_remaining or 0) < (b.qty_received or 0)
-            for b in (si.batches if isinstance(si.batches, list) else si.batches.all())
+        q = (
+            db.session.query(
+                StockIn.id, StockIn.doc_number, StockIn.created_at, StockIn.expiry_date,
+                StockIn.note, StockIn.image_filename, StockIn.locked,
+                select(func.json_group_array(func.json(entry_rows.c.j))).scalar_subquery().label("entries"),
+                select(func.json_group_array(func.json(lot_rows.c.j))).scalar_subquery().label("lots"),
+            )
+            .filter(StockIn.entries.any(StockInEntry.product_id == product_id))
         )
+        rows, next_cursor = keyset_page(q, (StockIn.created_at, StockIn.id), args.get("cursor"), limit)
 
+        result = []
+        for r in rows:
+            entries = json.loads(r.entries or "[]")
+            lots = json.loads(r.lots or "[]")
             result.append({
                 # ----- Header -----
-                "id": si.id,
-                "doc_number": si.doc_number,
-                "created_at": si.created_at.isoformat() if si.created_at else None,
-                "expiry_date": si.expiry_date.isoformat() if si.expiry_date else None,  # header-level (ถ้ามี)
-                "note": si.note,
-                "image_filename": si.image_filename,
+                "id": r.id,
+                "doc_number": r.doc_number,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+                "expiry_date": r.expiry_date.isoformat() if r.expiry_date else None,  # header-level (ถ้ามี)
+                "note": r.note,
+                "image_filename": r.image_filename,
 
                 # ----- Lots summary (อยู่นอก entries ตามที่ขอ) -----
                 "lots": lots,             # [{lot_number, expiry_date, qty_received, qty_remaining, batch_ids}]
@@ -416,13 +519,25 @@ def get_stockins_by_product(product_id):
                 "lot_numbers": ", ".join(l["lot_number"] for l in lots if l["lot_number"]),
 
                 # ----- Entries detail -----
-                "entries": entries_data,
-                "total_unit": sum(e["total_unit"] for e in entries_data),
-                "locked": locked,
+                "entries": entries,
+                "total_unit": sum(int(e["total_unit"] or 0) for e in entries),
+                "locked": bool(r.locked),
             })
 
-        return jsonify(result), 200
+        total = None
+        if wants_total(args):
+            total = (
+                db.session.query(func.count(distinct(StockInEntry.stockin_id)))
+                .filter(StockInEntry.product_id == product_id)
+                .scalar()
+            )
+        return jsonify({
+            "data": result,
+            "pagination": {"limit": limit, "total": total, "next_cursor": next_cursor},
+        }), 200
 
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"❌ Failed to fetch stock-in history: {str(e)}"}), 500
 
@@ -442,6 +557,7 @@ def uploaded_receipts(filename):
 
 # 4. API DELETE - delete stokin + relationship of stokin + minus stock
 @stockin_bp.route("/<int:stock_in_id>", methods=["DELETE"])
+@jwt_required()
 def delete_stock_in(stock_in_id):
     try:
         stock_in = (
@@ -466,15 +582,16 @@ def delete_stock_in(stock_in_id):
                 "expiry_date": b.expiry_date.isoformat() if b.expiry_date else None,
                 "qty_received": int(b.qty_received or 0),
                 "qty_remaining": int(b.qty_remaining or 0),
+                "qty_reserved": int(b.qty_reserved or 0),
             }
             for b in batches
-            if (b.qty_remaining or 0) < (b.qty_received or 0)
+            if (b.qty_remaining or 0) - (b.qty_reserved or 0) < (b.qty_received or 0)
         ]
         if used:
             return jsonify({
                 "error": "❌ Cannot delete: some batches have already been consumed.",
                 "conflicts": used,
-                "hint": "ลบ/void ใบขายที่ใช้ล็อตเหล่านี้ก่อน",
+                "hint": "ลบ/void ใบขายที่ใช้ล็อตเหล่านี้ก่อน (หรือปล่อยใบจองที่กันล็อตไว้)",
             }), 409
 
         # ลบไฟล์รูปก่อน (ไม่ผูกทรานแซกชัน DB)
@@ -489,6 +606,11 @@ def delete_stock_in(stock_in_id):
                     .update({StockInEntry.batch_id: None}, synchronize_session=False)
 
                 # 2) ลบ StockMovement ที่อ้างใบนี้ และที่อ้าง batch เหล่านี้ (ลบแบบ bulk ได้)
+                #    checkpoint ที่ตัดหลัง movement เหล่านี้ใช้ไม่ได้แล้ว -> ลบทิ้งก่อน
+                invalidate_checkpoints(
+                    stock_in.workspace_id,
+                    (StockMovement.ref_stockin_id == stock_in.id) | StockMovement.batch_id.in_(batch_ids),
+                )
                 db.session.query(StockMovement)\
                     .filter(StockMovement.ref_stockin_id == stock_in.id)\
                     .delete(synchronize_session=False)
@@ -498,11 +620,16 @@ def delete_stock_in(stock_in_id):
                     .delete(synchronize_session=False)
 
                 # 3) ลบ Batch ทีละตัว (อย่า bulk delete เพราะ instance ถูกโหลดแล้ว)
+                deltas = batch_deltas((b, -int(b.qty_remaining or 0)) for b in batches)
                 for b in batches:
                     db.session.delete(b)
 
+                # 3.1) หักยอดคงเหลือสะสมของล็อตที่ถูกลบ
+                apply_stock_deltas(deltas)
+
             # 4) ลบ StockIn (entries จะโดนลบเพราะ cascade)
             db.session.delete(stock_in)
+            bump_versions(stock_in.workspace_id, STOCKINS)
 
         db.session.commit()
         return jsonify({"message": "✅ StockIn deleted (entries, batches, movements removed)"}), 200
@@ -517,6 +644,8 @@ def delete_stock_in(stock_in_id):
 # 4. API Get Stockin Detail - get stock-in detail by stock-in Id for Edit Stock-in
 # return Locked = for check PATCH Stockin
 @stockin_bp.route('/detail/<int:stockin_id>', methods=['GET'])
+@jwt_required()
+@conditional_get(STOCKINS, STOCK)
 def get_stockin_detail(stockin_id):
     try:
         si = (
@@ -533,9 +662,11 @@ def get_stockin_detail(stockin_id):
         if not si:
             return jsonify({"error": "❌ StockIn not found"}), 404
 
-        # lots summary
+        # lots summary (เฉพาะล็อตที่รับเข้าจริง ; ก้อนที่โอนไปคลังอื่นไม่ใช่ยอดของใบนี้)
         lots = []
         for b in (si.batches if isinstance(si.batches, list) else si.batches.all()):
+            if b.origin_batch_id is not None:
+                continue
             lots.append({
                 "batch_id": b.id,
                 "lot_number": b.lot_number,
@@ -571,11 +702,6 @@ def get_stockin_detail(stockin_id):
             if len(uniq) == 1:
                 lot_number_hdr = list(uniq)[0]
 
-        locked = any(
-            (b.qty_remaining or 0) < (b.qty_received or 0)
-            for b in (si.batches if isinstance(si.batches, list) else si.batches.all())
-        )
-
         return jsonify({
             "id": si.id,
             "doc_number": si.doc_number,
@@ -589,7 +715,7 @@ def get_stockin_detail(stockin_id):
             "lots": lots,
             "entries": entries,
             "total_unit": sum(x["total_unit"] for x in entries),
-            "locked": locked,
+            "locked": bool(si.locked),
         }), 200
 
     except Exception as e:
@@ -597,6 +723,7 @@ def get_stockin_detail(stockin_id):
 
 # 5. API PATCH Stockin detail - fix stock-in detail for don't have sale ONLY
 @stockin_bp.route('/<int:stockin_id>', methods=['PATCH'])
+@jwt_required()
 def patch_stockin(stockin_id: int):
     """
     PATCH /api/stock-in/<id>
@@ -638,7 +765,7 @@ def patch_stockin(stockin_id: int):
 
         # เช็คสถานะถูกใช้แล้วหรือไม่
         batches_iter = si.batches if isinstance(si.batches, list) else si.batches.all()
-        locked = any((b.qty_remaining or 0) < (b.qty_received or 0) for b in batches_iter)
+        locked = bool(si.locked)
 
         # ฟิลด์ที่อัปเดตได้เสมอ
         # created_at
@@ -658,7 +785,8 @@ def patch_stockin(stockin_id: int):
         if new_doc and new_doc != si.doc_number:
             # ตรวจซ้ำ
             exists = db.session.query(StockIn.id)\
-                .filter(StockIn.doc_number == new_doc, StockIn.id != si.id).first()
+                .filter(StockIn.workspace_id == si.workspace_id,
+                        StockIn.doc_number == new_doc, StockIn.id != si.id).first()
             if exists:
                 return jsonify({"error": "❌ doc_number already exists"}), 409
             si.doc_number = new_doc
@@ -684,6 +812,7 @@ def patch_stockin(stockin_id: int):
                     "hint": "อนุญาตแก้เฉพาะ created_at / note / doc_number / image",
                 }), 409
 
+            bump_versions(si.workspace_id, STOCKINS)
             db.session.commit()
             return jsonify({"message": "✅ StockIn updated (header only: locked)"}), 200
 
@@ -701,6 +830,13 @@ def patch_stockin(stockin_id: int):
         # header-lot (optional)
         header_lot = (p.get("lot_number") or "").strip() or None
 
+        # ต้นทุน/หน่วยย่อย ของทั้งใบ (optional) -> product.cost_price
+        product = db.session.get(Product, header_product_id)
+        try:
+            header_cost = parse_unit_cost(p.get("unit_cost"), product.cost_price if product else None)
+        except ValueError as e:
+            return jsonify({"error": f"❌ {str(e)}"}), 400
+
         # entries (จำเป็นเมื่อแก้เต็ม)
         try:
             entries_data = json.loads(p.get("entries", "[]"))
@@ -709,15 +845,32 @@ def patch_stockin(stockin_id: int):
         if not entries_data:
             return jsonify({"error": "❌ No entries provided"}), 400
 
+        # คลัง/ร้านเดิมของใบนี้ (ไม่ย้ายคลังตอนแก้ไข)
+        old_batches = list(batches_iter)
+        workspace_id = si.workspace_id
+        if old_batches:
+            warehouse_id = old_batches[0].warehouse_id
+        elif si.entries:
+            warehouse_id = si.entries[0].warehouse_id
+        else:
+            try:
+                warehouse_id = resolve_warehouse_id(workspace_id, p.get("warehouse_id"))
+            except ValueError as e:
+                return jsonify({"error": f"❌ {str(e)}"}), 400
+
         # เริ่มปรับทั้งชุดแบบ rebuild (ปลอดภัยกว่า)
         with db.session.begin_nested():
-            # 1) ลบ StockMovement(IN) ของใบนี้
+            # ยอดที่ต้องหักออกจาก stock_level (ล็อตเดิมยังไม่ถูกใช้ -> remaining == received)
+            deltas = batch_deltas((b, -int(b.qty_remaining or 0)) for b in old_batches)
+
+            # 1) ลบ StockMovement(IN) ของใบนี้ (checkpoint ที่ตัดหลังจากนั้นใช้ไม่ได้แล้ว)
+            invalidate_checkpoints(workspace_id, StockMovement.ref_stockin_id == si.id)
             db.session.query(StockMovement)\
                 .filter(StockMovement.ref_stockin_id == si.id)\
                 .delete(synchronize_session=False)
 
             # 2) ลบ batches เดิมทั้งหมดของใบนี้
-            for b in list(batches_iter):
+            for b in old_batches:
                 db.session.delete(b)
 
             # 3) ลบ entries เดิมทั้งหมดของใบนี้
@@ -752,7 +905,7 @@ def patch_stockin(stockin_id: int):
                 if pack_size_at_receipt is None:
                     if variant_id:
                         var = db.session.get(ProductVariant, variant_id)
-                        if not var:
+                        if not var or var.product_id != header_product_id:
                             return jsonify({"error": f"❌ Entry #{idx}: Variant not found"}), 404
                         pack_size_at_receipt = int(var.pack_size or 0)
                     else:
@@ -768,6 +921,10 @@ def patch_stockin(stockin_id: int):
                     return jsonify({"error": f"❌ Entry #{idx}: pack_size_at_receipt must be > 0"}), 400
 
                 base_qty = pack_size_at_receipt * quantity
+                try:
+                    unit_cost = parse_unit_cost(v.get("unit_cost"), header_cost)
+                except ValueError as e:
+                    return jsonify({"error": f"❌ Entry #{idx}: {str(e)}"}), 400
 
                 # หา/สร้าง batch ใหม่ของ (stockin, product, lot, expiry)
                 key = (lot_number, si.expiry_date)
@@ -780,11 +937,14 @@ def patch_stockin(stockin_id: int):
                         expiry_date=si.expiry_date,
                         qty_received=0,
                         qty_remaining=0,
+                        workspace_id=workspace_id,
+                        warehouse_id=warehouse_id,
                     )
                     db.session.add(batch)
                     db.session.flush()
                     created_batches[key] = batch
 
+                add_batch_cost(batch, base_qty, unit_cost)
                 batch.qty_received += base_qty
                 batch.qty_remaining += base_qty
                 db.session.add(batch)
@@ -797,10 +957,16 @@ def patch_stockin(stockin_id: int):
                     custom_pack_size=(None if variant_id else custom_pack_size),
                     pack_size_at_receipt=pack_size_at_receipt,
                     quantity=quantity,
+                    unit_cost=unit_cost,
                     batch_id=batch.id,
+                    workspace_id=workspace_id,
+                    warehouse_id=warehouse_id,
                 )
                 db.session.add(entry)
 
+                key = (workspace_id, warehouse_id, header_product_id)
+                deltas[key] = deltas.get(key, 0) + base_qty
+
                 # บันทึก movement(IN) ใหม่
                 db.session.add(StockMovement(
                     product_id=header_product_id,
@@ -810,8 +976,14 @@ def patch_stockin(stockin_id: int):
                     batch_qty_remaining=int(batch.qty_remaining),
                     ref_stockin_id=si.id,
                     note=f"EDIT StockIn #{si.id}",
+                    workspace_id=workspace_id,
+                    warehouse_id=warehouse_id,
                 ))
 
+            # 5) ปรับยอดคงเหลือสะสม (หักของเดิม + บวกของใหม่)
+            apply_stock_deltas(deltas)
+            bump_versions(si.workspace_id, STOCKINS)
+
         db.session.commit()
         return jsonify({
             "message": "✅ StockIn updated",
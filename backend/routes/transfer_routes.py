@@ -0,0 +1,202 @@
+import json
+from datetime import date
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload
+from models import db, StockMovement, StockTransfer
+from decorators.guard import enforce_plan_feature, require_perm
+from services.fefo import AllocationConflict, run_with_fefo_retry
+from services.pagination import keyset_page, parse_limit
+from services.transfer import create_transfer, execute_transfer
+
+transfer_bp = Blueprint('transfer_bp', __name__, url_prefix='/api/transfer')
+
+
+def _serialize_transfer(t: StockTransfer) -> dict:
+    return {
+        "id": t.id,
+        "doc_number": t.doc_number,
+        "status": t.status,
+        "from_warehouse_id": t.from_warehouse_id,
+        "to_warehouse_id": t.to_warehouse_id,
+        "transfer_date": t.transfer_date.isoformat() if t.transfer_date else None,
+        "confirmed_at": t.confirmed_at.isoformat() if t.confirmed_at else None,
+        "note": t.note,
+        "created_at": t.created_at.isoformat() if t.created_at else None,
+        "items": [{"product_id": it.product_id, "qty": int(it.qty)} for it in t.items],
+    }
+
+
+def _confirm(transfer: StockTransfer) -> list:
+    def _persist():
+        # ชนกับบิลขาย/ใบโอนอื่นกลางทาง -> savepoint rollback แล้ว re-plan ใหม่
+        with db.session.begin_nested():
+            return execute_transfer(transfer)
+    return run_with_fefo_retry(_persist)
+
+
+# 1. API POST - สร้างใบโอนสินค้าระหว่างคลัง (default: ยืนยันและตัดสต็อกทันที)
+@transfer_bp.route('/', methods=['POST'])
+@jwt_required()
+@require_perm("inventory.write")
+@enforce_plan_feature("multi_warehouse")
+def create_stock_transfer():
+    """
+    body (JSON หรือ form): from_warehouse_id, to_warehouse_id, items=[{product_id, qty(base units)}],
+                           transfer_date (yyyy-MM-dd) [optional], note [optional], confirm (default true)
+    """
+    try:
+        wsid = int(get_jwt()["wsid"])
+        p = request.get_json(silent=True) or request.form
+        items = p.get("items")
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except json.JSONDecodeError:
+                return jsonify({"error": "❌ items must be valid JSON"}), 400
+
+        transfer_date = date.fromisoformat(p["transfer_date"]) if p.get("transfer_date") else None
+        confirm = str(p.get("confirm", "true")).lower() not in ("0", "false")
+
+        transfer = create_transfer(
+            wsid, p.get("from_warehouse_id"), p.get("to_warehouse_id"), items,
+            transfer_date=transfer_date, note=p.get("note"),
+        )
+        moves = _confirm(transfer) if confirm else []
+        db.session.commit()
+
+        return jsonify({
+            "message": "✅ Transfer confirmed" if confirm else "✅ Transfer draft created",
+            "transfer": _serialize_transfer(transfer),
+            "moves": moves,
+        }), 201
+
+    except AllocationConflict as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}", "hint": "สต็อกถูกตัดพร้อมกัน ลองใหม่อีกครั้ง"}), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Database error: {str(e)}"}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to create transfer: {str(e)}"}), 500
+
+
+# 2. API POST - ยืนยันใบโอนที่เป็น DRAFT
+@transfer_bp.route('/<int:transfer_id>/confirm', methods=['POST'])
+@jwt_required()
+@require_perm("inventory.write")
+@enforce_plan_feature("multi_warehouse")
+def confirm_stock_transfer(transfer_id: int):
+    try:
+        transfer = db.session.get(StockTransfer, transfer_id)
+        if not transfer:
+            return jsonify({"error": "❌ Transfer not found"}), 404
+        if transfer.status != "DRAFT":
+            return jsonify({"error": f"❌ Transfer is already {transfer.status}"}), 409
+
+        moves = _confirm(transfer)
+        db.session.commit()
+        return jsonify({
+            "message": "✅ Transfer confirmed",
+            "transfer": _serialize_transfer(transfer),
+            "moves": moves,
+        }), 200
+
+    except AllocationConflict as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}", "hint": "สต็อกถูกตัดพร้อมกัน ลองใหม่อีกครั้ง"}), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to confirm transfer: {str(e)}"}), 500
+
+
+# 3. API GET - รายการใบโอน (keyset: ?cursor= & limit=)
+@transfer_bp.route('/', methods=['GET'])
+@jwt_required()
+def list_stock_transfers():
+    try:
+        args = request.args
+        q = db.session.query(StockTransfer).options(selectinload(StockTransfer.items))
+        if args.get("status"):
+            q = q.filter(StockTransfer.status == args["status"].upper())
+        if args.get("warehouse_id"):
+            wh = int(args["warehouse_id"])
+            q = q.filter((StockTransfer.from_warehouse_id == wh) | (StockTransfer.to_warehouse_id == wh))
+
+        rows, next_cursor = keyset_page(
+            q, (StockTransfer.created_at, StockTransfer.id), args.get("cursor"), parse_limit(args),
+        )
+        return jsonify({
+            "data": [_serialize_transfer(t) for t in rows],
+            "pagination": {"limit": parse_limit(args), "next_cursor": next_cursor},
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"❌ {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch transfers: {str(e)}"}), 500
+
+
+# 4. API GET detail - ใบโอน + movement คู่ OUT/IN ที่เกิดขึ้น
+@transfer_bp.route('/<int:transfer_id>', methods=['GET'])
+@jwt_required()
+def get_stock_transfer(transfer_id: int):
+    try:
+        transfer = db.session.get(StockTransfer, transfer_id)
+        if not transfer:
+            return jsonify({"error": "❌ Transfer not found"}), 404
+
+        movements = (
+            db.session.query(StockMovement)
+            .filter(StockMovement.ref_transfer_id == transfer.id)
+            .order_by(StockMovement.id.asc())
+            .all()
+        )
+        data = _serialize_transfer(transfer)
+        data["movements"] = [{
+            "id": m.id,
+            "movement_type": m.movement_type,
+            "warehouse_id": m.warehouse_id,
+            "product_id": m.product_id,
+            "batch_id": m.batch_id,
+            "qty": m.qty,
+            "batch_qty_remaining": m.batch_qty_remaining,
+        } for m in movements]
+        return jsonify(data), 200
+
+    except Exception as e:
+        return jsonify({"error": f"❌ Failed to fetch transfer: {str(e)}"}), 500
+
+
+# 5. API DELETE - ลบใบโอนที่ยังเป็น DRAFT (ยืนยันแล้วลบไม่ได้ -> ทำใบโอนกลับแทน)
+@transfer_bp.route('/<int:transfer_id>', methods=['DELETE'])
+@jwt_required()
+@require_perm("inventory.write")
+def delete_stock_transfer(transfer_id: int):
+    try:
+        transfer = db.session.get(StockTransfer, transfer_id)
+        if not transfer:
+            return jsonify({"error": "❌ Transfer not found"}), 404
+        if transfer.status != "DRAFT":
+            return jsonify({
+                "error": "❌ Cannot delete a confirmed transfer",
+                "hint": "สร้างใบโอนกลับ (สลับคลังต้นทาง/ปลายทาง) แทน",
+            }), 409
+
+        for it in list(transfer.items):
+            db.session.delete(it)
+        db.session.delete(transfer)
+        db.session.commit()
+        return jsonify({"message": "✅ Transfer deleted"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"❌ Failed to delete transfer: {str(e)}"}), 500
@@ -4,6 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt
 from models import db, Warehouse, Workspace
 from services.plan import within_quota_warehouses
 from decorators.guard import require_perm
+from services.cache import PLAN, invalidate_after_commit
 
 warehouse_bp = Blueprint("warehouse_bp", __name__, url_prefix="/api/warehouse")
 
@@ -24,6 +25,7 @@ def create_warehouse():
 
     wh = Warehouse(workspace_id=wsid, name=name, code=code)
     db.session.add(wh)
+    invalidate_after_commit(wsid, PLAN)
     db.session.commit()
 
     return jsonify({"id": wh.id, "name": wh.name, "code": wh.code}), 201
\ No newline at end of file
@@ -3,6 +3,8 @@ from models import db, Workspace, Warehouse
 from sqlalchemy import func
 from services.plan import get_limits, count_members_non_owner, count_warehouses
 from decorators.guard import require_perm
+from decorators.cache import cached
+from services.cache import PLAN, get_cache, invalidate_after_commit
 
 from flask_jwt_extended import (
     jwt_required, get_jwt,
@@ -84,6 +86,7 @@ def ensure_default_warehouse():
         is_default=True
     )
     db.session.add(wh)
+    invalidate_after_commit(wsid, PLAN)
     db.session.commit()
 
     return jsonify({
@@ -94,6 +97,7 @@ def ensure_default_warehouse():
 #API GET PLAN ของเราว่าเป็นอะไร ส่งข้อมูล plan + usage
 @workspace_bp.get("/plan")
 @jwt_required()
+@cached(PLAN)
 def get_plan_info():
     wsid = get_jwt()["wsid"]
     ws = Workspace.query.get(wsid)
@@ -123,5 +127,16 @@ def upgrade_plan():
         return jsonify({"error": "BAD_REQUEST"}), 400
 
     ws.plan = to
+    invalidate_after_commit(wsid, PLAN)
     db.session.commit()
-    return jsonify({"ok": True, "plan": ws.plan})
\ No newline at end of file
+    return jsonify({"ok": True, "plan": ws.plan})
+
+#API GET สถิติ response cache (hit/miss ของโปรเซสนี้) ใช้ปรับ TTL / ขนาด
+@workspace_bp.get("/cache-stats")
+@jwt_required()
+@require_perm("workspace.manage")
+def get_cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
\ No newline at end of file
@@ -0,0 +1,159 @@
+# services/barcode.py
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from models import db, Product, ProductBarcode, ProductVariant, StockLevel
+from services.jobs import for_each_workspace
+from services.tenant import SKIP_OPTION
+from services.versioning import PRODUCTS, current_versions
+
+MAX_CODES = 200   # ต่อ 1 request (สแกนรัวเป็นชุด)
+
+# cache ในโปรเซส: wsid -> (เวอร์ชัน PRODUCTS, {code: [(product_id, variant_id, pack_size, selling_price, is_active), ...]})
+#   ทุกการเขียนสินค้า / variant bump PRODUCTS อยู่แล้ว -> เวอร์ชันไม่ตรง = โหลดใหม่ (ถูกต้องแม้มีหลาย worker)
+_maps = OrderedDict()
+_maps_lock = threading.Lock()
+
+
+def normalize_code(code) -> str:
+    # scanner มักต่อท้ายด้วย \r / \n ; เทียบแบบไม่สนตัวพิมพ์
+    return str(code or "").strip().upper()
+
+
+def sync_barcodes(workspace_id: int, product_ids=None) -> int:
+    """
+    สร้างแถว ProductBarcode ของสินค้าที่ระบุใหม่จาก Product + ProductVariant (None = ทั้งร้าน) ; ผู้เรียก commit
+    เรียกหลังเขียนสินค้า / variant ใน transaction เดียวกัน ; return จำนวน code
+    """
+    db.session.flush()
+    del_q = delete(ProductBarcode).where(ProductBarcode.workspace_id == workspace_id)
+    src = (
+        select(Product.id, Product.sku, ProductVariant.id, ProductVariant.sku_suffix,
+               ProductVariant.pack_size, ProductVariant.selling_price, ProductVariant.is_active)
+        .join(ProductVariant, ProductVariant.product_id == Product.id)
+        .where(Product.workspace_id == workspace_id)
+    )
+    if product_ids is not None:
+        ids = list({int(i) for i in product_ids})
+        if not ids:
+            return 0
+        del_q = del_q.where(ProductBarcode.product_id.in_(ids))
+        src = src.where(Product.id.in_(ids))
+
+    db.session.execute(del_q, bind_arguments={"mapper": ProductBarcode})
+    rows = [
+        {
+            "workspace_id": workspace_id,
+            "code": normalize_code(f"{sku}{suffix or ''}"),
+            "product_id": pid,
+            "variant_id": vid,
+            "pack_size": pack_size,
+            "selling_price": price,
+            "is_active": bool(is_active) if is_active is not None else True,
+        }
+        for pid, sku, vid, suffix, pack_size, price, is_active in db.session.execute(src)
+    ]
+    if rows:
+        db.session.execute(insert(ProductBarcode), rows, bind_arguments={"mapper": ProductBarcode})
+    return len(rows)
+
+
+def rebuild_all_workspaces(workspace_id: int | None = None) -> dict:
+    """backfill / ซ่อมตารางบาร์โค้ดทุกร้าน (commit ทีละร้าน)"""
+    return for_each_workspace(lambda wsid: sync_barcodes(wsid), "Barcode rebuild", workspace_id)
+
+
+def _load_map(workspace_id: int) -> dict:
+    rows = db.session.execute(
+        select(ProductBarcode.code, ProductBarcode.product_id, ProductBarcode.variant_id,
+               ProductBarcode.pack_size, ProductBarcode.selling_price, ProductBarcode.is_active)
+        .where(ProductBarcode.workspace_id == workspace_id)
+        .order_by(ProductBarcode.is_active.desc(), ProductBarcode.variant_id),   # code ชน -> variant ที่ยังขายอยู่ก่อน
+        execution_options={SKIP_OPTION: True},
+    ).all()
+    if not rows and db.session.query(ProductVariant.id).join(Product).filter(Product.workspace_id == workspace_id).first():
+        # ร้านเดิมก่อนมีตารางนี้ -> backfill ครั้งแรกที่สแกน
+        sync_barcodes(workspace_id)
+        db.session.commit()
+        return _load_map(workspace_id)
+
+    mapping = {}
+    for code, *entry in rows:
+        mapping.setdefault(code, []).append(tuple(entry))
+    return mapping
+
+
+def code_map(workspace_id: int) -> dict:
+    """{code: [entry, ...]} ของร้านจาก cache ในโปรเซส (ตรวจเวอร์ชัน PRODUCTS ด้วย point read 1 ครั้ง)"""
+    wsid = int(workspace_id)
+    version = current_versions(wsid, [PRODUCTS])[PRODUCTS]
+    with _maps_lock:
+        hit = _maps.get(wsid)
+        if hit is not None and hit[0] == version:
+            _maps.move_to_end(wsid)
+            return hit[1]
+
+    mapping = _load_map(wsid)
+    limit = int(current_app.config.get("BARCODE_CACHE_WORKSPACES", 64))
+    with _maps_lock:
+        _maps[wsid] = (version, mapping)
+        _maps.move_to_end(wsid)
+        while len(_maps) > limit:
+            _maps.popitem(last=False)
+    return mapping
+
+
+def _stock(workspace_id: int, product_ids, warehouse_id=None) -> dict:
+    # {product_id: (on_hand, reserved)} จาก stock_level (รวมทุกคลัง หรือเฉพาะคลังที่ระบุ)
+    # ทางด่วนของการสแกน: กรองร้านเองแล้ว -> ข้าม tenant criteria
+    if not product_ids:
+        return {}
+    stmt = (
+        select(StockLevel.product_id, func.sum(StockLevel.on_hand), func.sum(StockLevel.reserved))
+        .where(StockLevel.workspace_id == workspace_id, StockLevel.product_id.in_(list(product_ids)))
+        .group_by(StockLevel.product_id)
+    )
+    if warehouse_id is not None:
+        stmt = stmt.where(StockLevel.warehouse_id == warehouse_id)
+    rows = db.session.execute(stmt, execution_options={SKIP_OPTION: True}).all()
+    return {pid: (int(on_hand or 0), int(reserved or 0)) for pid, on_hand, reserved in rows}
+
+
+def resolve_codes(workspace_id: int, codes, warehouse_id: int | None = None) -> list:
+    """
+    code ที่สแกน -> variant + ยอดคงเหลือ (base units) ; เรียงตามลำดับที่ส่งมา
+    ไม่เจอ -> found=False ; code ชนหลาย variant -> เลือกตัวที่ยังขายอยู่ + ambiguous=True
+    """
+    codes = list(codes or [])
+    if not codes:
+        raise ValueError("At least one code is required")
+    if len(codes) > MAX_CODES:
+        raise ValueError(f"Too many codes (max {MAX_CODES})")
+
+    mapping = code_map(workspace_id)
+    hits = [mapping.get(normalize_code(c)) for c in codes]
+    stock = _stock(workspace_id, {h[0][0] for h in hits if h}, warehouse_id)
+
+    out = []
+    for code, h in zip(codes, hits):
+        if not h:
+            out.append({"code": code, "found": False})
+            continue
+        product_id, variant_id, pack_size, selling_price, is_active = h[0]
+        on_hand, reserved = stock.get(product_id, (0, 0))
+        available = max(on_hand - reserved, 0)
+        out.append({
+            "code": code,
+            "found": True,
+            "product_id": product_id,
+            "variant_id": variant_id,
+            "pack_size": pack_size,
+            "selling_price": selling_price,
+            "is_active": is_active,
+            "on_hand": on_hand,
+            "available": available,
+            "packs_available": available // pack_size if pack_size else None,
+            "ambiguous": len(h) > 1,
+        })
+    return out
@@ -0,0 +1,318 @@
+# services/bulk_stockin.py
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import func, insert, update, bindparam, or_
+from models import db, Product, ProductVariant, StockIn, StockBatch, StockInEntry, StockMovement
+from models._base import utc_now
+from services.cogs import parse_unit_cost
+from services.stock_level import apply_stock_deltas
+
+
+def iter_rows(stream, fmt: str):
+    """
+    อ่านไฟล์ทีละบรรทัด (ไม่โหลดทั้งไฟล์เข้า memory)
+    yield (line_no, dict) หรือ (line_no, Exception) ถ้าบรรทัดนั้น parse ไม่ได้
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "ndjson":
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("row must be a JSON object")
+                yield line_no, row
+            except ValueError as e:
+                yield line_no, e
+    else:
+        reader = csv.DictReader(text)
+        for row in reader:
+            # line_num ของ csv = บรรทัดสุดท้ายที่อ่าน (header = 1)
+            yield reader.line_num, {k.strip(): (v.strip() if isinstance(v, str) else v)
+                                    for k, v in row.items() if k}
+
+
+def _as_int(v, field):
+    if v in (None, ""):
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be integer")
+
+
+class BulkStockInImporter:
+    """
+    รับเข้าสินค้าหลายรายการจากไฟล์เดียว
+    - 1 chunk = preload product/variant 1 query + bulk insert (executemany) ของ StockIn/StockBatch/StockInEntry/StockMovement
+    - แถวที่ผิดจะถูกข้ามและรายงานกลับใน errors (แถวอื่นยังเข้าได้)
+    - commit ครั้งเดียวตอนจบ (ผู้เรียกเป็นคน commit)
+    """
+
+    def __init__(self, workspace_id: int, warehouse_id: int, doc_number_factory, lot_factory, parse_date,
+                 created_at: datetime | None = None, note: str | None = None):
+        self.workspace_id = workspace_id
+        self.warehouse_id = warehouse_id
+        self.doc_number_factory = doc_number_factory   # () -> doc_number ใหม่ (แถวที่ไม่ได้ระบุ doc_number)
+        self.lot_factory = lot_factory                 # doc_number -> lot อัตโนมัติ (auto_lot)
+        self.parse_date = parse_date                   # 'yyyy-MM-dd' / 'dd/MM/yyyy' -> date
+        self.created_at = created_at or utc_now()
+        self.note = note or ""
+
+        self.auto_doc_number = None
+        self.stockins = {}      # doc_number -> stockin_id
+        self.batches = {}       # (stockin_id, product_id, lot, expiry) -> [batch_id, qty_remaining]
+        self.errors = []
+        self.rows_total = 0
+        self.rows_ok = 0
+        self.total_base_qty = 0
+
+    # ---------- public ----------
+    def run(self, rows, chunk_size: int = 500):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            self._process_chunk(chunk)
+        return self.summary()
+
+    def summary(self):
+        return {
+            "rows_total": self.rows_total,
+            "rows_ok": self.rows_ok,
+            "rows_failed": len(self.errors),
+            "total_received_base_qty": self.total_base_qty,
+            "stockins": [{"stockin_id": sid, "doc_number": doc} for doc, sid in self.stockins.items() if sid],
+            "errors": self.errors,
+        }
+
+    # ---------- internals ----------
+    def _fail(self, line_no, msg):
+        self.errors.append({"line": line_no, "error": str(msg)})
+
+    def _preload(self, chunk):
+        # ดึง product + variants ของทั้ง chunk ใน query เดียว
+        pids, skus = set(), set()
+        for _, row in chunk:
+            if isinstance(row, Exception):
+                continue
+            if row.get("product_id") not in (None, ""):
+                try:
+                    pids.add(int(row["product_id"]))
+                except (TypeError, ValueError):
+                    pass
+            elif row.get("sku"):
+                skus.add(str(row["sku"]))
+        if not pids and not skus:
+            return {}, {}, {}, {}
+
+        rows = (
+            db.session.query(Product.id, Product.sku, Product.cost_price,
+                             ProductVariant.id, ProductVariant.sku_suffix, ProductVariant.pack_size)
+            .outerjoin(ProductVariant, ProductVariant.product_id == Product.id)
+            .filter(
+                Product.workspace_id == self.workspace_id,
+                or_(Product.id.in_(pids), Product.sku.in_(skus)),
+            )
+            .all()
+        )
+        product_ids, by_sku, variants, by_suffix = {}, {}, {}, {}
+        for pid, sku, cost, vid, suffix, pack in rows:
+            product_ids[pid] = cost   # product_id -> cost_price (ต้นทุน default)
+            by_sku[sku] = pid
+            if vid is not None:
+                variants[vid] = (pid, int(pack or 0))
+                by_suffix[(pid, suffix)] = vid
+        return product_ids, by_sku, variants, by_suffix
+
+    def _resolve(self, row, product_ids, by_sku, variants, by_suffix):
+        # -> (doc_number, product_id, variant_id, custom_mode, custom_pack, pack_size, quantity, lot, expiry, unit_cost)
+        if row.get("product_id") not in (None, ""):
+            pid = _as_int(row["product_id"], "product_id")
+            pid = pid if pid in product_ids else None
+        elif row.get("sku"):
+            pid = by_sku.get(str(row["sku"]))
+        else:
+            raise ValueError("Need product_id or sku")
+        if not pid:
+            raise ValueError("Product not found in this workspace")
+
+        quantity = _as_int(row.get("quantity"), "quantity")
+        if not quantity or quantity <= 0:
+            raise ValueError("quantity must be > 0")
+
+        variant_id = _as_int(row.get("variant_id"), "variant_id")
+        if variant_id is None and row.get("sku_suffix"):
+            variant_id = by_suffix.get((pid, str(row["sku_suffix"])))
+            if variant_id is None:
+                raise ValueError(f"Variant {row['sku_suffix']} not found")
+        custom_mode = row.get("custom_sale_mode") or None
+        custom_pack = _as_int(row.get("custom_pack_size"), "custom_pack_size")
+
+        pack_size = _as_int(row.get("pack_size_at_receipt"), "pack_size_at_receipt")
+        if variant_id is not None:
+            v = variants.get(variant_id)
+            if not v or v[0] != pid:
+                raise ValueError(f"Variant {variant_id} does not belong to product {pid}")
+            if pack_size is None:
+                pack_size = v[1]
+            custom_mode, custom_pack = None, None
+        else:
+            if not custom_mode or not custom_pack:
+                raise ValueError("Need variant_id/sku_suffix or (custom_sale_mode & custom_pack_size)")
+            if pack_size is None:
+                pack_size = custom_pack
+        if not pack_size or pack_size <= 0:
+            raise ValueError("pack_size_at_receipt must be > 0")
+
+        doc_number = (str(row.get("doc_number") or "")).strip() or None
+        lot = (str(row.get("lot_number") or "")).strip() or None
+        expiry = self.parse_date(str(row.get("expiry_date") or "") or None)
+        unit_cost = parse_unit_cost(row.get("unit_cost"), product_ids[pid])
+        return doc_number, pid, variant_id, custom_mode, custom_pack, pack_size, quantity, lot, expiry, unit_cost
+
+    def _process_chunk(self, chunk):
+        preloaded = self._preload(chunk)
+
+        resolved = []
+        for line_no, row in chunk:
+            self.rows_total += 1
+            if isinstance(row, Exception):
+                self._fail(line_no, f"Invalid row: {row}")
+                continue
+            try:
+                resolved.append((line_no, self._resolve(row, *preloaded)))
+            except ValueError as e:
+                self._fail(line_no, e)
+
+        if not resolved:
+            return
+
+        # 1) StockIn headers (เอกสารใหม่ของ chunk นี้)
+        new_docs = {}
+        for line_no, r in resolved:
+            doc = r[0] or self._auto_doc()
+            if doc not in self.stockins and doc not in new_docs:
+                new_docs[doc] = r[8]   # header expiry = expiry ของแถวแรกในเอกสาร
+        if new_docs:
+            taken = {
+                d for (d,) in db.session.query(StockIn.doc_number)
+                .filter(StockIn.workspace_id == self.workspace_id, StockIn.doc_number.in_(list(new_docs)))
+            }
+            fresh = [d for d in new_docs if d not in taken]
+            for d in taken:
+                self.stockins[d] = None   # จำไว้ว่าเลขนี้ใช้ไม่ได้
+            if fresh:
+                ids = db.session.scalars(
+                    insert(StockIn).returning(StockIn.id, sort_by_parameter_order=True),
+                    [{
+                        "workspace_id": self.workspace_id,
+                        "doc_number": d,
+                        "created_at": self.created_at,
+                        "expiry_date": new_docs[d],
+                        "note": self.note,
+                    } for d in fresh],
+                ).all()
+                self.stockins.update(zip(fresh, ids))
+
+        # 2) รวมยอดต่อ batch key ของ chunk นี้
+        lines = []             # (line_no, stockin_id, key, r, base_qty)
+        chunk_qty = {}         # key -> base qty ที่เพิ่มใน chunk นี้
+        chunk_cost = {}        # key -> มูลค่ารวม (qty * unit_cost) ที่เพิ่มใน chunk นี้
+        for line_no, r in resolved:
+            doc = r[0] or self.auto_doc_number
+            stockin_id = self.stockins.get(doc)
+            if stockin_id is None:
+                self._fail(line_no, f"doc_number {doc} already exists")
+                continue
+            lot = r[7] or self.lot_factory(doc)
+            key = (stockin_id, r[1], lot, r[8])
+            base_qty = r[5] * r[6]
+            chunk_qty[key] = chunk_qty.get(key, 0) + base_qty
+            chunk_cost[key] = chunk_cost.get(key, 0.0) + base_qty * (r[9] or 0.0)
+            lines.append((line_no, stockin_id, key, r, base_qty))
+
+        if not lines:
+            return
+
+        # 3) StockBatch: key ใหม่ -> bulk insert / key เดิม (จาก chunk ก่อน) -> bulk update
+        new_keys = [k for k in chunk_qty if k not in self.batches]
+        if new_keys:
+            ids = db.session.scalars(
+                insert(StockBatch).returning(StockBatch.id, sort_by_parameter_order=True),
+                [{
+                    "stockin_id": k[0], "product_id": k[1], "lot_number": k[2], "expiry_date": k[3],
+                    "qty_received": chunk_qty[k], "qty_remaining": chunk_qty[k],
+                    "unit_cost": chunk_cost[k] / chunk_qty[k],
+                    "workspace_id": self.workspace_id, "warehouse_id": self.warehouse_id,
+                } for k in new_keys],
+            ).all()
+            for k, bid in zip(new_keys, ids):
+                self.batches[k] = [bid, chunk_qty[k]]
+
+        old_keys = [k for k in chunk_qty if k not in new_keys]
+        if old_keys:
+            for k in old_keys:
+                self.batches[k][1] += chunk_qty[k]
+            t = StockBatch.__table__
+            db.session.connection(bind_arguments={"mapper": StockBatch}).execute(
+                update(t)
+                .where(t.c.id == bindparam("b_id"))
+                .values(
+                    # ต้นทุนถัวเฉลี่ยถ่วงน้ำหนัก (ใช้ยอดรับเดิมก่อนบวก)
+                    unit_cost=(func.coalesce(t.c.unit_cost, 0.0) * t.c.qty_received + bindparam("b_cost"))
+                    / (t.c.qty_received + bindparam("b_add")),
+                    qty_received=t.c.qty_received + bindparam("b_add"),
+                    qty_remaining=t.c.qty_remaining + bindparam("b_add"),
+                ),
+                [{"b_id": self.batches[k][0], "b_add": chunk_qty[k], "b_cost": chunk_cost[k]} for k in old_keys],
+            )
+
+        # 4) StockInEntry (executemany)
+        db.session.execute(insert(StockInEntry), [{
+            "stockin_id": stockin_id,
+            "product_id": r[1],
+            "variant_id": r[2],
+            "custom_sale_mode": r[3],
+            "custom_pack_size": r[4],
+            "pack_size_at_receipt": r[5],
+            "quantity": r[6],
+            "unit_cost": r[9],
+            "batch_id": self.batches[key][0],
+            "workspace_id": self.workspace_id,
+            "warehouse_id": self.warehouse_id,
+        } for _, stockin_id, key, r, _ in lines])
+
+        # 5) StockMovement(IN) 1 แถวต่อ batch ต่อ chunk
+        doc_by_id = {sid: d for d, sid in self.stockins.items() if sid}
+        db.session.execute(insert(StockMovement), [{
+            "product_id": k[1],
+            "batch_id": self.batches[k][0],
+            "movement_type": "IN",
+            "qty": added,
+            "batch_qty_remaining": self.batches[k][1],
+            "ref_stockin_id": k[0],
+            "note": f"StockIn {doc_by_id.get(k[0])} lot {k[2]} (bulk)",
+            "workspace_id": self.workspace_id,
+            "warehouse_id": self.warehouse_id,
+        } for k, added in chunk_qty.items()])
+
+        # 6) stock_level
+        deltas = {}
+        for k, added in chunk_qty.items():
+            lk = (self.workspace_id, self.warehouse_id, k[1])
+            deltas[lk] = deltas.get(lk, 0) + added
+        apply_stock_deltas(deltas)
+
+        self.rows_ok += len(lines)
+        self.total_base_qty += sum(chunk_qty.values())
+
+    def _auto_doc(self):
+        if not self.auto_doc_number:
+            self.auto_doc_number = self.doc_number_factory()
+        return self.auto_doc_number
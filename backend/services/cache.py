@@ -0,0 +1,310 @@
+# services/cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# แท็กของข้อมูลที่ไม่ผูกร้าน (เช่น platform / tier)
+GLOBAL = "global"
+
+# แท็กที่ใช้เฉพาะ cache (กลุ่มที่มีเลขเวอร์ชันอยู่ใน services/versioning -> bump_versions ลบ cache ให้เอง)
+PLAN = "plan"              # แผน + usage (จำนวนคลัง / สมาชิก)
+PLATFORMS = "platforms"
+
+SESSION_KEY = "cache_invalidate_tags"
+
+
+def cache_tag(workspace_id, name: str) -> str:
+    # แท็กต่อร้าน: "ws:1:channels" ; ไม่ผูกร้าน: "global:platforms"
+    return f"{GLOBAL}:{name}" if workspace_id is None else f"ws:{int(workspace_id)}:{name}"
+
+
+class LRUBackend:
+    """
+    cache ในโปรเซส: OrderedDict เรียงตามการใช้ล่าสุด จำกัดทั้งจำนวน entry และขนาดรวม (bytes)
+    แท็ก -> set ของ key (ลบตามแท็กได้ทันทีโดยไม่ต้องไล่ทั้ง cache)
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key -> (expires_at, tags, payload)
+        self._tags = {}              # tag -> {key, ...}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _drop(self, key):
+        _, tags, payload = self._data.pop(key)
+        self._bytes -= len(payload)
+        for t in tags:
+            keys = self._tags.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[t]
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, payload: bytes, ttl: float, tags=()):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.time() + ttl, tuple(tags), payload)
+            self._bytes += len(payload)
+            for t in tags:
+                self._tags.setdefault(t, set()).add(key)
+            # ไล่ตัวที่ใช้ล่าสุดนานที่สุดจนกว่าจะไม่เกินทั้งสองเพดาน
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, tags) -> int:
+        with self._lock:
+            keys = set()
+            for t in tags:
+                keys |= self._tags.get(t, set())
+            for k in keys:
+                if k in self._data:
+                    self._drop(k)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"backend": "lru", "entries": len(self._data), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """
+    cache ร่วมหลาย worker (gunicorn หลายโปรเซส) ในไฟล์ SQLite (WAL) : invalidate จาก worker หนึ่งเห็นทุก worker
+    จำกัดจำนวน entry: เกินเพดาน -> ลบตัวที่ถูกใช้ล่าสุดนานที่สุด (ตรวจทุก PRUNE_EVERY ครั้งที่เขียน)
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, path: str, max_entries: int = 20000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        con = self._con()
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS cache_entry (
+                key TEXT PRIMARY KEY, payload BLOB NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_cache_entry_used ON cache_entry (used_at);
+            CREATE TABLE IF NOT EXISTS cache_tag (
+                tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS ix_cache_tag_key ON cache_tag (key);
+        """)
+
+    def _con(self):
+        # sqlite3 connection ใช้ข้าม thread ไม่ได้ -> 1 connection ต่อ thread
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL;")
+            con.execute("PRAGMA synchronous=NORMAL;")
+            self._local.con = con
+        return con
+
+    def _delete_keys(self, con, where: str, params=()):
+        # เลือก key ก่อน (where อาจอ้าง cache_tag) แล้วค่อยลบทั้ง entry + แท็กของ key นั้น
+        keys = [(k,) for (k,) in con.execute(f"SELECT key FROM cache_entry WHERE {where}", params)]
+        con.executemany("DELETE FROM cache_tag WHERE key = ?", keys)
+        con.executemany("DELETE FROM cache_entry WHERE key = ?", keys)
+        return len(keys)
+
+    def get(self, key: str):
+        con = self._con()
+        now = time.time()
+        row = con.execute("SELECT payload, expires_at FROM cache_entry WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            con.execute("BEGIN IMMEDIATE")
+            self._delete_keys(con, "key = ?", (key,))
+            con.execute("COMMIT")
+            return None
+        con.execute("UPDATE cache_entry SET used_at = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def set(self, key: str, payload: bytes, ttl: float, tags=()):
+        con = self._con()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("DELETE FROM cache_tag WHERE key = ?", (key,))
+            con.execute(
+                "INSERT OR REPLACE INTO cache_entry (key, payload, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(payload), now + ttl, now),
+            )
+            con.executemany("INSERT OR IGNORE INTO cache_tag (tag, key) VALUES (?, ?)", [(t, key) for t in tags])
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(con, now)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def _prune(self, con, now: float):
+        self._delete_keys(con, "expires_at <= ?", (now,))
+        (count,) = con.execute("SELECT COUNT(*) FROM cache_entry").fetchone()
+        over = count - self.max_entries
+        if over > 0:
+            self.evictions += self._delete_keys(
+                con, "key IN (SELECT key FROM cache_entry ORDER BY used_at LIMIT ?)", (over,)
+            )
+
+    def invalidate(self, tags) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        con = self._con()
+        marks = ",".join("?" * len(tags))
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            n = self._delete_keys(con, f"key IN (SELECT key FROM cache_tag WHERE tag IN ({marks}))", tags)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return n
+
+    def clear(self):
+        con = self._con()
+        con.execute("DELETE FROM cache_tag")
+        con.execute("DELETE FROM cache_entry")
+
+    def info(self) -> dict:
+        (count,) = self._con().execute("SELECT COUNT(*) FROM cache_entry").fetchone()
+        return {"backend": "sqlite", "path": self.path, "entries": count,
+                "max_entries": self.max_entries, "evictions": self.evictions}
+
+
+class ResponseCache:
+    """ตัวห่อ backend + ตัวนับ hit/miss (ต่อโปรเซส) ; payload = JSON header บรรทัดแรก + body"""
+
+    def __init__(self, backend, default_ttl: float):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.generation = 0   # +1 ทุกครั้งที่ invalidate (ในโปรเซสนี้)
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "invalidated_tags": 0, "invalidated_entries": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get(self, key: str):
+        payload = self.backend.get(key)
+        if payload is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        head, _, body = payload.partition(b"\n")
+        meta = json.loads(head)
+        return meta["status"], meta["mimetype"], body
+
+    def set(self, key: str, status: int, mimetype: str, body: bytes, ttl=None, tags=(), since=None):
+        # since = generation ตอนเริ่มสร้าง response ; มี invalidate แทรกระหว่างนั้น -> ไม่เก็บ (ข้อมูลอาจเก่าแล้ว)
+        if since is not None and since != self.generation:
+            return
+        head = json.dumps({"status": status, "mimetype": mimetype}).encode()
+        self.backend.set(key, head + b"\n" + body, float(ttl or self.default_ttl), tags)
+        self._count("stores")
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        if not tags:
+            return 0
+        with self._lock:
+            self.generation += 1
+        n = self.backend.invalidate(tags)
+        self._count("invalidated_tags", len(tags))
+        self._count("invalidated_entries", n)
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else None
+        return {**counters, **self.backend.info(), "default_ttl": self.default_ttl}
+
+
+def get_cache() -> ResponseCache | None:
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("response_cache")
+
+
+def invalidate_after_commit(workspace_id, *names: str):
+    """
+    จดแท็กไว้ใน session แล้วค่อยลบ cache หลัง commit สำเร็จ
+    (ลบก่อน commit -> request อื่นอาจเติม cache ด้วยข้อมูลเก่าคืนมาในช่วงนั้น) ; rollback -> ทิ้ง
+    """
+    if not names:
+        return
+    from models import db
+    db.session.info.setdefault(SESSION_KEY, set()).update(cache_tag(workspace_id, n) for n in names)
+
+
+def _after_commit(session):
+    tags = session.info.pop(SESSION_KEY, None)
+    cache = get_cache()
+    if tags and cache is not None:
+        cache.invalidate(tags)
+
+
+def _after_rollback(session):
+    session.info.pop(SESSION_KEY, None)
+
+
+def init_cache(app):
+    """CACHE_BACKEND = lru (default) | sqlite (ใช้ร่วมหลาย worker) | none (ปิด)"""
+    kind = (app.config.get("CACHE_BACKEND") or "lru").lower()
+    if kind == "none":
+        return None
+    if kind == "sqlite":
+        path = app.config.get("CACHE_SQLITE_PATH") or os.path.join(app.instance_path, "response_cache.db")
+        backend = SQLiteBackend(path, int(app.config.get("CACHE_MAX_ENTRIES", 20000)))
+    elif kind == "lru":
+        backend = LRUBackend(int(app.config.get("CACHE_MAX_ENTRIES", 2048)),
+                             int(app.config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+    else:
+        raise RuntimeError(f"Unknown CACHE_BACKEND: {kind}")
+
+    cache = ResponseCache(backend, float(app.config.get("CACHE_DEFAULT_TTL", 300)))
+    app.extensions["response_cache"] = cache
+    if not event.contains(Session, "after_commit", _after_commit):
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
+    return cache
@@ -0,0 +1,174 @@
+# services/checkpoint.py
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from models import db, StockCheckpoint, StockCheckpointBalance, StockMovement
+from models._base import utc_now
+from services.jobs import for_each_workspace, start_periodic
+
+PERIODS = ("DAILY", "MONTHLY")
+
+
+def period_cutoff(period: str, now: datetime | None = None) -> datetime:
+    """เวลาตัดล่าสุดที่ผ่านมาแล้ว (UTC, naive) : DAILY -> เที่ยงคืนวันนี้ / MONTHLY -> เที่ยงคืนวันที่ 1 ของเดือนนี้"""
+    period = (period or "DAILY").upper()
+    if period not in PERIODS:
+        raise ValueError("period must be DAILY or MONTHLY")
+    today = (now or utc_now()).date()
+    if period == "MONTHLY":
+        today = today.replace(day=1)
+    return datetime.combine(today, time.min)
+
+
+def end_of_day(d: date) -> datetime:
+    # "ยอด ณ วันที่ D" = รวมทุก movement ของวัน D -> ตัดที่เที่ยงคืนของวันถัดไป
+    return datetime.combine(d + timedelta(days=1), time.min)
+
+
+def _latest_checkpoint(workspace_id: int, at: datetime):
+    return (
+        db.session.query(StockCheckpoint)
+        .filter(StockCheckpoint.workspace_id == workspace_id, StockCheckpoint.as_of <= at)
+        .order_by(StockCheckpoint.as_of.desc())
+        .first()
+    )
+
+
+def _balance_parts(workspace_id: int, checkpoint, until: datetime, product_ids=None, warehouse_id=None):
+    """
+    (ยอดใน checkpoint) UNION ALL (movement หลัง checkpoint ถึง until)
+    คอลัมน์: warehouse_id, product_id, batch_id, qty, n (n = 1 ต่อ movement ที่ต้อง replay)
+    """
+    mov = select(
+        StockMovement.warehouse_id, StockMovement.product_id, StockMovement.batch_id,
+        StockMovement.qty.label("qty"), literal(1).label("n"),
+    ).where(StockMovement.workspace_id == workspace_id, StockMovement.created_at < until)
+    parts = []
+    if checkpoint is not None:
+        mov = mov.where(StockMovement.created_at >= checkpoint.as_of)
+        bal = select(
+            StockCheckpointBalance.warehouse_id, StockCheckpointBalance.product_id, StockCheckpointBalance.batch_id,
+            StockCheckpointBalance.qty.label("qty"), literal(0).label("n"),
+        ).where(StockCheckpointBalance.checkpoint_id == checkpoint.id)
+        if product_ids is not None:
+            bal = bal.where(StockCheckpointBalance.product_id.in_(product_ids))
+        if warehouse_id is not None:
+            bal = bal.where(StockCheckpointBalance.warehouse_id == warehouse_id)
+        parts.append(bal)
+    if product_ids is not None:
+        mov = mov.where(StockMovement.product_id.in_(product_ids))
+    if warehouse_id is not None:
+        mov = mov.where(StockMovement.warehouse_id == warehouse_id)
+    parts.append(mov)
+    return union_all(*parts).subquery()
+
+
+def create_checkpoint(workspace_id: int, as_of: datetime, period: str = "DAILY") -> StockCheckpoint:
+    """
+    สร้าง checkpoint ณ as_of แบบ set-based: ยอดของ checkpoint ก่อนหน้า + movement ช่วงต่อจากนั้น
+    -> INSERT ... SELECT ... GROUP BY ครั้งเดียว (ผู้เรียก commit) ; มีอยู่แล้ว -> คืนตัวเดิม
+    """
+    existing = (
+        db.session.query(StockCheckpoint)
+        .filter(StockCheckpoint.workspace_id == workspace_id, StockCheckpoint.as_of == as_of)
+        .first()
+    )
+    if existing:
+        return existing
+
+    prev = _latest_checkpoint(workspace_id, as_of)
+    cp = StockCheckpoint(workspace_id=workspace_id, period=period.upper(), as_of=as_of)
+    db.session.add(cp)
+    db.session.flush()
+
+    sub = _balance_parts(workspace_id, prev, as_of)
+    src = (
+        select(
+            literal(cp.id), literal(workspace_id),
+            sub.c.warehouse_id, sub.c.product_id, sub.c.batch_id, func.sum(sub.c.qty),
+        )
+        .group_by(sub.c.warehouse_id, sub.c.product_id, sub.c.batch_id)
+        .having(func.sum(sub.c.qty) != 0)
+    )
+    res = db.session.execute(insert(StockCheckpointBalance).from_select(
+        ["checkpoint_id", "workspace_id", "warehouse_id", "product_id", "batch_id", "qty"], src,
+    ))
+    cp.row_count = res.rowcount or 0
+    return cp
+
+
+def invalidate_checkpoints(workspace_id: int, *movement_criteria) -> int:
+    """
+    เรียกก่อนลบ/แก้ StockMovement ย้อนหลัง (ลบบิลขาย / ลบ-แก้ใบรับเข้า):
+    checkpoint ที่ตัดหลัง movement เก่าสุดที่จะหายไปจะไม่ตรงกับ ledger อีก -> ลบทิ้ง (job สร้างใหม่รอบหน้า)
+    """
+    since = db.session.execute(
+        select(func.min(StockMovement.created_at))
+        .where(StockMovement.workspace_id == workspace_id, *movement_criteria)
+    ).scalar()
+    if since is None:
+        return 0
+    stale = select(StockCheckpoint.id).where(
+        StockCheckpoint.workspace_id == workspace_id, StockCheckpoint.as_of > since,
+    )
+    # ลบ balance เองก่อน (ไม่พึ่ง ON DELETE CASCADE ของ SQLite ที่ต้องเปิด PRAGMA foreign_keys)
+    db.session.execute(
+        delete(StockCheckpointBalance).where(StockCheckpointBalance.checkpoint_id.in_(stale)),
+        execution_options={"synchronize_session": False},
+    )
+    res = db.session.execute(
+        delete(StockCheckpoint).where(StockCheckpoint.id.in_(stale)),
+        execution_options={"synchronize_session": False},
+    )
+    return res.rowcount or 0
+
+
+def stock_as_of(workspace_id: int, at: datetime, product_ids=None, warehouse_id=None, by_batch: bool = False) -> dict:
+    """
+    ยอดคงเหลือ ณ เวลา at (ไม่รวม movement ที่ created_at >= at)
+    = checkpoint ล่าสุดที่ as_of <= at + replay movement ช่วง [as_of, at) ใน query เดียว
+    return {"checkpoint": StockCheckpoint | None, "replayed": จำนวน movement, "rows": [...]}
+    """
+    ids = None if product_ids is None else list({int(i) for i in product_ids})
+    cp = _latest_checkpoint(workspace_id, at)
+    sub = _balance_parts(workspace_id, cp, at, ids, warehouse_id)
+
+    keys = [sub.c.warehouse_id, sub.c.product_id] + ([sub.c.batch_id] if by_batch else [])
+    rows = db.session.execute(
+        select(*keys, func.sum(sub.c.qty), func.sum(sub.c.n))
+        .group_by(*keys)
+        .order_by(*keys)
+    ).all()
+
+    out, replayed = [], 0
+    for r in rows:
+        replayed += int(r[-1] or 0)
+        qty = int(r[-2] or 0)
+        if qty == 0:
+            continue
+        row = {"warehouse_id": r[0], "product_id": r[1], "qty": qty}
+        if by_batch:
+            row["batch_id"] = r[2]
+        out.append(row)
+    return {"checkpoint": cp, "replayed": replayed, "rows": out}
+
+
+def checkpoint_all_workspaces(period: str = "DAILY", as_of: datetime | None = None,
+                              workspace_id: int | None = None) -> dict:
+    """สร้าง checkpoint ทุกร้าน (commit ทีละร้าน) ; as_of ไม่ส่ง -> เวลาตัดล่าสุดของรอบนั้น"""
+    as_of = as_of or period_cutoff(period)
+
+    def _one(wsid):
+        cp = create_checkpoint(wsid, as_of, period)
+        return {"checkpoint_id": cp.id, "as_of": cp.as_of.isoformat(), "rows": cp.row_count}
+
+    return for_each_workspace(_one, "Stock checkpoint", workspace_id)
+
+
+def start_checkpoint_scheduler(app):
+    """
+    STOCK_CHECKPOINT_INTERVAL_SECONDS > 0 -> ตรวจเป็นระยะใน daemon thread ว่าถึงเวลาตัดรอบ (STOCK_CHECKPOINT_PERIOD) หรือยัง
+    (create_checkpoint ไม่สร้างซ้ำ -> เรียกถี่ได้) ; production หลาย worker แนะนำ cron `flask stock-checkpoint`
+    """
+    period = (app.config.get("STOCK_CHECKPOINT_PERIOD") or "DAILY").upper()
+    return start_periodic(app, "stock-checkpoint", "STOCK_CHECKPOINT_INTERVAL_SECONDS",
+                          lambda: checkpoint_all_workspaces(period))
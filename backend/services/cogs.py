@@ -0,0 +1,160 @@
+# services/cogs.py
+from sqlalchemy import func, insert, literal, select, update
+from models import db, CogsEntry, Product, Sale, StockBatch
+from models._base import utc_now
+
+
+def parse_unit_cost(value, fallback=None) -> float | None:
+    """ต้นทุน/หน่วยย่อย จาก payload ; ว่าง -> fallback (product.cost_price) ; ติดลบ/ไม่ใช่ตัวเลข -> ValueError"""
+    if value in (None, ""):
+        return float(fallback) if fallback is not None else None
+    try:
+        cost = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("unit_cost must be a number")
+    if cost < 0:
+        raise ValueError("unit_cost must be >= 0")
+    return cost
+
+
+def add_batch_cost(batch: StockBatch, base_qty: int, unit_cost: float | None):
+    """
+    ถัวเฉลี่ยถ่วงน้ำหนักต้นทุนของล็อตเมื่อรับเข้าเพิ่ม (เรียกก่อนบวก qty_received)
+    ล็อตเดิมยังไม่มีต้นทุน -> ใช้ต้นทุนใหม่ทั้งก้อน
+    """
+    if unit_cost is None:
+        return
+    old_qty = int(batch.qty_received or 0)
+    if batch.unit_cost is None or old_qty <= 0:
+        batch.unit_cost = float(unit_cost)
+    else:
+        batch.unit_cost = (batch.unit_cost * old_qty + unit_cost * base_qty) / (old_qty + base_qty)
+
+
+def batch_unit_costs(batch_ids) -> dict:
+    # ต้นทุน/หน่วยของล็อต (ล็อตเก่าก่อนมี unit_cost -> product.cost_price) ใน query เดียว
+    ids = list({int(b) for b in batch_ids})
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        select(StockBatch.id, func.coalesce(StockBatch.unit_cost, Product.cost_price, 0.0))
+        .join(Product, Product.id == StockBatch.product_id)
+        .where(StockBatch.id.in_(ids))
+    ).all()
+    return {bid: float(cost or 0.0) for bid, cost in rows}
+
+
+def record_sale_cogs(sales: list):
+    """ลง COGS ของทุก allocation ในบิล (หลัง flush แล้ว: ต้องมี sale.id / sale_item.id) แบบ executemany"""
+    allocations = [(s, si, sib) for s in sales for si in s.items for sib in si.batches]
+    if not allocations:
+        return
+    costs = batch_unit_costs(sib.batch_id for _, _, sib in allocations)
+    now = utc_now()
+    db.session.execute(insert(CogsEntry), [{
+        "workspace_id": s.workspace_id,
+        "warehouse_id": s.warehouse_id,
+        "sale_id": s.id,
+        "sale_item_id": si.id,
+        "channel_id": s.channel_id,
+        "product_id": sib.product_id,
+        "batch_id": sib.batch_id,
+        "entry_type": "SALE",
+        "sale_date": s.sale_date,
+        "qty": int(sib.qty),
+        "unit_cost": costs.get(sib.batch_id, 0.0),
+        "cost_amount": int(sib.qty) * costs.get(sib.batch_id, 0.0),
+        "created_at": now,
+    } for s, si, sib in allocations])
+
+
+def reverse_sale_cogs(workspace_id: int, sale_id: int) -> int:
+    """ลบบิล -> INSERT ... SELECT แถว REVERSAL (ติดลบ) จากแถว SALE ของบิลนั้น ; return จำนวนแถว"""
+    src = select(
+        CogsEntry.workspace_id, CogsEntry.warehouse_id, CogsEntry.sale_id, CogsEntry.sale_item_id,
+        CogsEntry.channel_id, CogsEntry.product_id, CogsEntry.batch_id,
+        literal("REVERSAL"), CogsEntry.sale_date,
+        -CogsEntry.qty, CogsEntry.unit_cost, -CogsEntry.cost_amount,
+        literal(utc_now(), CogsEntry.created_at.type),
+    ).where(
+        CogsEntry.workspace_id == workspace_id,
+        CogsEntry.sale_id == sale_id,
+        CogsEntry.entry_type == "SALE",
+    )
+    res = db.session.execute(insert(CogsEntry).from_select(
+        ["workspace_id", "warehouse_id", "sale_id", "sale_item_id", "channel_id", "product_id", "batch_id",
+         "entry_type", "sale_date", "qty", "unit_cost", "cost_amount", "created_at"],
+        src,
+    ))
+    return res.rowcount or 0
+
+
+def resnapshot_sale_cogs(sale: Sale) -> int:
+    """แก้หัวบิล (วันที่ / ช่องทาง) -> ตาม snapshot sale_date / channel_id ในแถว COGS ของบิลนั้นให้ตรง ; return จำนวนแถว"""
+    res = db.session.execute(
+        update(CogsEntry)
+        .where(CogsEntry.workspace_id == sale.workspace_id, CogsEntry.sale_id == sale.id)
+        .values(sale_date=sale.sale_date, channel_id=sale.channel_id)
+    )
+    return res.rowcount or 0
+
+
+def profit_summary(workspace_id: int, group_by: str, date_from=None, date_to=None, limit: int = 100) -> list:
+    """
+    กำไร = ยอดที่ร้านได้รับ (Sale.seller_receive) - ต้นทุนขาย (SUM cogs_ledger.cost_amount)
+    group_by: "sale" | "channel" | "day" — ทั้งสองฝั่งเป็น SUM ตาม index (workspace, [channel,] date)
+    """
+    keys = {
+        "sale":    (Sale.id, CogsEntry.sale_id),
+        "channel": (Sale.channel_id, CogsEntry.channel_id),
+        "day":     (func.date(Sale.sale_date), func.date(CogsEntry.sale_date)),
+    }
+    if group_by not in keys:
+        raise ValueError("group_by must be sale, channel or day")
+    sale_key, cogs_key = keys[group_by]
+
+    rev_q = (
+        select(sale_key.label("k"), func.count(Sale.id), func.sum(Sale.subtotal), func.sum(Sale.seller_receive))
+        .where(Sale.workspace_id == workspace_id)
+        .group_by(sale_key)
+    )
+    cogs_q = (
+        select(cogs_key.label("k"), func.sum(CogsEntry.cost_amount))
+        .where(CogsEntry.workspace_id == workspace_id)
+        .group_by(cogs_key)
+    )
+    if date_from is not None:
+        rev_q = rev_q.where(Sale.sale_date >= date_from)
+        cogs_q = cogs_q.where(CogsEntry.sale_date >= date_from)
+    if date_to is not None:
+        rev_q = rev_q.where(Sale.sale_date < date_to)
+        cogs_q = cogs_q.where(CogsEntry.sale_date < date_to)
+    if group_by == "sale":
+        # ราย "บิล": เอาเฉพาะบิลล่าสุด N ใบ แล้วดึง COGS เฉพาะบิลเหล่านั้น
+        rev_q = rev_q.order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(limit)
+
+    revenue = db.session.execute(rev_q).all()
+    if group_by == "sale":
+        cogs_q = cogs_q.where(CogsEntry.sale_id.in_([r[0] for r in revenue]))
+    cogs = dict(db.session.execute(cogs_q).all())
+
+    # รวม key ทั้งสองฝั่ง: กลุ่มที่มีแต่ COGS ต้องไม่หาย (ยกเว้นที่หักล้างกันเป็น 0 จาก REVERSAL ของบิลที่ลบไปแล้ว)
+    rev = {k: (n, subtotal, receive) for k, n, subtotal, receive in revenue}
+    out = []
+    for k in list(rev) + [k for k, cost in cogs.items() if k not in rev and cost]:
+        n, subtotal, receive = rev.get(k, (0, 0.0, 0.0))
+        cost = float(cogs.get(k) or 0.0)
+        receive = float(receive or 0.0)
+        out.append({
+            group_by: k,
+            "sales": int(n),
+            "subtotal": float(subtotal or 0.0),
+            "seller_receive": receive,
+            "cogs": cost,
+            "profit": receive - cost,
+        })
+    if group_by == "day":
+        out.sort(key=lambda r: r["day"] or "", reverse=True)
+    elif group_by == "channel":
+        out.sort(key=lambda r: r["channel"] or 0)
+    return out
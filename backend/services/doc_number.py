@@ -0,0 +1,42 @@
+# services/doc_number.py
+from datetime import date
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from models import db, DocSequence
+
+
+def next_sequence(workspace_id: int, prefix: str, day: date, seed=None) -> int:
+    """
+    ออกเลขถัดไปของ (workspace, prefix, day) แบบ atomic
+    - มีแถวแล้ว -> UPDATE last_value = last_value + 1 RETURNING (ไม่ต้อง LIKE scan)
+    - ยังไม่มี  -> INSERT แถวใหม่; seed() คืนเลขล่าสุดที่เคยออกไปแล้ว (ใช้ตอนเปลี่ยนมาใช้ตัวนับกลางวัน)
+    """
+    bump = (
+        update(DocSequence)
+        .where(
+            DocSequence.workspace_id == workspace_id,
+            DocSequence.prefix == prefix,
+            DocSequence.day == day,
+        )
+        .values(last_value=DocSequence.last_value + 1)
+        .returning(DocSequence.last_value)
+    )
+    value = db.session.execute(bump).scalar()
+    if value is not None:
+        return int(value)
+
+    start = int(seed() or 0) if seed else 0
+    try:
+        with db.session.begin_nested():
+            db.session.add(DocSequence(workspace_id=workspace_id, prefix=prefix, day=day, last_value=start + 1))
+        return start + 1
+    except IntegrityError:
+        # อีก request สร้างแถวของวันนี้ตัดหน้าไปแล้ว -> นับต่อจากแถวนั้น
+        return int(db.session.execute(bump).scalar())
+
+
+def next_doc_number(workspace_id: int, prefix: str, day: date | None = None, seed=None) -> str:
+    # รูปแบบเดิม: {PREFIX}-{YYYYMMDD}-{NNN}
+    day = day or date.today()
+    n = next_sequence(workspace_id, prefix, day, seed)
+    return f"{prefix}-{day.strftime('%Y%m%d')}-{n:03d}"
@@ -0,0 +1,91 @@
+# services/expiry.py
+from datetime import date
+from sqlalchemy import and_, func, insert, literal, select, update
+from models import db, StockBatch, StockMovement
+from models._base import utc_now
+from services.jobs import for_each_workspace, start_periodic
+from services.stock_level import apply_stock_deltas, refresh_stockin_locks
+
+
+def _expired_filter(workspace_id: int, today: date):
+    # ใช้ ix_batch_ws_expiry (workspace, expiry_date)
+    return and_(
+        StockBatch.workspace_id == workspace_id,
+        StockBatch.expiry_date.is_not(None),
+        StockBatch.expiry_date < today,
+        StockBatch.qty_remaining > StockBatch.qty_reserved,
+    )
+
+
+def sweep_expired(workspace_id: int, today: date | None = None) -> dict:
+    """
+    ตัดล็อตที่หมดอายุแล้วของร้านออกจากสต็อกแบบ set-based (ไม่วนทีละล็อตใน Python)
+    1) INSERT ... SELECT movement(EXPIRED) จากล็อตที่หมดอายุ (qty = -(qty_remaining - qty_reserved))
+    2) สรุปยอดต่อ (warehouse, product) -> stock_level
+    3) UPDATE stock_batch SET qty_remaining = qty_reserved
+    ยอดที่ใบจองกันไว้ยังไม่ตัด (ใบจองยืนยัน/ปล่อยก่อน) -> ส่วนที่ปล่อยคืนจะถูกตัดใน sweep รอบถัดไป
+    ทั้งหมดอยู่ใน transaction เดียว (ผู้เรียก commit) ; return {"batches", "units"}
+    """
+    today = today or date.today()
+    cond = _expired_filter(workspace_id, today)
+    now = utc_now()
+
+    # 1) movement EXPIRED (write แรกจับ write lock ไว้ -> ข้อ 2-3 เห็นชุดล็อตเดียวกัน)
+    src = select(
+        StockBatch.product_id,
+        StockBatch.id,
+        literal("EXPIRED"),
+        StockBatch.qty_reserved - StockBatch.qty_remaining,
+        StockBatch.qty_reserved,
+        literal(f"Expired (swept {today.isoformat()})"),
+        literal(now, StockMovement.created_at.type),
+        StockBatch.workspace_id,
+        StockBatch.warehouse_id,
+    ).where(cond)
+    res = db.session.execute(
+        insert(StockMovement).from_select(
+            ["product_id", "batch_id", "movement_type", "qty", "batch_qty_remaining",
+             "note", "created_at", "workspace_id", "warehouse_id"],
+            src,
+        )
+    )
+    if not res.rowcount:
+        return {"batches": 0, "units": 0}
+
+    # 2) ยอดที่จะหายไปต่อ (ws, wh, product)
+    rows = db.session.execute(
+        select(StockBatch.warehouse_id, StockBatch.product_id,
+               func.count(), func.sum(StockBatch.qty_remaining - StockBatch.qty_reserved))
+        .where(cond)
+        .group_by(StockBatch.warehouse_id, StockBatch.product_id)
+    ).all()
+
+    # 3) zero ส่วนที่ไม่ได้จองของล็อตทั้งชุดใน UPDATE เดียว (จำใบรับเข้าไว้ก่อน เงื่อนไขจะไม่ตรงหลัง UPDATE)
+    stockin_ids = db.session.execute(select(StockBatch.stockin_id).where(cond).distinct()).scalars().all()
+    db.session.execute(
+        update(StockBatch).where(cond).values(qty_remaining=StockBatch.qty_reserved),
+        execution_options={"synchronize_session": False},
+    )
+
+    refresh_stockin_locks(StockBatch.stockin_id.in_(stockin_ids))
+
+    deltas = {(workspace_id, wh, pid): -int(units) for wh, pid, _, units in rows}
+    apply_stock_deltas(deltas)
+
+    return {
+        "batches": sum(int(n) for _, _, n, _ in rows),
+        "units": sum(int(u) for _, _, _, u in rows),
+    }
+
+
+def sweep_all_workspaces(today: date | None = None, workspace_id: int | None = None) -> dict:
+    """sweep ทีละร้าน + commit ทีละร้าน (ร้านที่พังไม่ลากร้านอื่น) ; return {wsid: summary | error}"""
+    return for_each_workspace(lambda wsid: sweep_expired(wsid, today), "Expiry sweep", workspace_id)
+
+
+def start_expiry_scheduler(app):
+    """
+    ตัวตั้งเวลาในโปรเซส (optional): EXPIRY_SWEEP_INTERVAL_SECONDS > 0 -> sweep ทุกร้านเป็นระยะใน daemon thread
+    production ที่มีหลาย worker แนะนำใช้ cron เรียก `flask sweep-expired` แทน
+    """
+    return start_periodic(app, "expiry-sweeper", "EXPIRY_SWEEP_INTERVAL_SECONDS", sweep_all_workspaces)
@@ -0,0 +1,181 @@
+# services/export.py
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from flask import Response, stream_with_context
+from sqlalchemy import Date, DateTime, select
+from models import db, Product, ProductVariant, Sale, SaleItem, StockBatch, StockMovement
+
+YIELD_PER = 1000           # แถวต่อรอบ fetch จาก cursor
+FLUSH_BYTES = 64 * 1024    # ส่งออกทีละก้อน ~64KB (ไม่ yield ทีละแถว)
+FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def parse_export_args(args) -> dict:
+    """format (csv | ndjson), date_from / date_to (yyyy-MM-dd รวมวันสุดท้าย), channel_id / warehouse_id / product_id"""
+    fmt = (args.get("format") or "csv").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    date_from = date.fromisoformat(args["date_from"]) if args.get("date_from") else None
+    date_to = date.fromisoformat(args["date_to"]) + timedelta(days=1) if args.get("date_to") else None
+    return {
+        "format": fmt,
+        "date_from": datetime.combine(date_from, time.min) if date_from else None,
+        "date_to": datetime.combine(date_to, time.min) if date_to else None,
+        "channel_id": int(args["channel_id"]) if args.get("channel_id") else None,
+        "warehouse_id": int(args["warehouse_id"]) if args.get("warehouse_id") else None,
+        "product_id": int(args["product_id"]) if args.get("product_id") else None,
+    }
+
+
+def _range(stmt, col, f: dict):
+    if f["date_from"] is not None:
+        stmt = stmt.where(col >= f["date_from"])
+    if f["date_to"] is not None:
+        stmt = stmt.where(col < f["date_to"])
+    return stmt
+
+
+def sales_export_query(workspace_id: int, f: dict):
+    # 1 แถวต่อ SaleItem (หัวบิลซ้ำทุกแถว) เรียงตาม (sale_date, id) บน ix_sale_ws_date_id
+    stmt = (
+        select(
+            Sale.id.label("sale_id"), Sale.sale_date, Sale.warehouse_id, Sale.channel_id, Sale.channel_name_at_sale,
+            Sale.source_platform, Sale.external_order_id, Sale.customer_name, Sale.province,
+            SaleItem.id.label("sale_item_id"), SaleItem.product_id, Product.sku,
+            SaleItem.variant_id, ProductVariant.sku_suffix, SaleItem.sale_mode_at_sale, SaleItem.pack_size_at_sale,
+            SaleItem.quantity_pack, SaleItem.base_units, SaleItem.unit_price_at_sale, SaleItem.line_total,
+            Sale.subtotal, Sale.shipping_fee, Sale.shop_discount, Sale.platform_discount, Sale.coin_discount,
+            Sale.vat_amount, Sale.commission_percent_at_sale, Sale.commission_fee,
+            Sale.transaction_percent_at_sale, Sale.transaction_fee, Sale.customer_pay, Sale.seller_receive,
+        )
+        .join(SaleItem, SaleItem.sale_id == Sale.id)
+        .join(Product, Product.id == SaleItem.product_id)
+        .outerjoin(ProductVariant, ProductVariant.id == SaleItem.variant_id)
+        .where(Sale.workspace_id == workspace_id)
+    )
+    stmt = _range(stmt, Sale.sale_date, f)
+    if f["channel_id"]:
+        stmt = stmt.where(Sale.channel_id == f["channel_id"])
+    if f["warehouse_id"]:
+        stmt = stmt.where(Sale.warehouse_id == f["warehouse_id"])
+    if f["product_id"]:
+        stmt = stmt.where(SaleItem.product_id == f["product_id"])
+    return stmt.order_by(Sale.sale_date, Sale.id, SaleItem.id)
+
+
+def movements_export_query(workspace_id: int, f: dict):
+    # ledger ตามเวลา (ix_mov_ws_created) ; channel_id -> เฉพาะ movement ของบิลขายช่องทางนั้น
+    m = StockMovement
+    stmt = (
+        select(
+            m.id.label("movement_id"), m.created_at, m.movement_type, m.product_id, Product.sku,
+            m.warehouse_id, m.batch_id, StockBatch.lot_number, StockBatch.expiry_date,
+            m.qty, m.batch_qty_remaining, m.ref_stockin_id, m.ref_sale_id, m.ref_transfer_id, m.note,
+        )
+        .join(Product, Product.id == m.product_id)
+        .outerjoin(StockBatch, StockBatch.id == m.batch_id)
+        .where(m.workspace_id == workspace_id)
+    )
+    stmt = _range(stmt, m.created_at, f)
+    if f["channel_id"]:
+        stmt = stmt.join(Sale, Sale.id == m.ref_sale_id).where(Sale.channel_id == f["channel_id"])
+    if f["warehouse_id"]:
+        stmt = stmt.where(m.warehouse_id == f["warehouse_id"])
+    if f["product_id"]:
+        stmt = stmt.where(m.product_id == f["product_id"])
+    return stmt.order_by(m.created_at, m.id)
+
+
+def batches_export_query(workspace_id: int, f: dict):
+    # ล็อตทั้งหมด (ช่วงวันที่ = วันรับเข้า created_at) เรียงตาม id
+    b = StockBatch
+    stmt = (
+        select(
+            b.id.label("batch_id"), b.created_at, b.product_id, Product.sku, b.warehouse_id, b.stockin_id,
+            b.lot_number, b.expiry_date, b.qty_received, b.qty_remaining, b.qty_reserved, b.unit_cost,
+            b.origin_batch_id,
+        )
+        .join(Product, Product.id == b.product_id)
+        .where(b.workspace_id == workspace_id)
+    )
+    stmt = _range(stmt, b.created_at, f)
+    if f["warehouse_id"]:
+        stmt = stmt.where(b.warehouse_id == f["warehouse_id"])
+    if f["product_id"]:
+        stmt = stmt.where(b.product_id == f["product_id"])
+    return stmt.order_by(b.id)
+
+
+def _row_formatter(stmt):
+    # แปลงเฉพาะคอลัมน์วันที่ (รู้จาก type ของ select ครั้งเดียว) -> isoformat ; คอลัมน์อื่นส่งต่อตามเดิม
+    date_idx = [i for i, c in enumerate(stmt.selected_columns) if isinstance(c.type, (Date, DateTime))]
+    if not date_idx:
+        return tuple
+
+    def fmt(row):
+        row = list(row)
+        for i in date_idx:
+            v = row[i]
+            if v is not None:
+                row[i] = v.isoformat()
+        return row
+
+    return fmt
+
+
+def _iter_csv(keys, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")   # BOM ให้ Excel อ่านภาษาไทยถูก
+    writer.writerow(keys)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _iter_ndjson(keys, rows):
+    chunk = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(keys, row)), ensure_ascii=False)
+        chunk.append(line)
+        size += len(line) + 1
+        if size >= FLUSH_BYTES:
+            yield "\n".join(chunk) + "\n"
+            chunk, size = [], 0
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def stream_export(stmt, fmt: str, filename: str) -> Response:
+    """
+    ส่งผล select เป็น CSV / NDJSON แบบ stream : ดึงจาก cursor ทีละ YIELD_PER แถว (ไม่สร้าง ORM object / list ทั้งก้อน)
+    หน่วยความจำคงที่ไม่ว่าช่วงข้อมูลจะยาวแค่ไหน ; ไบต์แรกออกทันทีที่ได้แถวแรก
+    """
+    keys = [c.key for c in stmt.selected_columns]
+    fmt_row = _row_formatter(stmt)
+
+    def generate():
+        result = db.session.execute(stmt, execution_options={"yield_per": YIELD_PER})
+        try:
+            rows = map(fmt_row, result)
+            yield from (_iter_csv(keys, rows) if fmt == "csv" else _iter_ndjson(keys, rows))
+        finally:
+            result.close()
+
+    ext = "csv" if fmt == "csv" else "ndjson"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{ext}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",   # nginx: ส่งต่อทันที ไม่ buffer ทั้งไฟล์
+        },
+    )
@@ -0,0 +1,191 @@
+# services/fefo.py
+import random
+import time
+from datetime import date
+from flask import current_app
+from sqlalchemy import or_, update, select, bindparam
+from models import db, StockBatch
+from services.stock_level import refresh_stockin_locks
+
+
+class AllocationConflict(ValueError):
+    """ล็อตถูกตัดไปพร้อมกัน (ระหว่างวางแผนกับตัดจริง) -> ต้อง re-plan ใหม่"""
+
+
+def load_candidate_batches(product_ids, workspace_id: int | None = None,
+                           warehouse_id: int | None = None, today: date | None = None) -> dict:
+    """
+    ดึงล็อตที่ยังขายได้ของหลายสินค้าใน query เดียว
+    - กรองล็อตว่าง / หมดอายุแล้วใน SQL (ไม่ต้องเช็ค _is_expired ใน Python)
+    - ยอดที่ถูกจองไว้ (qty_reserved) ถือว่าไม่ว่าง: ขายได้ = qty_remaining - qty_reserved
+    - เรียง FEFO: expiry ใกล้สุดก่อน, NULL expiry ไปท้าย
+    - ไม่ lock แถว: ตอนตัดจริงใช้ consume_batches (conditional UPDATE) แล้ว re-plan ถ้าชน
+    return {product_id: [[batch_id, qty_available], ...]}
+    """
+    ids = list({int(pid) for pid in product_ids})
+    if not ids:
+        return {}
+    today = today or date.today()
+
+    available = StockBatch.qty_remaining - StockBatch.qty_reserved
+    q = (
+        db.session.query(StockBatch.id, StockBatch.product_id, available)
+        .filter(
+            StockBatch.product_id.in_(ids),
+            available > 0,
+            or_(StockBatch.expiry_date.is_(None), StockBatch.expiry_date >= today),
+        )
+        .order_by(
+            StockBatch.product_id,
+            StockBatch.expiry_date.is_(None).asc(),
+            StockBatch.expiry_date.asc(),
+            StockBatch.id.asc(),
+        )
+    )
+    if workspace_id is not None:
+        q = q.filter(StockBatch.workspace_id == workspace_id)
+    if warehouse_id is not None:
+        q = q.filter(StockBatch.warehouse_id == warehouse_id)
+
+    pool = {}
+    for batch_id, product_id, qty in q.all():
+        pool.setdefault(product_id, []).append([batch_id, int(qty or 0)])
+    return pool
+
+
+def allocate_from_pool(pool: dict, product_id: int, units_needed: int) -> list:
+    """
+    วางแผน FEFO ของ 1 รายการจาก pool ในหน่วยความจำ -> [(batch_id, qty), ...]
+    ถ้าของไม่พอ -> ValueError และ pool ไม่ถูกแตะ (รายการถัดไปยังใช้ pool เดิมได้)
+    """
+    if units_needed <= 0:
+        return []
+    candidates = pool.get(product_id, [])
+
+    plan, remain = [], units_needed
+    for batch_id, available in candidates:
+        take = min(available, remain)
+        if take <= 0:
+            continue
+        plan.append((batch_id, take))
+        remain -= take
+        if remain <= 0:
+            break
+    if remain > 0:
+        raise ValueError(f"Not enough stock for product {product_id}: need {units_needed}, short {remain}")
+
+    # ตัดยอดใน pool (สินค้าเดียวกันหลายบรรทัดจะไม่จองล็อตซ้ำกัน)
+    taken = dict(plan)
+    for cand in candidates:
+        cand[1] -= taken.get(cand[0], 0)
+    return plan
+
+
+def allocate_order_from_pool(pool: dict, lines) -> list:
+    """
+    วางแผนทั้งออเดอร์จาก pool: ได้ครบทุกบรรทัด หรือไม่ได้เลย
+    (บรรทัดหลังไม่พอ -> คืนยอดของบรรทัดก่อนหน้ากลับเข้า pool แล้ว raise ValueError)
+    """
+    plans = []
+    try:
+        for pid, units in lines:
+            plans.append(allocate_from_pool(pool, int(pid), int(units)))
+    except ValueError:
+        for (pid, _), plan in zip(lines, plans):
+            given_back = dict(plan)
+            for cand in pool.get(int(pid), []):
+                cand[1] += given_back.get(cand[0], 0)
+        raise
+    return plans
+
+
+def plan_fefo_order(lines, workspace_id: int | None = None, warehouse_id: int | None = None) -> list:
+    """
+    lines = [(product_id, units_needed), ...]  (ทั้งออเดอร์)
+    return [[(batch_id, qty), ...], ...] เรียงตาม lines
+    """
+    lines = [(int(pid), int(units)) for pid, units in lines]
+    pool = load_candidate_batches({pid for pid, _ in lines}, workspace_id, warehouse_id)
+    return allocate_order_from_pool(pool, lines)
+
+
+def _apply_cuts(cuts, stmt) -> dict:
+    # executemany ของ conditional UPDATE ; แถวไหนเงื่อนไขไม่ผ่าน (มีคนตัด/จองไปก่อน) -> AllocationConflict
+    cuts = [(int(b), int(q)) for b, q in cuts if int(q) > 0]
+    if not cuts:
+        return {}
+
+    t = StockBatch.__table__
+    conn = db.session.connection(bind_arguments={"mapper": StockBatch})
+    if conn.dialect.supports_sane_multi_rowcount:
+        res = conn.execute(stmt, [{"b_id": b, "b_cut": q} for b, q in cuts])
+        if res.rowcount != len(cuts):
+            raise AllocationConflict("Concurrent update: some batches not enough")
+    else:
+        for b, q in cuts:
+            if conn.execute(stmt, {"b_id": b, "b_cut": q}).rowcount != 1:
+                raise AllocationConflict(f"Concurrent update: batch {b} not enough")
+
+    ids = list({b for b, _ in cuts})
+    refresh_stockin_locks(StockBatch.id.in_(ids))
+    return dict(conn.execute(select(t.c.id, t.c.qty_remaining).where(t.c.id.in_(ids))).all())
+
+
+def consume_batches(cuts, reserved: bool = False) -> dict:
+    """
+    ตัดหลายล็อตพร้อมกันแบบ atomic: executemany ของ conditional UPDATE
+      UPDATE ... SET qty_remaining = qty_remaining - :cut WHERE qty_remaining - qty_reserved >= :cut
+    (ไม่พึ่ง SELECT ... FOR UPDATE ซึ่ง SQLite ไม่รองรับ) ; ถ้ามีบิลอื่นตัดไปก่อนจนไม่พอ -> AllocationConflict
+    cuts = [(batch_id, qty), ...] (ล็อตเดียวกันซ้ำได้)
+    reserved=True -> ตัดจากยอดที่จองไว้แล้ว (ยืนยันใบจอง): ลดทั้ง qty_remaining และ qty_reserved
+    return {batch_id: qty_remaining หลังตัดครบทุกแถว}
+    """
+    t = StockBatch.__table__
+    cut = bindparam("b_cut")
+    if reserved:
+        stmt = (
+            update(t)
+            .where(t.c.id == bindparam("b_id"), t.c.qty_reserved >= cut)
+            .values(qty_remaining=t.c.qty_remaining - cut, qty_reserved=t.c.qty_reserved - cut)
+        )
+    else:
+        stmt = (
+            update(t)
+            .where(t.c.id == bindparam("b_id"), t.c.qty_remaining - t.c.qty_reserved >= cut)
+            .values(qty_remaining=t.c.qty_remaining - cut)
+        )
+    return _apply_cuts(cuts, stmt)
+
+
+def reserve_batches(cuts) -> dict:
+    """กันยอดไว้ (qty_reserved += :cut) เฉพาะล็อตที่ยังว่างพอ ; ชน -> AllocationConflict"""
+    t = StockBatch.__table__
+    cut = bindparam("b_cut")
+    stmt = (
+        update(t)
+        .where(t.c.id == bindparam("b_id"), t.c.qty_remaining - t.c.qty_reserved >= cut)
+        .values(qty_reserved=t.c.qty_reserved + cut)
+    )
+    return _apply_cuts(cuts, stmt)
+
+
+def run_with_fefo_retry(fn):
+    """
+    เรียก fn() (วางแผน + ตัดล็อตภายใน savepoint) ซ้ำเมื่อเจอ AllocationConflict
+    - จำนวนครั้ง / backoff ตั้งได้ผ่าน FEFO_MAX_ATTEMPTS, FEFO_RETRY_BASE_DELAY, FEFO_RETRY_MAX_DELAY
+    - ครบจำนวนครั้งแล้วยังชน -> ส่ง AllocationConflict ต่อ (ให้ route ตอบ 409)
+    """
+    cfg = current_app.config
+    max_attempts = int(cfg.get("FEFO_MAX_ATTEMPTS", 5))
+    base_delay = float(cfg.get("FEFO_RETRY_BASE_DELAY", 0.01))
+    max_delay = float(cfg.get("FEFO_RETRY_MAX_DELAY", 0.2))
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn()
+        except AllocationConflict:
+            if attempt >= max_attempts:
+                raise
+            # exponential backoff + jitter กันชนซ้ำพร้อมกัน
+            delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
+            time.sleep(delay * random.uniform(0.5, 1.0))
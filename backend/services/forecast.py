@@ -0,0 +1,180 @@
+# services/forecast.py
+import json
+import math
+from datetime import date, datetime, time, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import delete, func, insert, select
+from models import db, DemandForecast, Product, Sale, SaleItem, StockLevel
+from models._base import utc_now
+from services.jobs import for_each_workspace, start_periodic
+
+DEFAULTS = {
+    "FORECAST_HISTORY_DAYS": 365,
+    "FORECAST_MA_DAYS": 28,
+    "FORECAST_SMOOTHING_ALPHA": 0.1,
+    "FORECAST_HORIZON_DAYS": 14,
+    "FORECAST_LEAD_TIME_DAYS": 7,
+    "FORECAST_SERVICE_Z": 1.65,
+}
+
+
+def _np():
+    # numpy ใช้เฉพาะงาน batch นี้ -> import ตอนเรียก (เว็บโปรเซสไม่ต้องโหลด)
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("numpy is required for demand forecasting (pip install numpy)")
+    return numpy
+
+
+def _cfg(key: str):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+def load_daily_matrix(workspace_id: int, start: date, end: date):
+    """
+    ยอดขาย base units ต่อ (สินค้า x วัน) ในช่วง [start, end] ของร้าน -> (product_ids, matrix P x T)
+    GROUP BY (product, วัน) ใน query เดียว แล้วเติมลง array ด้วย np.add.at (ไม่วนทีละสินค้า)
+    แถวของ matrix = ทุกสินค้าในร้าน (สินค้าไม่มียอดขาย = 0 ทั้งแถว)
+    """
+    np = _np()
+    product_ids = np.array(
+        db.session.execute(
+            select(Product.id).where(Product.workspace_id == workspace_id).order_by(Product.id)
+        ).scalars().all(),
+        dtype=np.int64,
+    )
+    n_days = (end - start).days + 1
+    matrix = np.zeros((len(product_ids), max(n_days, 0)), dtype=np.float64)
+    if not len(product_ids) or n_days <= 0:
+        return product_ids, matrix
+
+    day = func.date(Sale.sale_date)
+    rows = db.session.execute(
+        select(SaleItem.product_id, day, func.sum(SaleItem.base_units))
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .where(
+            Sale.workspace_id == workspace_id,
+            Sale.sale_date >= datetime.combine(start, time.min),
+            Sale.sale_date < datetime.combine(end + timedelta(days=1), time.min),
+        )
+        .group_by(SaleItem.product_id, day)
+    ).all()
+    if rows:
+        pids, days, qty = zip(*rows)
+        pids = np.array(pids, dtype=np.int64)
+        rows_idx = np.minimum(np.searchsorted(product_ids, pids), len(product_ids) - 1)
+        valid = product_ids[rows_idx] == pids   # สินค้าที่ถูกลบไปแล้วแต่ยังมียอดขายเก่า -> ทิ้ง
+        day_idx = (np.array([str(d) for d in days], dtype="datetime64[D]") - np.datetime64(start, "D")).astype(np.int64)
+        np.add.at(matrix, (rows_idx[valid], day_idx[valid]), np.array(qty, dtype=np.float64)[valid])
+    return product_ids, matrix
+
+
+def fit_forecasts(matrix, start: date, horizon: int, ma_days: int, alpha: float):
+    """
+    fit ทุกสินค้าพร้อมกัน (ทุกขั้นเป็น vector/matrix op บนแกนสินค้า):
+      moving average N วันล่าสุด, simple exponential smoothing (ถ่วงน้ำหนักด้วย matrix @ weights),
+      ตัวคูณรายวันในสัปดาห์ (ยอดเฉลี่ยของวันนั้น / ยอดเฉลี่ยรวม) -> ยอดรายวัน horizon วันถัดไป
+    return dict ของ array (P,) / (P, 7) / (P, horizon)
+    """
+    np = _np()
+    n_products, n_days = matrix.shape
+    recent = matrix[:, -ma_days:] if n_days else np.zeros((n_products, 1))
+    moving_avg = recent.mean(axis=1)
+    sigma = recent.std(axis=1)
+
+    # level_T = sum α(1-α)^(T-1-t) x_t + (1-α)^T * level_0 ; level_0 = ค่าเฉลี่ยทั้งช่วง (ลด bias ช่วงเริ่ม)
+    mean_all = matrix.mean(axis=1) if n_days else np.zeros(n_products)
+    weights = alpha * (1 - alpha) ** np.arange(n_days - 1, -1, -1, dtype=np.float64)
+    level = matrix @ weights + (1 - alpha) ** n_days * mean_all
+
+    # ตัวคูณรายวันในสัปดาห์ (0 = จันทร์) ; ข้อมูลไม่ถึง 2 สัปดาห์ -> 1.0 ทั้งหมด
+    factors = np.ones((n_products, 7))
+    if n_days >= 14:
+        weekday = (start.weekday() + np.arange(n_days)) % 7
+        onehot = (weekday[:, None] == np.arange(7)[None, :]).astype(np.float64)
+        wd_mean = (matrix @ onehot) / onehot.sum(axis=0)
+        has_sales = mean_all > 0
+        factors[has_sales] = wd_mean[has_sales] / mean_all[has_sales, None]
+
+    next_weekdays = (start.weekday() + n_days + np.arange(horizon)) % 7
+    daily = level[:, None] * factors[:, next_weekdays]
+    return {
+        "moving_avg": moving_avg,
+        "sigma": sigma,
+        "level": level,
+        "factors": factors,
+        "daily": daily,
+    }
+
+
+def run_forecast(workspace_id: int, as_of: date | None = None) -> dict:
+    """
+    พยากรณ์ทั้งร้านจากยอดขายถึงเมื่อวาน (as_of - 1) แล้วเขียนทับ demand_forecast ของร้าน (ผู้เรียก commit)
+    suggested_reorder_point = level * lead_time + safety_stock
+    suggested_reorder_qty   = ceil(level * lead_time + ยอด horizon + safety_stock - available)  (>= 0)
+    """
+    np = _np()
+    as_of = as_of or utc_now().date()
+    end = as_of - timedelta(days=1)
+    start = end - timedelta(days=int(_cfg("FORECAST_HISTORY_DAYS")) - 1)
+    horizon = int(_cfg("FORECAST_HORIZON_DAYS"))
+    lead_time = int(_cfg("FORECAST_LEAD_TIME_DAYS"))
+    z = float(_cfg("FORECAST_SERVICE_Z"))
+
+    product_ids, matrix = load_daily_matrix(workspace_id, start, end)
+    db.session.execute(delete(DemandForecast).where(DemandForecast.workspace_id == workspace_id))
+    if not len(product_ids):
+        return {"products": 0, "to_reorder": 0}
+
+    fit = fit_forecasts(matrix, start, horizon, int(_cfg("FORECAST_MA_DAYS")), float(_cfg("FORECAST_SMOOTHING_ALPHA")))
+
+    available_map = dict(db.session.execute(
+        select(StockLevel.product_id, func.sum(StockLevel.on_hand - StockLevel.reserved))
+        .where(StockLevel.workspace_id == workspace_id)
+        .group_by(StockLevel.product_id)
+    ).all())
+    available = np.array([int(available_map.get(int(pid)) or 0) for pid in product_ids], dtype=np.float64)
+
+    safety = z * fit["sigma"] * math.sqrt(lead_time)
+    lead_demand = fit["level"] * lead_time
+    forecast_units = fit["daily"].sum(axis=1)
+    reorder_point = np.ceil(lead_demand + safety)
+    reorder_qty = np.ceil(np.maximum(lead_demand + forecast_units + safety - available, 0))
+
+    now = utc_now()
+    rows = [
+        {
+            "workspace_id": workspace_id,
+            "product_id": int(product_ids[i]),
+            "generated_at": now,
+            "history_from": start,
+            "history_to": end,
+            "moving_avg_daily": round(float(fit["moving_avg"][i]), 4),
+            "level_daily": round(float(fit["level"][i]), 4),
+            "weekday_factors": json.dumps([round(float(f), 3) for f in fit["factors"][i]]),
+            "forecast_daily": json.dumps([round(float(d), 2) for d in fit["daily"][i]]),
+            "horizon_days": horizon,
+            "forecast_units": round(float(forecast_units[i]), 2),
+            "safety_stock": round(float(safety[i]), 2),
+            "lead_time_days": lead_time,
+            "available": int(available[i]),
+            "suggested_reorder_point": int(reorder_point[i]),
+            "suggested_reorder_qty": int(reorder_qty[i]),
+        }
+        for i in range(len(product_ids))
+    ]
+    db.session.execute(insert(DemandForecast), rows)
+    return {"products": len(rows), "to_reorder": int((reorder_qty > 0).sum())}
+
+
+def forecast_all_workspaces(as_of: date | None = None, workspace_id: int | None = None) -> dict:
+    """รันพยากรณ์ทุกร้าน (commit ทีละร้าน ; ร้านหนึ่งพังไม่กระทบร้านอื่น)"""
+    return for_each_workspace(lambda wsid: run_forecast(wsid, as_of), "Demand forecast", workspace_id)
+
+
+def start_forecast_scheduler(app):
+    """FORECAST_INTERVAL_SECONDS > 0 -> รันพยากรณ์ทุกร้านเป็นระยะ (0 = ปิด -> ใช้ cron `flask demand-forecast` ตอนกลางคืน)"""
+    return start_periodic(app, "demand-forecast", "FORECAST_INTERVAL_SECONDS", forecast_all_workspaces)
@@ -0,0 +1,58 @@
+# services/jobs.py
+import threading
+from flask import current_app
+from models import db, Workspace
+from services.tenant import use_workspace
+
+
+def all_workspace_ids() -> list:
+    return [wid for (wid,) in db.session.query(Workspace.id).order_by(Workspace.id).all()]
+
+
+def for_each_workspace(fn, label: str, workspace_id: int | None = None, ws_ids=None) -> dict:
+    """
+    รัน fn(wsid) ทีละร้านภายใต้ use_workspace() + commit ทีละร้าน (ร้านที่พังไม่ลากร้านอื่น)
+    ร้าน: workspace_id (ร้านเดียว) > ws_ids (ผู้เรียกเลือกมาแล้ว) > ทุกร้าน
+    return {wsid: ผลของ fn | {"error": ...}} ; fn คืน None = ไม่มีอะไรต้องรายงาน (ไม่ใส่ใน results)
+    """
+    if workspace_id:
+        ws_ids = [workspace_id]
+    elif ws_ids is None:
+        ws_ids = all_workspace_ids()
+    results = {}
+    for wsid in ws_ids:
+        with use_workspace(wsid):
+            try:
+                r = fn(wsid)
+                db.session.commit()
+                if r is not None:
+                    results[wsid] = r
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.exception(f"❌ {label} failed for workspace {wsid}")
+                results[wsid] = {"error": str(e)}
+    return results
+
+
+def start_periodic(app, name: str, interval_key: str, fn):
+    """
+    ตัวตั้งเวลาในโปรเซส: app.config[interval_key] > 0 -> เรียก fn() ใน app context ทุก interval วินาทีใน daemon thread
+    0 = ปิด (return None) ; Event สำหรับสั่งหยุดเก็บไว้ที่ app.extensions[name]
+    """
+    interval = int(app.config.get(interval_key) or 0)
+    if interval <= 0:
+        return None
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    fn()
+                finally:
+                    db.session.remove()
+
+    t = threading.Thread(target=_loop, name=name, daemon=True)
+    t.start()
+    app.extensions[name] = stop
+    return t
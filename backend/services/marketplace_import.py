@@ -0,0 +1,324 @@
+# services/marketplace_import.py
+import re
+from datetime import datetime, timezone
+from itertools import islice
+from sqlalchemy.exc import IntegrityError
+from models import db, Product, ProductVariant, Sale
+from services.fefo import load_candidate_batches, allocate_order_from_pool, run_with_fefo_retry
+from services.sales import build_sale, persist_sales
+
+
+# ชื่อคอลัมน์ในไฟล์ export ของแต่ละ platform (ใส่ได้หลายชื่อ: ไฟล์ภาษาไทย/อังกฤษ) -> ใช้ชื่อแรกที่เจอใน header
+# ปรับ/เพิ่มได้ผ่าน config MARKETPLACE_COLUMN_MAP = {"shopee": {"sku": ["..."]}, ...}
+PLATFORM_COLUMNS = {
+    "shopee": {
+        "order_id":          ["Order ID", "หมายเลขคำสั่งซื้อ"],
+        "status":            ["Order Status", "สถานะการสั่งซื้อ"],
+        "created_at":        ["Order Creation Date", "วันที่ทำการสั่งซื้อ"],
+        "sku":               ["SKU Reference No.", "เลขอ้างอิง SKU (SKU Reference No.)"],
+        "quantity":          ["Quantity", "จำนวน"],
+        "unit_price":        ["Deal Price", "ราคาขาย"],
+        "shipping_fee":      ["Buyer Paid Shipping Fee", "ค่าจัดส่งที่ชำระโดยผู้ซื้อ"],
+        "shop_discount":     ["Seller Voucher", "โค้ดส่วนลดชำระโดยผู้ขาย"],
+        "platform_discount": ["Shopee Voucher", "โค้ดส่วนลดชำระโดย Shopee"],
+        "coin_discount":     ["Coins Offset", "ส่วนลดจาก Shopee Coins"],
+        "customer_name":     ["Receiver Name", "ชื่อผู้รับ"],
+        "province":          ["Province", "จังหวัด"],
+    },
+    # Lazada export = 1 แถวต่อ 1 ชิ้น (ไม่มีคอลัมน์จำนวน) ส่วนลด/ค่าส่งอยู่ระดับชิ้น
+    "lazada": {
+        "order_id":          ["orderNumber", "Order Number"],
+        "status":            ["status", "Status"],
+        "created_at":        ["createTime", "Created at"],
+        "sku":               ["sellerSku", "Seller SKU"],
+        "quantity":          [],
+        "unit_price":        ["unitPrice", "Unit Price"],
+        "shipping_fee":      ["shippingFee", "Shipping Fee"],
+        "shop_discount":     ["sellerDiscountTotal", "Seller Discount Total"],
+        "platform_discount": [],
+        "coin_discount":     [],
+        "customer_name":     ["customerName", "Customer Name"],
+        "province":          ["shippingRegion", "billingAddr3"],
+    },
+    # TikTok: ส่วนลดอยู่ระดับ SKU, ค่าส่งอยู่ระดับออเดอร์ (ซ้ำทุกแถว)
+    "tiktok": {
+        "order_id":          ["Order ID"],
+        "status":            ["Order Status"],
+        "created_at":        ["Created Time"],
+        "sku":               ["Seller SKU"],
+        "quantity":          ["Quantity"],
+        "unit_price":        ["SKU Unit Original Price"],
+        "shipping_fee":      ["Shipping Fee After Discount"],
+        "shop_discount":     ["SKU Seller Discount"],
+        "platform_discount": ["SKU Platform Discount"],
+        "coin_discount":     [],
+        "customer_name":     ["Recipient"],
+        "province":          ["Province"],
+    },
+}
+
+# ฟิลด์เงินระดับบิลที่ต้อง "รวมทุกแถว" (ที่เหลือใช้ค่าจากแถวแรกของออเดอร์)
+SUM_FIELDS = {
+    "shopee": set(),
+    "lazada": {"shipping_fee", "shop_discount"},
+    "tiktok": {"shop_discount", "platform_discount"},
+}
+
+_MONEY_FIELDS = ("shipping_fee", "shop_discount", "platform_discount", "coin_discount")
+
+_DATETIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%m/%d/%Y %I:%M:%S %p",
+    "%d %b %Y %H:%M", "%d %b %Y %H:%M:%S", "%Y-%m-%d",
+)
+
+
+def resolve_columns(platform: str, header, overrides: dict | None = None) -> dict:
+    """header ของไฟล์ -> {field: ชื่อคอลัมน์ที่ใช้จริง}; ไม่เจอคอลัมน์จำเป็น -> ValueError"""
+    candidates = dict(PLATFORM_COLUMNS[platform])
+    for field, names in ((overrides or {}).get(platform) or {}).items():
+        candidates[field] = [names] if isinstance(names, str) else list(names)
+
+    present = set(header or [])
+    cols = {}
+    for field, names in candidates.items():
+        cols[field] = next((n for n in names if n in present), None)
+
+    missing = [f for f in ("order_id", "sku", "unit_price") if not cols.get(f)]
+    if missing:
+        raise ValueError(f"Missing column for {', '.join(missing)} in {platform} export")
+    return cols
+
+
+def _money(v) -> float:
+    if v in (None, ""):
+        return 0.0
+    s = re.sub(r"[^\d.\-]", "", str(v))
+    return float(s) if s not in ("", "-", ".") else 0.0
+
+
+def _is_cancelled(status) -> bool:
+    s = (status or "").strip().lower()
+    return "cancel" in s or "ยกเลิก" in s
+
+
+def parse_order_datetime(s) -> datetime | None:
+    if not s:
+        return None
+    s = str(s).strip()
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    for fmt in _DATETIME_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported date format: {s}")
+
+
+def group_orders(rows, platform: str, cols: dict) -> dict:
+    """
+    รวมแถวของไฟล์เป็นออเดอร์ (ไฟล์ export ไม่รับประกันว่าแถวของออเดอร์เดียวกันอยู่ติดกัน)
+    return {order_id: {"rows": [(line_no, row), ...]}} ตามลำดับที่เจอในไฟล์
+    """
+    orders = {}
+    for line_no, row in rows:
+        if isinstance(row, Exception):
+            orders.setdefault(f"#line{line_no}", {"rows": [], "error": f"line {line_no}: {row}"})
+            continue
+        order_id = (row.get(cols["order_id"]) or "").strip()
+        if not order_id:
+            continue
+        orders.setdefault(order_id, {"rows": []})["rows"].append((line_no, row))
+    return orders
+
+
+class MarketplaceOrderImporter:
+    """
+    นำเข้าออเดอร์จากไฟล์ export ของ marketplace
+    - idempotent ด้วย (workspace, channel, external_order_id): ออเดอร์ที่เคย import แล้วจะถูกข้าม
+    - 1 chunk = เช็คออเดอร์ซ้ำ 1 query + resolve SKU 1 query + โหลดล็อต FEFO 1 query + persist ทั้ง chunk
+    - commit ทีละ chunk (ไฟล์ใหญ่ import ต่อได้ถ้าหลุดกลางทาง: chunk ที่ commit แล้วจะถูกข้าม)
+    - ออเดอร์ที่ยกเลิก / SKU ไม่เจอ / สต็อกไม่พอ จะถูกข้ามและรายงานกลับ (ออเดอร์อื่นยังเข้าได้)
+    """
+
+    def __init__(self, platform: str, channel, workspace_id: int, warehouse_id: int, cols: dict,
+                 default_sale_date: datetime | None = None):
+        self.platform = platform
+        self.channel = channel
+        self.workspace_id = workspace_id
+        self.warehouse_id = warehouse_id
+        self.cols = cols
+        self.default_sale_date = default_sale_date or datetime.now(timezone.utc)
+        self._variants = {}   # full sku -> (product_id, variant_id, sale_mode, pack_size)
+
+        tier = channel.platform_tier
+        self.commission_pct = float(tier.commission_percent or 0.0)
+        self.transaction_pct = float(tier.transaction_percent or 0.0)
+
+    # ---------- helpers ----------
+    def _get(self, row, field):
+        col = self.cols.get(field)
+        return row.get(col) if col else None
+
+    def _load_variants(self, skus):
+        todo = [s for s in skus if s not in self._variants]
+        if not todo:
+            return
+        full_sku = Product.sku + ProductVariant.sku_suffix
+        q = (
+            db.session.query(full_sku, Product.id, ProductVariant.id,
+                             ProductVariant.sale_mode, ProductVariant.pack_size)
+            .join(ProductVariant, ProductVariant.product_id == Product.id)
+            .filter(Product.workspace_id == self.workspace_id, full_sku.in_(todo))
+        )
+        for sku, pid, vid, mode, pack in q.all():
+            self._variants[sku] = (pid, vid, mode, int(pack or 0))
+
+    def _build_order(self, order_id, rows):
+        """แถวของ 1 ออเดอร์ -> (header, lines); SKU ไม่เจอ/ข้อมูลผิด -> ValueError"""
+        first = rows[0][1]
+        sum_fields = SUM_FIELDS.get(self.platform, set())
+
+        money = {}
+        for f in _MONEY_FIELDS:
+            if f in sum_fields:
+                money[f] = sum(_money(self._get(r, f)) for _, r in rows)
+            else:
+                money[f] = _money(self._get(first, f))
+
+        # SKU+ราคาเดียวกันหลายแถว (เช่น Lazada 1 แถว/ชิ้น) -> รวมเป็นบรรทัดเดียว
+        merged = {}
+        for line_no, r in rows:
+            sku = (self._get(r, "sku") or "").strip()
+            v = self._variants.get(sku)
+            if not v:
+                raise ValueError(f"line {line_no}: SKU '{sku}' not found")
+            pid, vid, mode, pack = v
+            if pack <= 0:
+                raise ValueError(f"line {line_no}: variant.pack_size invalid for SKU '{sku}'")
+            qty_raw = self._get(r, "quantity")
+            qty = int(_money(qty_raw)) if qty_raw not in (None, "") else 1
+            if qty <= 0:
+                raise ValueError(f"line {line_no}: quantity must be > 0")
+            price = _money(self._get(r, "unit_price"))
+
+            key = (vid, price)
+            if key in merged:
+                merged[key]["quantity_pack"] += qty
+            else:
+                merged[key] = {
+                    "product_id": pid, "variant_id": vid, "sale_mode": mode or "variant",
+                    "pack_size": pack, "quantity_pack": qty, "unit_price": price,
+                }
+
+        header = dict(
+            workspace_id=self.workspace_id,
+            warehouse_id=self.warehouse_id,
+            channel_id=self.channel.id,
+            sale_date=parse_order_datetime(self._get(first, "created_at")) or self.default_sale_date,
+            customer_name=(self._get(first, "customer_name") or None),
+            province=(self._get(first, "province") or None),
+            channel_name_at_sale=self.channel.channel_name,
+            commission_percent_at_sale=self.commission_pct,
+            transaction_percent_at_sale=self.transaction_pct,
+            external_order_id=order_id,
+            source_platform=self.platform,
+            **money,
+        )
+        return header, list(merged.values())
+
+    # ---------- main ----------
+    def run(self, orders: dict, chunk_size: int = 500) -> dict:
+        summary = {
+            "orders_total": len(orders),
+            "orders_created": 0,
+            "orders_duplicate": 0,
+            "orders_cancelled": 0,
+            "orders_failed": 0,
+            "total_sold_base_qty": 0,
+            "errors": [],
+        }
+
+        it = iter(orders.items())
+        while True:
+            chunk = list(islice(it, chunk_size))
+            if not chunk:
+                break
+            self._run_chunk(chunk, summary)
+            db.session.commit()
+        return summary
+
+    def _fail(self, summary, order_id, msg):
+        summary["orders_failed"] += 1
+        summary["errors"].append({"order_id": order_id, "error": msg})
+
+    def _run_chunk(self, chunk, summary):
+        # 1) ออเดอร์ที่เคย import แล้ว (query เดียวทั้ง chunk)
+        ids = [oid for oid, o in chunk if "error" not in o]
+        existing = {
+            r[0] for r in db.session.query(Sale.external_order_id).filter(
+                Sale.workspace_id == self.workspace_id,
+                Sale.channel_id == self.channel.id,
+                Sale.external_order_id.in_(ids),
+            ).all()
+        } if ids else set()
+
+        # 2) resolve SKU ทั้ง chunk ใน query เดียว
+        pending = []
+        for oid, o in chunk:
+            if "error" in o:
+                self._fail(summary, None, o["error"])
+            elif oid in existing:
+                summary["orders_duplicate"] += 1
+            elif _is_cancelled(self._get(o["rows"][0][1], "status")):
+                summary["orders_cancelled"] += 1
+            else:
+                pending.append((oid, o["rows"]))
+        self._load_variants({(self._get(r, "sku") or "").strip() for _, rows in pending for _, r in rows})
+
+        built = []
+        for oid, rows in pending:
+            try:
+                built.append((oid, *self._build_order(oid, rows)))
+            except ValueError as e:
+                self._fail(summary, oid, str(e))
+        if not built:
+            return
+
+        def _persist():
+            # 3) FEFO ทั้ง chunk จาก pool เดียว (ล็อตไม่พอ -> ข้ามเฉพาะออเดอร์นั้น)
+            pool = load_candidate_batches(
+                {ln["product_id"] for _, _, lines in built for ln in lines},
+                self.workspace_id, self.warehouse_id,
+            )
+            sales, failed = [], []
+            for oid, header, lines in built:
+                try:
+                    plans = allocate_order_from_pool(
+                        pool, [(ln["product_id"], ln["pack_size"] * ln["quantity_pack"]) for ln in lines]
+                    )
+                except ValueError as e:
+                    failed.append((oid, str(e)))
+                    continue
+                sales.append(build_sale(header, lines, plans))
+
+            # 4) ตัดล็อต + insert ทั้ง chunk — ชนกับบิลอื่นกลางทาง savepoint rollback แล้ว re-plan ใหม่
+            with db.session.begin_nested():
+                persist_sales(sales)
+            return sales, failed
+
+        try:
+            sales, failed = run_with_fefo_retry(_persist)
+        except IntegrityError:
+            # มีอีก request import ออเดอร์เดียวกันตัดหน้า -> ข้ามทั้ง chunk นี้ (รันไฟล์ซ้ำได้อย่างปลอดภัย)
+            for oid, _, _ in built:
+                self._fail(summary, oid, "Order is being imported concurrently, re-run the import")
+            return
+
+        for oid, msg in failed:
+            self._fail(summary, oid, msg)
+        summary["orders_created"] += len(sales)
+        summary["total_sold_base_qty"] += sum(int(si.base_units) for s in sales for si in s.items)
@@ -0,0 +1,82 @@
+# services/pagination.py
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+MAX_LIMIT = 100
+
+
+def encode_cursor(values) -> str:
+    """ค่า key ของแถวสุดท้ายในหน้า -> string ทึบ (base64url ของ JSON) ให้ FE ส่งกลับมาเป็น ?cursor="""
+    packed = []
+    for v in values:
+        if isinstance(v, datetime):
+            packed.append({"dt": v.isoformat()})
+        elif isinstance(v, date):
+            packed.append({"d": v.isoformat()})
+        else:
+            packed.append(v)
+    raw = json.dumps(packed, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """string จาก encode_cursor -> list ของค่า key; cursor เพี้ยน -> ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        packed = json.loads(raw)
+        if not isinstance(packed, list):
+            raise ValueError
+        values = []
+        for v in packed:
+            if isinstance(v, dict) and "dt" in v:
+                values.append(datetime.fromisoformat(v["dt"]))
+            elif isinstance(v, dict) and "d" in v:
+                values.append(date.fromisoformat(v["d"]))
+            else:
+                values.append(v)
+        return values
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_limit(args, default: int = 10) -> int:
+    limit = int(args.get("limit", default))
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def keyset_page(query, keys, cursor: str | None, limit: int, key_of=None):
+    """
+    แบ่งหน้าแบบ keyset (เรียงจากใหม่ไปเก่า) แทน OFFSET
+    - keys   = คอลัมน์ที่ใช้เรียง เช่น (Sale.sale_date, Sale.id) — ตัวท้ายต้อง unique
+    - cursor = ค่าจาก next_cursor ของหน้าก่อน (None/"" = หน้าแรก)
+    - key_of = row -> tuple ค่า key (default: getattr ตามชื่อคอลัมน์)
+    return (rows, next_cursor) ; next_cursor = None เมื่อเป็นหน้าสุดท้าย
+    WHERE (k1 < :v1) OR (k1 = :v1 AND k2 < :v2) ... ใช้ index (k1, k2) ได้ตรงๆ ทุกหน้าเท่ากัน
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError("Invalid cursor")
+        conds = []
+        for i, col in enumerate(keys):
+            eqs = [keys[j] == values[j] for j in range(i)]
+            conds.append(and_(*eqs, col < values[i]))
+        query = query.filter(or_(*conds))
+
+    rows = query.order_by(*[k.desc() for k in keys]).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        key_of = key_of or (lambda r: tuple(getattr(r, k.key) for k in keys))
+        next_cursor = encode_cursor(key_of(last))
+    return rows, next_cursor
+
+
+def wants_total(args) -> bool:
+    # นับ total เฉพาะเมื่อ FE ขอ (?with_total=1) — ไม่ต้อง COUNT ทุกหน้า
+    return args.get("with_total") in ("1", "true", "True")
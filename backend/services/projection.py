@@ -0,0 +1,69 @@
+# services/projection.py
+import json
+from sqlalchemy import case, func, literal, select, union_all
+from models import db, ProductImage, ProductVariant
+
+
+def row_serializer(*columns):
+    """
+    สร้างตัวแปลง Row -> dict ครั้งเดียวต่อชุดคอลัมน์ (ชื่อ key = column.key) แล้วใช้ซ้ำทุกแถว
+    แทนการโหลด ORM object ทั้งก้อนแล้ว getattr ทีละฟิลด์
+    """
+    keys = tuple(c.key for c in columns)
+
+    def serialize(row) -> dict:
+        return dict(zip(keys, row))
+
+    return serialize
+
+
+def json_bool(col):
+    # json_object ของ SQLite เก็บ Boolean เป็น 0/1 -> แปลงเป็น true/false/null ของ JSON ตั้งแต่ใน SQL
+    return func.json(case((col.is_(None), "null"), (col, "true"), else_="false"))
+
+
+def _grouped(kind: str, product_col, id_col, obj, product_ids):
+    # เรียงก่อนใน derived table (SQLite ยังไม่มี ORDER BY ใน aggregate) แล้ว json_group_array ต่อสินค้า
+    ordered = (
+        select(product_col.label("product_id"), obj.label("j"))
+        .where(product_col.in_(product_ids))
+        .order_by(product_col, id_col)
+        .subquery()
+    )
+    return (
+        select(ordered.c.product_id, literal(kind).label("kind"), func.json_group_array(func.json(ordered.c.j)))
+        .group_by(ordered.c.product_id)
+    )
+
+
+def variants_and_images(product_ids) -> tuple[dict, dict]:
+    """
+    variants + images ของสินค้าในหน้าเดียวใน query เดียว (GROUP BY product_id ทั้งสองฝั่งแล้ว UNION ALL)
+    return ({product_id: [variant, ...]}, {product_id: [{filename, is_main}, ...]})
+    """
+    ids = list({int(i) for i in product_ids})
+    if not ids:
+        return {}, {}
+
+    variant_obj = func.json_object(
+        "id", ProductVariant.id,
+        "sku_suffix", ProductVariant.sku_suffix,
+        "sale_mode", ProductVariant.sale_mode,
+        "pack_size", ProductVariant.pack_size,
+        "selling_price", ProductVariant.selling_price,
+        "is_active", json_bool(ProductVariant.is_active),
+    )
+    image_obj = func.json_object(
+        "filename", ProductImage.image_filename,
+        "is_main", json_bool(ProductImage.is_main),
+    )
+    stmt = union_all(
+        _grouped("v", ProductVariant.product_id, ProductVariant.id, variant_obj, ids),
+        _grouped("i", ProductImage.product_id, ProductImage.id, image_obj, ids),
+    )
+    rows = db.session.execute(stmt, bind_arguments={"mapper": ProductVariant}).all()
+
+    variants, images = {}, {}
+    for pid, kind, items in rows:
+        (variants if kind == "v" else images)[pid] = json.loads(items)
+    return variants, images
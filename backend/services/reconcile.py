@@ -0,0 +1,185 @@
+# services/reconcile.py
+from sqlalchemy import and_, case, func, insert, literal, or_, select, union_all
+from models import db, LedgerReconcileState, SaleItemBatch, StockBatch, StockLevel, StockMovement
+from models._base import utc_now
+from services.jobs import for_each_workspace
+from services.stock_level import apply_stock_deltas
+
+
+def _state(workspace_id: int) -> LedgerReconcileState:
+    st = db.session.query(LedgerReconcileState).filter_by(workspace_id=workspace_id).first()
+    if st is None:
+        st = LedgerReconcileState(workspace_id=workspace_id, last_movement_id=0, last_mismatches=0)
+        db.session.add(st)
+    return st
+
+
+def _max_movement_id(workspace_id: int) -> int:
+    return int(db.session.execute(
+        select(func.max(StockMovement.id)).where(StockMovement.workspace_id == workspace_id)
+    ).scalar() or 0)
+
+
+def batch_mismatches(workspace_id: int, since_movement_id: int | None = None) -> list:
+    """
+    กระทบยอดต่อล็อตใน SELECT เดียว (GROUP BY ฝั่ง movement / sale_item_batch แล้ว LEFT JOIN กับ stock_batch):
+      qty_remaining == SUM(movement.qty)                         (ทุกประเภท)
+      qty_received  == SUM(movement.qty) ที่เป็น IN               (รับเข้า + โอนเข้า ; ล็อตรับเข้าจริงไม่นับของที่โอนกลับเข้ามา)
+      SUM(sale_item_batch.qty) == -SUM(movement.qty) OUT ของบิลขาย (ยอดตัดขายตรงกับ allocation)
+    since_movement_id -> ตรวจเฉพาะล็อตที่มี movement id > ค่านี้ (แต่รวมยอดจาก movement ทั้งหมดของล็อตนั้น)
+    """
+    m = StockMovement
+    mv_where = [m.workspace_id == workspace_id, m.batch_id.is_not(None)]
+    batch_where = [StockBatch.workspace_id == workspace_id]
+    if since_movement_id:
+        touched = select(m.batch_id).where(*mv_where, m.id > since_movement_id).distinct()
+        mv_where.append(m.batch_id.in_(touched))
+        batch_where.append(StockBatch.id.in_(touched))
+
+    mv = (
+        select(
+            m.batch_id.label("batch_id"),
+            func.sum(m.qty).label("net"),
+            func.sum(case((m.movement_type == "IN", m.qty), else_=0)).label("inbound"),
+            func.sum(case((and_(m.movement_type == "IN", m.ref_transfer_id.is_not(None)), m.qty), else_=0)).label("transfer_in"),
+            func.sum(case((and_(m.movement_type == "OUT", m.ref_sale_id.is_not(None)), -m.qty), else_=0)).label("sold"),
+        )
+        .where(*mv_where)
+        .group_by(m.batch_id)
+        .subquery()
+    )
+    sib = (
+        select(SaleItemBatch.batch_id.label("batch_id"), func.sum(SaleItemBatch.qty).label("allocated"))
+        .where(SaleItemBatch.workspace_id == workspace_id)
+        .group_by(SaleItemBatch.batch_id)
+        .subquery()
+    )
+    net = func.coalesce(mv.c.net, 0)
+    inbound = func.coalesce(mv.c.inbound, 0) - case(
+        (StockBatch.origin_batch_id.is_(None), func.coalesce(mv.c.transfer_in, 0)), else_=0
+    )
+    sold = func.coalesce(mv.c.sold, 0)
+    allocated = func.coalesce(sib.c.allocated, 0)
+
+    rows = db.session.execute(
+        select(
+            StockBatch.id, StockBatch.product_id, StockBatch.warehouse_id, StockBatch.lot_number,
+            StockBatch.qty_received, StockBatch.qty_remaining, net, inbound, sold, allocated,
+        )
+        .outerjoin(mv, mv.c.batch_id == StockBatch.id)
+        .outerjoin(sib, sib.c.batch_id == StockBatch.id)
+        .where(*batch_where)
+        .where(or_(StockBatch.qty_remaining != net, StockBatch.qty_received != inbound, allocated != sold))
+        .order_by(StockBatch.id)
+    ).all()
+    return [{
+        "batch_id": bid, "product_id": pid, "warehouse_id": wh, "lot_number": lot,
+        "qty_received": int(rcv), "qty_remaining": int(rem),
+        "movement_net": int(n), "movement_in": int(i), "movement_sold": int(s), "allocated": int(a),
+        "remaining_drift": int(rem) - int(n),
+        "received_drift": int(rcv) - int(i),
+        "allocation_drift": int(a) - int(s),
+    } for bid, pid, wh, lot, rcv, rem, n, i, s, a in rows]
+
+
+def level_mismatches(workspace_id: int, product_ids=None) -> list:
+    """stock_level (on_hand / reserved) เทียบผลรวมจาก stock_batch ต่อ (warehouse, product) — UNION ALL + GROUP BY ... HAVING"""
+    lv_where = [StockLevel.workspace_id == workspace_id]
+    b_where = [StockBatch.workspace_id == workspace_id]
+    if product_ids is not None:
+        lv_where.append(StockLevel.product_id.in_(product_ids))
+        b_where.append(StockBatch.product_id.in_(product_ids))
+
+    parts = union_all(
+        select(StockLevel.warehouse_id.label("warehouse_id"), StockLevel.product_id.label("product_id"),
+               StockLevel.on_hand.label("on_hand"), StockLevel.reserved.label("reserved"),
+               literal(0).label("batch_qty"), literal(0).label("batch_reserved"))
+        .where(*lv_where),
+        select(StockBatch.warehouse_id, StockBatch.product_id, literal(0), literal(0),
+               StockBatch.qty_remaining, StockBatch.qty_reserved)
+        .where(*b_where),
+    ).subquery()
+    on_hand, reserved = func.sum(parts.c.on_hand), func.sum(parts.c.reserved)
+    batch_qty, batch_reserved = func.sum(parts.c.batch_qty), func.sum(parts.c.batch_reserved)
+
+    rows = db.session.execute(
+        select(parts.c.warehouse_id, parts.c.product_id, on_hand, reserved, batch_qty, batch_reserved)
+        .group_by(parts.c.warehouse_id, parts.c.product_id)
+        .having(or_(on_hand != batch_qty, reserved != batch_reserved))
+        .order_by(parts.c.product_id, parts.c.warehouse_id)
+    ).all()
+    return [{
+        "warehouse_id": wh, "product_id": pid,
+        "on_hand": int(oh), "reserved": int(rs), "batch_qty": int(bq), "batch_reserved": int(br),
+    } for wh, pid, oh, rs, bq, br in rows]
+
+
+def reconcile_ledger(workspace_id: int, full: bool = False, repair: bool = False) -> dict:
+    """
+    ตรวจ (และซ่อมถ้า repair=True) ความสอดคล้องของ stock_batch / stock_movement / sale_item_batch / stock_level (ผู้เรียก commit)
+    - incremental (default): เฉพาะล็อต/สินค้าที่มี movement ใหม่กว่า high-water mark ของร้าน
+      (การลบ movement ไม่ทำให้ id ขยับ -> ควรรัน full เป็นระยะด้วย)
+    - repair: qty_remaining ไม่ตรง -> เติม movement ADJUST ให้ ledger ตาม batch (ยอดที่ FEFO ใช้จริง)
+              stock_level ไม่ตรง -> ปรับตามผลรวมของ batch
+              qty_received / allocation ไม่ตรง -> รายงานอย่างเดียว (แก้ประวัติอัตโนมัติไม่ได้)
+    high-water mark ขยับเมื่อไม่เหลือรายการค้าง ; ยังค้าง -> รอบถัดไปตรวจช่วงเดิมซ้ำ
+    """
+    st = _state(workspace_id)
+    since = None if full else int(st.last_movement_id or 0)
+    upto = _max_movement_id(workspace_id)
+
+    batches = batch_mismatches(workspace_id, since)
+    product_ids = None
+    if since is not None:
+        product_ids = select(StockMovement.product_id).where(
+            StockMovement.workspace_id == workspace_id, StockMovement.id > since,
+        ).distinct()
+    levels = level_mismatches(workspace_id, product_ids)
+
+    repaired = {"adjust_movements": 0, "levels": 0}
+    if repair:
+        adjust = [b for b in batches if b["remaining_drift"]]
+        if adjust:
+            now = utc_now()
+            db.session.execute(insert(StockMovement), [{
+                "product_id": b["product_id"], "batch_id": b["batch_id"], "movement_type": "ADJUST",
+                "qty": b["remaining_drift"], "batch_qty_remaining": b["qty_remaining"],
+                "note": "Ledger reconcile", "created_at": now,
+                "workspace_id": workspace_id, "warehouse_id": b["warehouse_id"],
+            } for b in adjust])
+            repaired["adjust_movements"] = len(adjust)
+        if levels:
+            apply_stock_deltas(
+                {(workspace_id, l["warehouse_id"], l["product_id"]): l["batch_qty"] - l["on_hand"] for l in levels},
+                reserved={(workspace_id, l["warehouse_id"], l["product_id"]): l["batch_reserved"] - l["reserved"]
+                          for l in levels},
+            )
+            repaired["levels"] = len(levels)
+
+    unresolved = sum(
+        1 for b in batches
+        if b["received_drift"] or b["allocation_drift"] or (b["remaining_drift"] and not repair)
+    ) + (0 if repair else len(levels))
+
+    now = utc_now()
+    st.last_run_at = now
+    st.last_mismatches = unresolved
+    if full:
+        st.last_full_at = now
+    if not unresolved:
+        st.last_movement_id = _max_movement_id(workspace_id) if repair else upto
+
+    return {
+        "mode": "full" if full else "incremental",
+        "from_movement_id": since or 0,
+        "to_movement_id": upto,
+        "batch_mismatches": batches,
+        "level_mismatches": levels,
+        "repaired": repaired,
+        "unresolved": unresolved,
+    }
+
+
+def reconcile_all_workspaces(full: bool = False, repair: bool = False, workspace_id: int | None = None) -> dict:
+    """กระทบยอดทุกร้าน (commit ทีละร้าน)"""
+    return for_each_workspace(lambda wsid: reconcile_ledger(wsid, full, repair), "Ledger reconcile", workspace_id)
@@ -0,0 +1,129 @@
+# services/reorder.py
+from datetime import date
+from flask import current_app, has_app_context
+from sqlalchemy import func, select
+from models import db, Product, ProductVelocity, StockAlert, StockLevel
+from models._base import utc_now
+
+DEFAULT_ALPHA = 0.2   # น้ำหนักวันล่าสุด (~ค่าเฉลี่ย 9 วัน)
+
+
+def _alpha() -> float:
+    if has_app_context():
+        return float(current_app.config.get("REORDER_VELOCITY_ALPHA", DEFAULT_ALPHA))
+    return DEFAULT_ALPHA
+
+
+def _roll(v: ProductVelocity, day: date, units: int, alpha: float):
+    # O(1): วันเดิม -> สะสม ; วันใหม่ -> ปิดวันเดิมเข้า EWMA + decay วันที่ไม่มีขาย แล้วเริ่มนับวันใหม่
+    if v.last_day is None:
+        v.last_day, v.day_units = day, max(0, units)
+        return
+    if day < v.last_day:
+        # ยอดย้อนหลัง (import ช้า / ลบบิลเก่า): EWMA ย้อนแก้ไม่ได้ -> บวกเข้าวันปัจจุบันเฉพาะยอดขาย
+        if units > 0:
+            v.day_units += units
+        return
+    if day == v.last_day:
+        v.day_units = max(0, v.day_units + units)
+        return
+    gap = (day - v.last_day).days
+    ewma = alpha * v.day_units + (1 - alpha) * float(v.ewma_daily or 0.0)
+    v.ewma_daily = ewma * (1 - alpha) ** (gap - 1)
+    v.last_day, v.day_units = day, max(0, units)
+
+
+def velocity_estimate(v: ProductVelocity | None, today: date | None = None) -> float:
+    """อัตราขายต่อวัน ณ วันนี้ (รวมยอดวันล่าสุด + decay วันที่ไม่มีขาย) — อ่านอย่างเดียว ไม่เขียน DB"""
+    if v is None or v.last_day is None:
+        return 0.0
+    alpha = _alpha()
+    est = alpha * v.day_units + (1 - alpha) * float(v.ewma_daily or 0.0)
+    gap = ((today or date.today()) - v.last_day).days
+    if gap > 1:
+        est *= (1 - alpha) ** (gap - 1)
+    return est
+
+
+def record_sales_velocity(units: dict):
+    """
+    units = {(workspace_id, product_id, day): base_units (+ขาย / -ลบบิล)}
+    โหลดแถว velocity ของสินค้าที่เกี่ยวข้องใน query เดียว แล้ว roll ทีละวัน (เรียกใน transaction เดียวกับการตัดสต็อก)
+    """
+    units = {k: int(u) for k, u in units.items() if int(u) != 0}
+    if not units:
+        return
+    by_ws = {}
+    for ws, pid, _ in units:
+        by_ws.setdefault(ws, set()).add(pid)
+
+    alpha = _alpha()
+    for ws, pids in by_ws.items():
+        rows = {
+            v.product_id: v for v in db.session.query(ProductVelocity)
+            .filter(ProductVelocity.workspace_id == ws, ProductVelocity.product_id.in_(pids))
+        }
+        for (kws, pid, day), u in sorted(units.items(), key=lambda kv: kv[0][2]):
+            if kws != ws:
+                continue
+            v = rows.get(pid)
+            if v is None:
+                if u <= 0:
+                    continue
+                v = rows[pid] = ProductVelocity(workspace_id=ws, product_id=pid, ewma_daily=0.0, day_units=0)
+                db.session.add(v)
+            _roll(v, day, u, alpha)
+
+
+def check_reorder_points(keys):
+    """
+    keys = {(workspace_id, product_id), ...} ที่ยอดเพิ่งเปลี่ยน (เรียกจาก apply_stock_deltas)
+    เฉพาะสินค้าที่ตั้ง reorder_point: ยอดพร้อมขาย (on_hand - reserved ทุกคลัง) <= จุดสั่งซื้อ -> เปิด alert ;
+    กลับขึ้นเหนือจุดสั่งซื้อ -> ปิด alert ที่เปิดอยู่ ; งานต่อครั้ง = จำนวนสินค้าที่เปลี่ยน ไม่ใช่ประวัติ
+    """
+    by_ws = {}
+    for ws, pid in keys:
+        by_ws.setdefault(int(ws), set()).add(int(pid))
+
+    today = date.today()
+    for ws, pids in by_ws.items():
+        points = dict(db.session.execute(
+            select(Product.id, Product.reorder_point)
+            .where(Product.workspace_id == ws, Product.id.in_(pids), Product.reorder_point.is_not(None))
+        ).all())
+        open_alerts = {
+            a.product_id: a for a in db.session.query(StockAlert)
+            .filter(StockAlert.workspace_id == ws, StockAlert.product_id.in_(pids),
+                    StockAlert.alert_type == "LOW_STOCK", StockAlert.status == "OPEN")
+        }
+        if not points and not open_alerts:
+            continue
+
+        available = dict(db.session.execute(
+            select(StockLevel.product_id, func.sum(StockLevel.on_hand - StockLevel.reserved))
+            .where(StockLevel.workspace_id == ws, StockLevel.product_id.in_(pids))
+            .group_by(StockLevel.product_id)
+        ).all())
+        low = [pid for pid, rp in points.items() if int(available.get(pid) or 0) <= int(rp)]
+        velocities = {
+            v.product_id: v for v in db.session.query(ProductVelocity)
+            .filter(ProductVelocity.workspace_id == ws, ProductVelocity.product_id.in_(low))
+        } if low else {}
+
+        now = utc_now()
+        for pid in pids:
+            alert = open_alerts.get(pid)
+            if pid in low:
+                if alert is None:
+                    avail = int(available.get(pid) or 0)
+                    vel = velocity_estimate(velocities.get(pid), today)
+                    db.session.add(StockAlert(
+                        workspace_id=ws, product_id=pid, alert_type="LOW_STOCK", status="OPEN",
+                        reorder_point=int(points[pid]), available=avail,
+                        velocity_daily=round(vel, 4) if vel else None,
+                        days_of_cover=round(max(avail, 0) / vel, 2) if vel else None,
+                    ))
+            elif alert is not None:
+                # เติมของกลับเหนือจุดสั่งซื้อ / ยกเลิก reorder_point -> ปิด
+                alert.status = "RESOLVED"
+                alert.resolved_at = now
@@ -0,0 +1,254 @@
+# services/reservation.py
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, func, select, update
+from models import (db, Product, ProductVariant, SalesChannel, StockBatch, StockReservation,
+                    StockReservationBatch, StockReservationItem)
+from models._base import utc_now
+from services.fefo import AllocationConflict, plan_fefo_order, reserve_batches
+from services.jobs import for_each_workspace, start_periodic
+from services.sales import build_sale, persist_sales
+from services.stock_level import apply_stock_deltas, refresh_stockin_locks
+
+
+class ReservationConflict(ValueError):
+    """สถานะใบจองไม่เปิดให้ทำรายการแล้ว (หมดอายุ / ยืนยัน / ยกเลิกไปก่อน)"""
+
+
+HEADER_FIELDS = ("customer_name", "province", "shipping_fee", "shop_discount", "platform_discount", "coin_discount")
+
+
+def _now() -> datetime:
+    # DateTime ใน SQLite เก็บแบบ naive (UTC) -> เทียบกับค่า naive
+    return utc_now().replace(tzinfo=None)
+
+
+def resolve_reservation_lines(workspace_id: int, items) -> list:
+    """
+    items = [{variant_id, quantity_pack, unit_price}, ...] -> lines รูปเดียวกับ build_sale
+    โหลด variant + product ของทุกบรรทัดใน query เดียว ; ผิดรูป/ไม่เจอ -> ValueError
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    parsed = []
+    for idx, it in enumerate(items, start=1):
+        try:
+            vid = int(it.get("variant_id"))
+            qty = int(it.get("quantity_pack"))
+            price = float(it.get("unit_price"))
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError(f"Item #{idx}: variant_id, quantity_pack and unit_price are required")
+        if qty <= 0:
+            raise ValueError(f"Item #{idx}: quantity_pack must be > 0")
+        if price < 0:
+            raise ValueError(f"Item #{idx}: unit_price must be >= 0")
+        parsed.append((idx, vid, qty, price))
+
+    variants = {
+        vid: (pid, mode, int(pack or 0))
+        for vid, pid, mode, pack in db.session.query(
+            ProductVariant.id, ProductVariant.product_id, ProductVariant.sale_mode, ProductVariant.pack_size,
+        )
+        .join(Product, Product.id == ProductVariant.product_id)
+        .filter(Product.workspace_id == workspace_id, ProductVariant.id.in_({p[1] for p in parsed}))
+    }
+    lines = []
+    for idx, vid, qty, price in parsed:
+        v = variants.get(vid)
+        if not v:
+            raise ValueError(f"Item #{idx}: variant {vid} not found in this workspace")
+        pid, mode, pack = v
+        if pack <= 0:
+            raise ValueError(f"Item #{idx}: variant.pack_size invalid")
+        lines.append({
+            "product_id": pid, "variant_id": vid, "sale_mode": mode or "variant",
+            "pack_size": pack, "quantity_pack": qty, "unit_price": price,
+        })
+    return lines
+
+
+def create_reservation(workspace_id: int, warehouse_id: int, channel_id: int, lines: list, header: dict,
+                       ttl_seconds: int, external_order_id: str | None = None) -> StockReservation:
+    """
+    วางแผน FEFO ทั้งออเดอร์ -> กันยอดล็อต (qty_reserved += ; conditional UPDATE แบบเดียวกับการตัด)
+    -> บันทึกใบจอง + แผนล็อต -> stock_level.reserved
+    ต้องเรียกภายใน savepoint + run_with_fefo_retry (ชนกับบิล/ใบจองอื่น -> AllocationConflict)
+    """
+    plans = plan_fefo_order(
+        [(l["product_id"], int(l["pack_size"]) * int(l["quantity_pack"])) for l in lines],
+        workspace_id, warehouse_id,
+    )
+    reserve_batches([cut for plan in plans for cut in plan])
+
+    res = StockReservation(
+        workspace_id=workspace_id,
+        warehouse_id=warehouse_id,
+        channel_id=channel_id,
+        external_order_id=external_order_id,
+        status="ACTIVE",
+        expires_at=_now() + timedelta(seconds=int(ttl_seconds)),
+        **{k: header.get(k) for k in HEADER_FIELDS},
+    )
+    db.session.add(res)
+    db.session.flush()
+
+    reserved = {}
+    for line, plan in zip(lines, plans):
+        item = StockReservationItem(
+            product_id=line["product_id"],
+            variant_id=line["variant_id"],
+            sale_mode=line["sale_mode"],
+            pack_size=line["pack_size"],
+            quantity_pack=line["quantity_pack"],
+            unit_price=line["unit_price"],
+            workspace_id=workspace_id,
+        )
+        for batch_id, qty in plan:
+            item.batches.append(StockReservationBatch(
+                reservation_id=res.id, batch_id=batch_id, product_id=line["product_id"], qty=int(qty),
+                workspace_id=workspace_id, warehouse_id=warehouse_id,
+            ))
+            key = (workspace_id, warehouse_id, line["product_id"])
+            reserved[key] = reserved.get(key, 0) + int(qty)
+        res.items.append(item)
+
+    apply_stock_deltas({}, reserved=reserved)
+    return res
+
+
+def confirm_reservation(res: StockReservation, sale_date: datetime | None = None, overrides: dict | None = None):
+    """
+    ใบจอง ACTIVE -> Sale ตามล็อตที่กันไว้ (ไม่ re-plan) ; ผู้เรียก commit
+    เปลี่ยนสถานะด้วย conditional UPDATE ก่อน -> ยืนยันซ้ำ/ยืนยันพร้อม sweeper ได้ผลแค่ครั้งเดียว
+    """
+    now = _now()
+    claimed = db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.id == res.id, StockReservation.status == "ACTIVE", StockReservation.expires_at > now)
+        .values(status="CONFIRMED", released_at=None),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if claimed != 1:
+        db.session.refresh(res)
+        if res.status == "ACTIVE":
+            raise ReservationConflict("Reservation has expired")
+        raise ReservationConflict(f"Reservation is already {res.status}")
+
+    channel = db.session.get(SalesChannel, res.channel_id)
+    tier = channel.platform_tier if channel else None
+    if not tier:
+        raise ValueError("SalesChannel has no PlatformTier bound")
+
+    overrides = overrides or {}
+    header = dict(
+        workspace_id=res.workspace_id,
+        warehouse_id=res.warehouse_id,
+        channel_id=res.channel_id,
+        sale_date=sale_date or now,
+        channel_name_at_sale=channel.channel_name,
+        commission_percent_at_sale=float(tier.commission_percent or 0.0),
+        transaction_percent_at_sale=float(tier.transaction_percent or 0.0),
+        external_order_id=res.external_order_id,
+        **{k: overrides.get(k, getattr(res, k)) for k in HEADER_FIELDS},
+    )
+    lines, plans = [], []
+    for item in res.items:
+        lines.append({
+            "product_id": item.product_id, "variant_id": item.variant_id, "sale_mode": item.sale_mode,
+            "pack_size": item.pack_size, "quantity_pack": item.quantity_pack, "unit_price": item.unit_price,
+        })
+        plans.append([(b.batch_id, b.qty) for b in item.batches])
+
+    sale = build_sale(header, lines, plans)
+    try:
+        persist_sales([sale], reserved=True)
+    except AllocationConflict:
+        # ยอดที่กันไว้หายไป (เช่น ล็อตถูกลบ/แก้ย้อนหลัง) -> ยืนยันไม่ได้
+        raise AllocationConflict("Reserved batches are no longer available")
+
+    res.status = "CONFIRMED"
+    res.sale_id = sale.id
+    return sale
+
+
+def _release(status: str, *criteria) -> dict:
+    """
+    ปล่อยใบจอง ACTIVE ที่ตรงเงื่อนไขทั้งชุด (set-based):
+    1) UPDATE stock_reservation SET status=:status ... RETURNING id  (จับ write lock + กันปล่อยซ้ำ)
+    2) รวมยอดต่อ batch -> UPDATE stock_batch SET qty_reserved = qty_reserved - :q (executemany)
+    3) stock_level.reserved ต่อ (ws, wh, product)
+    """
+    now = _now()
+    ids = db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.status == "ACTIVE", *criteria)
+        .values(status=status, released_at=now)
+        .returning(StockReservation.id),
+        execution_options={"synchronize_session": False},
+    ).scalars().all()
+    if not ids:
+        return {"reservations": 0, "units": 0}
+
+    rows = db.session.execute(
+        select(StockReservationBatch.batch_id, StockReservationBatch.workspace_id,
+               StockReservationBatch.warehouse_id, StockReservationBatch.product_id,
+               func.sum(StockReservationBatch.qty))
+        .where(StockReservationBatch.reservation_id.in_(ids))
+        .group_by(StockReservationBatch.batch_id, StockReservationBatch.workspace_id,
+                  StockReservationBatch.warehouse_id, StockReservationBatch.product_id)
+    ).all()
+    if rows:
+        t = StockBatch.__table__
+        db.session.connection(bind_arguments={"mapper": StockBatch}).execute(
+            update(t)
+            .where(t.c.id == bindparam("b_id"))
+            .values(qty_reserved=t.c.qty_reserved - bindparam("b_qty")),
+            [{"b_id": b, "b_qty": int(q)} for b, _, _, _, q in rows],
+        )
+        refresh_stockin_locks(StockBatch.id.in_([b for b, *_ in rows]))
+        reserved = {}
+        for _, ws, wh, pid, q in rows:
+            reserved[(ws, wh, pid)] = reserved.get((ws, wh, pid), 0) - int(q)
+        apply_stock_deltas({}, reserved=reserved)
+
+    return {"reservations": len(ids), "units": sum(int(q) for *_, q in rows)}
+
+
+def release_reservation(res: StockReservation) -> bool:
+    """ยกเลิกใบจองเดียว (ผู้เรียก commit) ; ไม่ใช่ ACTIVE แล้ว -> False"""
+    return _release("RELEASED", StockReservation.id == res.id)["reservations"] == 1
+
+
+def release_expired_reservations(workspace_id: int, now: datetime | None = None) -> dict:
+    """ปล่อยใบจองที่เลย expires_at ของร้านทั้งหมดใน statement ชุดเดียว (ผู้เรียก commit)"""
+    return _release(
+        "EXPIRED",
+        StockReservation.workspace_id == workspace_id,
+        StockReservation.expires_at <= (now or _now()),
+    )
+
+
+def release_expired_all_workspaces(now: datetime | None = None, workspace_id: int | None = None) -> dict:
+    """
+    เฉพาะร้านที่มีใบจองหมดอายุค้าง (query เดียวจาก ix_resv_status_expires) แล้วปล่อย + commit ทีละร้าน
+    (STORAGE_MODE=per_workspace: ใบจองอยู่ไฟล์ของแต่ละร้าน -> ต้องไล่ทุกร้าน)
+    """
+    now = now or _now()
+    ws_ids = None   # per_workspace -> ทุกร้าน
+    if not workspace_id and "workspace_storage" not in current_app.extensions:
+        ws_ids = [
+            wid for (wid,) in db.session.query(StockReservation.workspace_id)
+            .filter(StockReservation.status == "ACTIVE", StockReservation.expires_at <= now)
+            .distinct()
+        ]
+
+    def _one(wsid):
+        r = release_expired_reservations(wsid, now)
+        return r if r["reservations"] else None
+
+    return for_each_workspace(_one, "Reservation sweep", workspace_id, ws_ids)
+
+
+def start_reservation_sweeper(app):
+    """ปล่อยใบจองหมดอายุทุก RESERVATION_SWEEP_INTERVAL_SECONDS (0 = ปิด -> ใช้ `flask release-reservations`)"""
+    return start_periodic(app, "reservation-sweeper", "RESERVATION_SWEEP_INTERVAL_SECONDS", release_expired_all_workspaces)
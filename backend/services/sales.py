@@ -0,0 +1,117 @@
+# services/sales.py
+import math
+from sqlalchemy import insert
+from models import db, Sale, SaleItem, SaleItemBatch, StockMovement
+from services.cogs import record_sale_cogs
+from services.fefo import consume_batches
+from services.reorder import record_sales_velocity
+from services.stock_level import apply_stock_deltas
+from services.versioning import SALES, bump_versions
+
+
+def apply_sale_totals(sale: Sale):
+    # คิดยอดบิล (อย่างง่าย) จาก line_total ของทุกรายการ + % ที่ snapshot ไว้ในบิล
+    commission_pct = float(sale.commission_percent_at_sale or 0.0)
+    transaction_pct = float(sale.transaction_percent_at_sale or 0.0)
+    shipping_fee = float(sale.shipping_fee or 0)
+    shop_discount = float(sale.shop_discount or 0)
+    platform_discount = float(sale.platform_discount or 0)
+    coin_discount = float(sale.coin_discount or 0)
+
+    sale.subtotal = float(sum(float(it.line_total or 0.0) for it in sale.items))
+    sale.customer_pay = sale.subtotal - shop_discount - platform_discount - coin_discount + shipping_fee
+    sale.commission_fee = math.floor(sale.subtotal * (commission_pct / 100.0))
+    sale.transaction_fee = round((sale.customer_pay + platform_discount + coin_discount) * (transaction_pct / 100.0))
+    sale.vat_amount = (sale.commission_fee + sale.transaction_fee) * 7 / 107
+    sale.seller_receive = sale.subtotal - sale.commission_fee - sale.transaction_fee - shop_discount
+
+
+def build_sale(header: dict, lines: list, plans: list) -> Sale:
+    """
+    header = kwargs ของ Sale (workspace/warehouse, channel snapshot, ค่าส่ง/ส่วนลด)
+    lines  = [{"product_id", "variant_id", "sale_mode", "pack_size", "quantity_pack", "unit_price"}, ...]
+    plans  = แผน FEFO ต่อบรรทัด [[(batch_id, qty), ...], ...]
+    สร้าง object graph อย่างเดียว (ยังไม่ตัดสต็อก / ยังไม่ flush)
+    """
+    sale = Sale(**header)
+    for line, plan in zip(lines, plans):
+        pack_size = int(line["pack_size"])
+        qty_pack = int(line["quantity_pack"])
+        unit_price = float(line["unit_price"])
+
+        si = SaleItem(
+            product_id=line["product_id"],
+            variant_id=line["variant_id"],
+            sale_mode_at_sale=line.get("sale_mode") or "variant",
+            pack_size_at_sale=pack_size,
+            quantity_pack=qty_pack,
+            unit_price_at_sale=unit_price,
+            base_units=pack_size * qty_pack,
+            line_total=unit_price * qty_pack,
+            workspace_id=sale.workspace_id,
+            warehouse_id=sale.warehouse_id,
+        )
+        for batch_id, qty in plan:
+            si.batches.append(SaleItemBatch(
+                product_id=line["product_id"],
+                batch_id=batch_id,
+                qty=int(qty),
+                workspace_id=sale.workspace_id,
+                warehouse_id=sale.warehouse_id,
+            ))
+        sale.items.append(si)
+
+    apply_sale_totals(sale)
+    return sale
+
+
+def persist_sales(sales: list, reserved: bool = False):
+    """
+    ตัดล็อตตามแผนของทุกบิล -> insert บิลทั้งชุดใน flush เดียว -> movement(OUT) + COGS -> stock_level
+    ต้องเรียกภายใน savepoint: ล็อตไม่พอ (มีบิลอื่นตัดไปก่อน) -> AllocationConflict ให้ผู้เรียก re-plan
+    reserved=True -> แผนมาจากใบจอง: ตัดจากยอดที่กันไว้ (qty_reserved / stock_level.reserved ลดตาม)
+    """
+    cuts = [
+        (sib.batch_id, int(sib.qty))
+        for sale in sales for si in sale.items for sib in si.batches
+    ]
+    remaining = consume_batches(cuts, reserved=reserved)
+
+    db.session.add_all(sales)
+    db.session.flush()
+
+    # batch_qty_remaining ต่อ movement = ยอดหลังตัดแถวนั้น (เริ่มจากยอดก่อนตัดของทั้งชุด)
+    running = dict(remaining)
+    for batch_id, qty in cuts:
+        running[batch_id] += qty
+
+    movements, deltas, velocity = [], {}, {}
+    for sale in sales:
+        day = sale.sale_date.date() if sale.sale_date else None
+        for si in sale.items:
+            for sib in si.batches:
+                running[sib.batch_id] -= int(sib.qty)
+                movements.append({
+                    "product_id": sib.product_id,
+                    "batch_id": sib.batch_id,
+                    "movement_type": "OUT",
+                    "qty": -int(sib.qty),
+                    "batch_qty_remaining": running[sib.batch_id],
+                    "ref_sale_id": sale.id,
+                    "note": f"SaleItem #{si.id}",
+                    "workspace_id": sib.workspace_id,
+                    "warehouse_id": sib.warehouse_id,
+                })
+                key = (sib.workspace_id, sib.warehouse_id, sib.product_id)
+                deltas[key] = deltas.get(key, 0) - int(sib.qty)
+                if day:
+                    vkey = (sib.workspace_id, sib.product_id, day)
+                    velocity[vkey] = velocity.get(vkey, 0) + int(sib.qty)
+
+    if movements:
+        db.session.execute(insert(StockMovement), movements)
+    record_sale_cogs(sales)
+    record_sales_velocity(velocity)
+    apply_stock_deltas(deltas, reserved=dict(deltas) if reserved else None)
+    for ws in {s.workspace_id for s in sales}:
+        bump_versions(ws, SALES)
@@ -0,0 +1,148 @@
+# services/search.py
+import threading
+from sqlalchemy import text
+from models import db, Product
+from services.jobs import for_each_workspace
+from services.pagination import decode_cursor, encode_cursor
+
+# FTS5 ค้นหาสินค้า: 1 แถวต่อสินค้า (rowid = product.id)
+#   ws = "w<workspace_id>" (กรองร้านใน MATCH เลย ไม่ต้องไล่ผลของทุกร้านใน shared DB)
+#   variant_skus = sku เต็มของทุก variant (sku + sku_suffix) คั่นด้วยช่องว่าง -> สแกน/พิมพ์รหัสแพ็คแล้วเจอสินค้า
+# prefix='2 3' : index prefix 2-3 ตัวอักษรไว้ล่วงหน้า -> typeahead ตัวแรกๆ ไม่ต้องไล่ทั้ง vocab
+# unicode61 ไม่ตัดคำไทย -> ภาษาไทยค้นได้แบบ prefix จากต้นคำที่คั่นด้วยช่องว่าง (เช่น "วิตา" เจอ "วิตามินซี")
+FTS_TABLE = "product_search"
+SEARCH_COLUMNS = "{name sku category variant_skus}"
+RANK = f"bm25({FTS_TABLE}, 0.0, 10.0, 8.0, 1.0, 6.0)"   # น้ำหนัก: ws, name, sku, category, variant_skus
+
+_INSERT_ROWS = f"""
+    INSERT INTO {FTS_TABLE} (rowid, ws, name, sku, category, variant_skus)
+    SELECT p.id, 'w' || p.workspace_id, p.name, p.sku, p.category,
+           (SELECT group_concat(p.sku || v.sku_suffix, ' ') FROM product_variant v WHERE v.product_id = p.id)
+    FROM product p {{where}};
+"""
+
+
+def _refresh(pid: str) -> str:
+    # ลบแถวเดิมแล้วสร้างใหม่จากตารางจริง (สินค้าถูกลบ -> SELECT ไม่ได้แถว = ลบอย่างเดียว)
+    return f"DELETE FROM {FTS_TABLE} WHERE rowid = {pid};" + _INSERT_ROWS.format(where=f"WHERE p.id = {pid}")
+
+
+# trigger ให้ index ตามทุกการเขียน (ORM / Core / import ไฟล์) โดยไม่ต้องแก้ทุก route
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        ws, name, sku, category, variant_skus,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN
+        {_refresh("NEW.id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name, sku, category, workspace_id ON product BEGIN
+        {_refresh("NEW.id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_vai AFTER INSERT ON product_variant BEGIN
+        {_refresh("NEW.product_id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_vau AFTER UPDATE OF sku_suffix, product_id ON product_variant BEGIN
+        {_refresh("OLD.product_id")} {_refresh("NEW.product_id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_vad AFTER DELETE ON product_variant BEGIN
+        {_refresh("OLD.product_id")} END""",
+]
+
+_ready = set()   # url ของ engine ที่ตรวจ/สร้าง index แล้ว (ต่อโปรเซส)
+_ready_lock = threading.Lock()
+
+
+def _execute(sql: str, params=None):
+    # raw SQL บนตารางของร้าน -> ให้ RoutingSession เลือก engine ตาม Product
+    return db.session.execute(text(sql), params or {}, bind_arguments={"mapper": Product})
+
+
+def _populate(workspace_id: int | None = None):
+    where = "" if workspace_id is None else "WHERE p.workspace_id = :ws"
+    _execute(_INSERT_ROWS.format(where=where), {"ws": workspace_id})
+
+
+def ensure_search_index():
+    """
+    สร้าง FTS table + trigger ถ้ายังไม่มี (DB เดิม / ไฟล์ร้านใหม่) แล้วเติมข้อมูลจาก product ทั้งหมด ; commit เอง
+    ตรวจครั้งเดียวต่อ engine ต่อโปรเซส
+    """
+    url = str(db.session.get_bind(mapper=Product).url)
+    if url in _ready:
+        return
+    with _ready_lock:
+        if url in _ready:
+            return
+        exists = _execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", {"name": FTS_TABLE}
+        ).first()
+        for ddl in SCHEMA:
+            _execute(ddl)
+        if not exists:
+            _populate()
+        db.session.commit()
+        _ready.add(url)
+
+
+def rebuild_search_index(workspace_id: int) -> int:
+    """สร้าง index ของร้านใหม่ทั้งหมดจากตาราง product (ผู้เรียก commit) ; return จำนวนสินค้าใน index"""
+    ensure_search_index()
+    _execute(
+        f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q)",
+        {"q": f"ws : w{int(workspace_id)}"},
+    )
+    _populate(int(workspace_id))
+    _execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return _execute(
+        f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q", {"q": f"ws : w{int(workspace_id)}"}
+    ).scalar()
+
+
+def rebuild_all_workspaces(workspace_id: int | None = None) -> dict:
+    """rebuild index ทุกร้าน (commit ทีละร้าน)"""
+    return for_each_workspace(lambda wsid: rebuild_search_index(wsid), "Search index rebuild", workspace_id)
+
+
+def match_expression(q: str) -> str | None:
+    """
+    ข้อความที่ผู้ใช้พิมพ์ -> FTS5 MATCH : ทุกคำต้องเจอ (AND) และคำท้ายสุดแบบ prefix (typeahead)
+    แต่ละคำถูกครอบ "..." (ตัวอักษรพิเศษของ FTS5 ไม่มีผล) ; คำที่มีขีด เช่น VIT-C -> phrase "vit c"
+    """
+    words = [w.replace('"', '""') for w in (q or "").split()]
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return f"{SEARCH_COLUMNS} : ({' AND '.join(terms)})"
+
+
+def search_products(workspace_id: int, q: str, limit: int, cursor: str | None = None):
+    """
+    ค้นหาสินค้าของร้าน เรียงตาม bm25 (ดีสุดก่อน) แล้ว id ; แบ่งหน้าแบบ keyset บน (rank, id)
+    return (rows [(id, rank), ...], next_cursor) ; q ว่าง -> ValueError
+    """
+    expr = match_expression(q)
+    if expr is None:
+        raise ValueError("Search query is required")
+    ensure_search_index()
+
+    params = {"q": f"ws : w{int(workspace_id)} AND {expr}", "limit": limit + 1}
+    after = ""
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise ValueError("Invalid cursor")
+        params["r"], params["id"] = float(values[0]), int(values[1])
+        after = "AND (rank > :r OR (rank = :r AND rowid > :id))"
+
+    rows = _execute(
+        f"""
+        SELECT rowid, rank FROM (
+            SELECT rowid, {RANK} AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q
+        ) WHERE 1 {after}
+        ORDER BY rank, rowid LIMIT :limit
+        """,
+        params,
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor([rows[-1].rank, rows[-1].rowid]) if has_more and rows else None
+    return rows, next_cursor
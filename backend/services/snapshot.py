@@ -0,0 +1,166 @@
+# services/snapshot.py
+import os
+import shutil
+from flask import current_app
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, select
+from models import db, Sale, SaleItem, SaleItemBatch, SnapshotWatermark, StockBatch, StockMovement
+from models._base import utc_now
+from services.jobs import for_each_workspace
+
+# ตารางที่ส่งออก (ชื่อโฟลเดอร์ dataset = ชื่อตาราง) ; ทุกตารางมี id เพิ่มขึ้นเรื่อยๆ -> ใช้เป็น watermark
+TABLES = {
+    "sale": Sale,
+    "sale_item": SaleItem,
+    "sale_item_batch": SaleItemBatch,
+    "stock_batch": StockBatch,
+    "stock_movement": StockMovement,
+}
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _pa():
+    # pyarrow ใช้เฉพาะงาน snapshot -> import ตอนเรียก (เว็บโปรเซสไม่ต้องโหลด)
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("pyarrow is required for snapshot export (pip install pyarrow)")
+    return pyarrow
+
+
+def snapshot_root() -> str:
+    return current_app.config.get("SNAPSHOT_DIR") or os.path.join(current_app.instance_path, "snapshots")
+
+
+def dataset_dir(workspace_id: int, table: str) -> str:
+    return os.path.join(snapshot_root(), f"ws_{int(workspace_id)}", table)
+
+
+def _arrow_type(pa, col):
+    t = col.type
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, Integer):
+        return pa.int64()
+    if isinstance(t, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(t, DateTime):
+        return pa.timestamp("us", tz="UTC")   # ทุก timestamp ในระบบเป็น UTC
+    if isinstance(t, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _open_writer(pa, fmt: str, path: str, schema):
+    if fmt == "parquet":
+        return pa.parquet.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+def export_table(workspace_id: int, table: str, fmt: str, since_id: int, row_group: int) -> dict:
+    """
+    เขียนแถวของร้านที่ id > since_id เป็นไฟล์ใหม่ 1 ไฟล์ใน dataset ของตาราง (part-<id แรก>)
+    ชื่อไฟล์ผูกกับ id แรก -> รันซ้ำหลัง commit watermark ไม่สำเร็จจะเขียนทับไฟล์เดิม ไม่เกิดแถวซ้ำ
+    ดึงจาก cursor ทีละ row_group แถว -> RecordBatch -> 1 row group (หน่วยความจำ ~ 1 row group ไม่ว่าตารางใหญ่แค่ไหน)
+    เขียนลงไฟล์ .tmp ก่อนแล้วค่อย rename (ผู้อ่านไม่เห็นไฟล์ครึ่งๆ)
+    """
+    pa = _pa()
+    model = TABLES[table]
+    cols = list(model.__table__.columns)
+    schema = pa.schema([pa.field(c.name, _arrow_type(pa, c), nullable=True) for c in cols])
+
+    stmt = (
+        select(*cols)
+        .where(model.workspace_id == workspace_id, model.id > since_id)
+        .order_by(model.id)
+    )
+    out_dir = dataset_dir(workspace_id, table)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = os.path.join(out_dir, f".part-{since_id + 1:012d}{EXTENSIONS[fmt]}.tmp")
+
+    id_idx = cols.index(model.__table__.c.id)
+    rows, first_id, last_id, writer = 0, None, since_id, None
+    result = db.session.execute(stmt, execution_options={"yield_per": row_group})
+    try:
+        for part in result.partitions():
+            columns = list(zip(*part))
+            batch = pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            )
+            if writer is None:
+                writer = _open_writer(pa, fmt, tmp_path, schema)
+                first_id = part[0][id_idx]
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=row_group)
+            else:
+                writer.write_batch(batch)
+            rows += len(part)
+            last_id = part[-1][id_idx]
+    finally:
+        result.close()
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return {"rows": 0, "file": None, "last_id": since_id}
+    path = os.path.join(out_dir, f"part-{first_id:012d}{EXTENSIONS[fmt]}")
+    os.replace(tmp_path, path)
+    return {"rows": rows, "file": os.path.relpath(path, os.path.dirname(out_dir)), "last_id": int(last_id)}
+
+
+def run_snapshot(workspace_id: int, incremental: bool = True, fmt: str | None = None, tables=None) -> dict:
+    """
+    snapshot ตารางขาย / ล็อต / movement ของร้าน (ผู้เรียก commit)
+    - full: ล้าง dataset ของตารางแล้วเขียนใหม่ทั้งหมด
+    - incremental: เพิ่มไฟล์ใหม่เฉพาะแถวที่ id > watermark (แถวเดิมที่ถูกแก้/ลบภายหลังไม่ตามไป -> รัน full เป็นระยะ)
+    อ่านได้ทั้งโฟลเดอร์ เช่น DuckDB: SELECT * FROM 'ws_1/sale/*.parquet'
+    """
+    fmt = (fmt or current_app.config.get("SNAPSHOT_FORMAT") or "parquet").lower()
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported snapshot format: {fmt}")
+    tables = list(tables or TABLES)
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown snapshot table: {', '.join(unknown)}")
+    row_group = int(current_app.config.get("SNAPSHOT_ROW_GROUP_SIZE", 100_000))
+
+    marks = {
+        w.table_name: w for w in db.session.query(SnapshotWatermark)
+        .filter(SnapshotWatermark.workspace_id == workspace_id, SnapshotWatermark.table_name.in_(tables))
+    }
+    now = utc_now()
+    out = {}
+    for table in tables:
+        mark = marks.get(table)
+        if mark is None:
+            mark = SnapshotWatermark(workspace_id=workspace_id, table_name=table, last_id=0, rows_total=0, files_total=0)
+            db.session.add(mark)
+
+        out_dir = dataset_dir(workspace_id, table)
+        full = not incremental or not mark.last_id
+        if not full and os.path.isdir(out_dir) and any(
+            n.endswith(e) for n in os.listdir(out_dir) for f, e in EXTENSIONS.items() if f != fmt
+        ):
+            raise ValueError(f"{table}: dataset has files in another format; run a full snapshot")
+        if full and os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        if full:
+            mark.last_id, mark.rows_total, mark.files_total = 0, 0, 0
+            mark.last_full_at = now
+
+        r = export_table(workspace_id, table, fmt, int(mark.last_id or 0), row_group)
+        if r["file"]:
+            mark.last_id = r["last_id"]
+            mark.rows_total += r["rows"]
+            mark.files_total += 1
+        mark.last_run_at = now
+        out[table] = {"mode": "full" if full else "incremental", **r, "rows_total": mark.rows_total}
+    return out
+
+
+def snapshot_all_workspaces(incremental: bool = True, fmt: str | None = None, workspace_id: int | None = None,
+                            tables=None) -> dict:
+    """snapshot ทุกร้าน (commit watermark ทีละร้าน)"""
+    return for_each_workspace(lambda wsid: run_snapshot(wsid, incremental, fmt, tables), "Snapshot export", workspace_id)
@@ -0,0 +1,167 @@
+# services/stock_level.py
+from sqlalchemy import func, or_, update, delete, insert, select
+from models import db, StockBatch, StockIn, StockLevel, Warehouse
+from models._base import utc_now
+from services.reorder import check_reorder_points
+from services.versioning import STOCK, bump_versions
+
+
+def resolve_warehouse_id(workspace_id: int, warehouse_id=None) -> int:
+    # ส่ง warehouse มา -> ต้องเป็นของร้านเดียวกัน / ไม่ส่ง -> ใช้คลัง default (หรือคลังแรกของร้าน)
+    if warehouse_id:
+        wh = db.session.get(Warehouse, int(warehouse_id))
+        if not wh or wh.workspace_id != workspace_id:
+            raise ValueError(f"Warehouse {warehouse_id} not found in this workspace")
+        return wh.id
+
+    wh_id = (
+        db.session.query(Warehouse.id)
+        .filter(Warehouse.workspace_id == workspace_id)
+        .order_by(Warehouse.is_default.desc(), Warehouse.id.asc())
+        .limit(1)
+        .scalar()
+    )
+    if not wh_id:
+        raise ValueError("Workspace has no warehouse")
+    return wh_id
+
+
+def _nearest_expiry_expr(workspace_id: int, warehouse_id: int, product_id: int):
+    # ใช้ ix_batch_ws_wh_prod_exp (workspace, warehouse, product, expiry)
+    return (
+        select(func.min(StockBatch.expiry_date))
+        .where(
+            StockBatch.workspace_id == workspace_id,
+            StockBatch.warehouse_id == warehouse_id,
+            StockBatch.product_id == product_id,
+            StockBatch.qty_remaining > 0,
+        )
+        .scalar_subquery()
+    )
+
+
+def apply_stock_deltas(deltas: dict, reserved: dict | None = None):
+    """
+    deltas   = {(workspace_id, warehouse_id, product_id): +/-base_units}
+    reserved = {(workspace_id, warehouse_id, product_id): +/-base_units}
+    ต้องเรียกก่อน commit (ใช้ transaction เดียวกับการแก้ StockBatch)
+    """
+    reserved = reserved or {}
+    keys = set(deltas) | set(reserved)
+    if not keys:
+        return
+
+    # flush batch ที่เพิ่งแก้ก่อน เพื่อให้ nearest_expiry คำนวณจากค่าล่าสุด
+    db.session.flush()
+
+    for (ws, wh, pid) in keys:
+        on_hand_delta = int(deltas.get((ws, wh, pid), 0))
+        reserved_delta = int(reserved.get((ws, wh, pid), 0))
+
+        level_id = (
+            db.session.query(StockLevel.id)
+            .filter_by(workspace_id=ws, warehouse_id=wh, product_id=pid)
+            .scalar()
+        )
+        if level_id is None:
+            level = StockLevel(workspace_id=ws, warehouse_id=wh, product_id=pid, on_hand=0, reserved=0)
+            db.session.add(level)
+            db.session.flush()
+            level_id = level.id
+
+        db.session.execute(
+            update(StockLevel)
+            .where(StockLevel.id == level_id)
+            .values(
+                on_hand=StockLevel.on_hand + on_hand_delta,
+                reserved=StockLevel.reserved + reserved_delta,
+                nearest_expiry=_nearest_expiry_expr(ws, wh, pid),
+                updated_at=utc_now(),
+            )
+        )
+
+    # แจ้งเตือนจุดสั่งซื้อ: ตรวจเฉพาะสินค้าที่ยอดเพิ่งเปลี่ยน (ไม่ไล่ประวัติ)
+    check_reorder_points({(ws, pid) for ws, _, pid in keys})
+    for ws in {ws for ws, _, _ in keys}:
+        bump_versions(ws, STOCK)
+
+
+def refresh_stockin_locks(*batch_criteria):
+    """
+    StockIn.locked = มีล็อตรับเข้าจริงของใบที่ qty_remaining - qty_reserved < qty_received (ถูกขาย/โอน/จอง/หมดอายุไปแล้ว)
+      หรือมีก้อนที่เกิดจากการโอน (origin_batch_id) : ยอดของก้อนโอนไม่ใช่ยอดรับของใบ -> ไม่เอามาเทียบ
+      แต่โอนแล้ว = มี movement อ้างล็อตของใบ -> แก้/ลบใบไม่ได้ แม้โอนกลับครบแล้ว
+    คำนวณใหม่ใน UPDATE เดียวเฉพาะใบที่มีล็อตตรง batch_criteria (ไม่ส่ง = ทุกใบ ใช้ backfill)
+    ต้องเรียกหลังแก้ยอดล็อต ใน transaction เดียวกัน
+    """
+    used = (
+        select(StockBatch.id)
+        .where(
+            StockBatch.stockin_id == StockIn.id,
+            or_(
+                StockBatch.origin_batch_id.is_not(None),
+                StockBatch.qty_remaining - StockBatch.qty_reserved < StockBatch.qty_received,
+            ),
+        )
+        .exists()
+    )
+    stmt = update(StockIn).values(locked=used)
+    if batch_criteria:
+        stmt = stmt.where(StockIn.id.in_(select(StockBatch.stockin_id).where(*batch_criteria)))
+    return db.session.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+
+
+def batch_deltas(pairs) -> dict:
+    # pairs = [(StockBatch, qty), ...] -> รวมเป็น {(ws, wh, pid): qty}
+    out = {}
+    for b, qty in pairs:
+        key = (b.workspace_id, b.warehouse_id, b.product_id)
+        out[key] = out.get(key, 0) + int(qty)
+    return out
+
+
+def stock_on_hand(product_ids, workspace_id: int | None = None) -> dict:
+    # point read จาก stock_level (รวมทุกคลัง) เฉพาะสินค้าที่ขอ
+    ids = list({int(i) for i in product_ids})
+    if not ids:
+        return {}
+    q = (
+        db.session.query(StockLevel.product_id, func.sum(StockLevel.on_hand))
+        .filter(StockLevel.product_id.in_(ids))
+        .group_by(StockLevel.product_id)
+    )
+    if workspace_id is not None:
+        q = q.filter(StockLevel.workspace_id == workspace_id)
+    return {pid: int(qty or 0) for pid, qty in q.all()}
+
+
+def rebuild_stock_levels(workspace_id: int | None = None) -> int:
+    # backfill / ซ่อมยอด: คำนวณใหม่จาก StockBatch ทั้งหมด (ใช้ตอน migrate หรือ reconcile)
+    del_q = delete(StockLevel)
+    src = (
+        select(
+            StockBatch.workspace_id,
+            StockBatch.warehouse_id,
+            StockBatch.product_id,
+            func.coalesce(func.sum(StockBatch.qty_remaining), 0),
+            func.coalesce(func.sum(StockBatch.qty_reserved), 0),
+            func.min(StockBatch.expiry_date).filter(StockBatch.qty_remaining > 0),
+        )
+        .group_by(StockBatch.workspace_id, StockBatch.warehouse_id, StockBatch.product_id)
+    )
+    if workspace_id is not None:
+        del_q = del_q.where(StockLevel.workspace_id == workspace_id)
+        src = src.where(StockBatch.workspace_id == workspace_id)
+
+    db.session.execute(del_q)
+    rows = db.session.execute(src).all()
+    if rows:
+        now = utc_now()
+        db.session.execute(insert(StockLevel), [
+            {
+                "workspace_id": ws, "warehouse_id": wh, "product_id": pid,
+                "on_hand": int(qty), "reserved": int(resv), "nearest_expiry": exp, "updated_at": now,
+            }
+            for ws, wh, pid, qty, resv, exp in rows
+        ])
+    return len(rows)
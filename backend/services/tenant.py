@@ -0,0 +1,81 @@
+# services/tenant.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, has_request_context
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+from models import db, TenantScoped
+
+# ใส่ execution option นี้เพื่อปิดการกรองร้านชั่วคราว (เช่น งาน admin / ข้ามร้าน)
+#   db.session.query(...).execution_options(skip_tenant_scope=True)
+SKIP_OPTION = "skip_tenant_scope"
+
+# งานนอก request (CLI / background job) ระบุร้านเองผ่าน use_workspace()
+_job_wsid: ContextVar[int | None] = ContextVar("job_wsid", default=None)
+
+
+def current_workspace_id() -> int | None:
+    """wsid ของ request ปัจจุบัน (จาก JWT) หรือของ use_workspace() ; ไม่มีทั้งคู่ -> None (ไม่กรอง)"""
+    wsid = _job_wsid.get()
+    if wsid is not None:
+        return wsid
+    if not has_request_context():
+        return None
+    return g.get("wsid")
+
+
+@contextmanager
+def use_workspace(workspace_id: int | None):
+    """ผูกร้านให้โค้ดในบล็อก (ใช้กับ CLI / job ที่ไม่มี JWT)"""
+    token = _job_wsid.set(int(workspace_id) if workspace_id is not None else None)
+    try:
+        yield
+    finally:
+        _job_wsid.reset(token)
+
+
+def _load_wsid_from_jwt():
+    # อ่าน access token แบบ optional (เฉพาะ header) — token เสีย/หมดอายุให้ route ที่ @jwt_required จัดการเอง
+    # ⚠️ ไม่มี token -> g.wsid = None -> query ไม่ถูกกรองร้าน (เห็นทุกร้าน) : route ที่อ่าน/เขียนข้อมูลร้านต้อง @jwt_required()
+    g.wsid = None
+    try:
+        if verify_jwt_in_request(optional=True, locations=["headers"]):
+            wsid = get_jwt().get("wsid")
+            g.wsid = int(wsid) if wsid is not None else None
+    except Exception:
+        g.wsid = None
+
+
+_tenant_models = None
+
+
+def tenant_models() -> list:
+    """mapped class ทั้งหมดที่ติด TenantScoped (คำนวณครั้งเดียว)"""
+    global _tenant_models
+    if _tenant_models is None:
+        _tenant_models = [
+            m.class_ for m in db.Model.registry.mappers if issubclass(m.class_, TenantScoped)
+        ]
+    return _tenant_models
+
+
+def _add_tenant_criteria(state):
+    if not state.is_select or state.is_column_load or state.is_relationship_load:
+        return
+    if state.execution_options.get(SKIP_OPTION):
+        return
+    wsid = current_workspace_id()
+    if wsid is None:
+        return
+    # ทุก entity ที่เป็น TenantScoped ใน statement (รวม join/subquery) ได้ WHERE workspace_id = :wsid
+    state.statement = state.statement.options(*[
+        with_loader_criteria(model, model.workspace_id == wsid, include_aliases=True)
+        for model in tenant_models()
+    ])
+
+
+def init_tenant_scope(app):
+    app.before_request(_load_wsid_from_jwt)
+    if not event.contains(Session, "do_orm_execute", _add_tenant_criteria):
+        event.listen(Session, "do_orm_execute", _add_tenant_criteria)
@@ -0,0 +1,179 @@
+# services/transfer.py
+from datetime import date
+from sqlalchemy import bindparam, case, func, insert, select, update
+from models import db, Product, StockBatch, StockMovement, StockTransfer, StockTransferItem
+from models._base import utc_now
+from services.doc_number import next_doc_number
+from services.fefo import allocate_order_from_pool, consume_batches, load_candidate_batches
+from services.stock_level import apply_stock_deltas, resolve_warehouse_id
+
+
+def parse_transfer_items(items) -> list:
+    """[{product_id, qty}, ...] -> [(product_id, qty)] รวมสินค้าซ้ำเป็นบรรทัดเดียว ; ผิดรูป -> ValueError"""
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    totals = {}
+    for idx, it in enumerate(items, start=1):
+        try:
+            pid = int(it.get("product_id"))
+            qty = int(it.get("qty"))
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError(f"Item #{idx}: product_id and qty must be integers")
+        if qty <= 0:
+            raise ValueError(f"Item #{idx}: qty must be > 0")
+        totals[pid] = totals.get(pid, 0) + qty
+    return list(totals.items())
+
+
+def create_transfer(workspace_id: int, from_warehouse_id, to_warehouse_id, items,
+                    transfer_date: date | None = None, note: str | None = None) -> StockTransfer:
+    """สร้างใบโอน (DRAFT) + รายการ ; ยังไม่แตะสต็อก (ตัดจริงตอน execute_transfer)"""
+    if not from_warehouse_id or not to_warehouse_id:
+        raise ValueError("from_warehouse_id and to_warehouse_id are required")
+    from_wh = resolve_warehouse_id(workspace_id, from_warehouse_id)
+    to_wh = resolve_warehouse_id(workspace_id, to_warehouse_id)
+    if from_wh == to_wh:
+        raise ValueError("from_warehouse_id and to_warehouse_id must differ")
+
+    lines = parse_transfer_items(items)
+    pids = [pid for pid, _ in lines]
+    found = {
+        pid for (pid,) in db.session.query(Product.id)
+        .filter(Product.workspace_id == workspace_id, Product.id.in_(pids))
+    }
+    missing = [pid for pid in pids if pid not in found]
+    if missing:
+        raise ValueError(f"Product {missing[0]} not found in this workspace")
+
+    transfer_date = transfer_date or date.today()
+    transfer = StockTransfer(
+        workspace_id=workspace_id,
+        from_warehouse_id=from_wh,
+        to_warehouse_id=to_wh,
+        doc_number=next_doc_number(workspace_id, "TRF", transfer_date),
+        status="DRAFT",
+        transfer_date=transfer_date,
+        note=note,
+    )
+    for pid, qty in lines:
+        transfer.items.append(StockTransferItem(product_id=pid, qty=qty))
+    db.session.add(transfer)
+    db.session.flush()
+    return transfer
+
+
+def execute_transfer(transfer: StockTransfer) -> list:
+    """
+    ยืนยันใบโอนทั้งใบแบบ set-based (ผู้เรียกห่อ savepoint + run_with_fefo_retry แล้ว commit เอง)
+    1) วางแผน FEFO ของทุกรายการจากคลังต้นทางใน query เดียว แล้วตัดล็อตด้วย conditional UPDATE (executemany)
+    2) ล็อตต้นทางแต่ละก้อน -> ล็อตปลายทาง (stockin/lot/expiry/unit_cost เดิม, origin_batch_id ชี้กลับ)
+       คลังปลายทางมีก้อนเดียวกันอยู่แล้ว -> บวกเข้าก้อนเดิม
+       (โอนกลับเข้าล็อตรับเข้าจริงของใบ -> บวกแค่ qty_remaining : qty_received ของ GRN ต้องคงเดิม)
+    3) movement OUT (ต้นทาง) + IN (ปลายทาง) คู่กัน อ้าง ref_transfer_id + stock_level ทั้งสองคลัง
+    return [{product_id, from_batch_id, to_batch_id, qty}, ...]
+    ชนกับบิลอื่นตอนตัด -> AllocationConflict ; ของไม่พอ -> ValueError
+    """
+    if transfer.status != "DRAFT":
+        raise ValueError(f"Transfer is already {transfer.status}")
+    ws, from_wh, to_wh = transfer.workspace_id, transfer.from_warehouse_id, transfer.to_warehouse_id
+
+    totals = {}
+    for it in transfer.items:
+        totals[int(it.product_id)] = totals.get(int(it.product_id), 0) + int(it.qty)
+    lines = list(totals.items())
+
+    # 1) FEFO + ตัดล็อตต้นทาง
+    pool = load_candidate_batches(totals, ws, from_wh)
+    plans = allocate_order_from_pool(pool, lines)
+    cuts = [(b, q) for plan in plans for b, q in plan]
+    src_remaining = consume_batches(cuts)
+
+    # 2) ล็อตปลายทาง: โหลดข้อมูลล็อตต้นทาง + ก้อนที่ปลายทางมีอยู่แล้วอย่างละ 1 query
+    src = {
+        r.id: r for r in db.session.execute(
+            select(StockBatch.id, StockBatch.stockin_id, StockBatch.product_id, StockBatch.lot_number,
+                   StockBatch.expiry_date, StockBatch.unit_cost)
+            .where(StockBatch.id.in_(list(src_remaining)))
+        )
+    }
+
+    def _key(r):
+        return (r.stockin_id, r.product_id, r.lot_number, r.expiry_date)
+
+    existing = {
+        _key(r): r.id for r in db.session.execute(
+            select(StockBatch.id, StockBatch.stockin_id, StockBatch.product_id, StockBatch.lot_number,
+                   StockBatch.expiry_date)
+            .where(
+                StockBatch.workspace_id == ws,
+                StockBatch.warehouse_id == to_wh,
+                StockBatch.stockin_id.in_({r.stockin_id for r in src.values()}),
+                StockBatch.product_id.in_(list(totals)),
+            )
+        )
+    }
+
+    dest = {}   # src batch id -> dest batch id
+    new_cuts = [(b, q) for b, q in cuts if _key(src[b]) not in existing]
+    old_cuts = [(b, q) for b, q in cuts if _key(src[b]) in existing]
+
+    if new_cuts:
+        ids = db.session.scalars(
+            insert(StockBatch).returning(StockBatch.id, sort_by_parameter_order=True),
+            [{
+                "stockin_id": src[b].stockin_id, "product_id": src[b].product_id,
+                "lot_number": src[b].lot_number, "expiry_date": src[b].expiry_date,
+                "qty_received": q, "qty_remaining": q, "unit_cost": src[b].unit_cost,
+                "origin_batch_id": b, "workspace_id": ws, "warehouse_id": to_wh,
+            } for b, q in new_cuts],
+        ).all()
+        dest.update({b: bid for (b, _), bid in zip(new_cuts, ids)})
+
+    if old_cuts:
+        t = StockBatch.__table__
+        db.session.connection(bind_arguments={"mapper": StockBatch}).execute(
+            update(t)
+            .where(t.c.id == bindparam("b_id"))
+            .values(
+                # ต้นทุนถัวเฉลี่ยถ่วงน้ำหนักตามยอดคงเหลือ (ต้นทางไม่มีต้นทุน -> คงของเดิม)
+                unit_cost=func.coalesce(
+                    (func.coalesce(t.c.unit_cost, bindparam("b_cost")) * t.c.qty_remaining
+                     + bindparam("b_cost") * bindparam("b_add")) / (t.c.qty_remaining + bindparam("b_add")),
+                    t.c.unit_cost,
+                ),
+                # ก้อนที่เกิดจากการโอน: qty_received = ยอดโอนเข้าสะสม ; ล็อตรับเข้าจริง (origin NULL) ไม่แตะ
+                qty_received=t.c.qty_received + case((t.c.origin_batch_id.is_(None), 0), else_=bindparam("b_add")),
+                qty_remaining=t.c.qty_remaining + bindparam("b_add"),
+            ),
+            [{"b_id": existing[_key(src[b])], "b_add": q, "b_cost": src[b].unit_cost} for b, q in old_cuts],
+        )
+        dest.update({b: existing[_key(src[b])] for b, _ in old_cuts})
+
+    dest_remaining = dict(db.session.execute(
+        select(StockBatch.id, StockBatch.qty_remaining).where(StockBatch.id.in_(list(dest.values())))
+    ).all())
+
+    # 3) movement คู่ OUT/IN + stock_level
+    note = f"Transfer {transfer.doc_number or transfer.id}"
+    movements, moves, deltas = [], [], {}
+    for b, q in cuts:
+        pid = src[b].product_id
+        movements.append({
+            "product_id": pid, "batch_id": b, "movement_type": "OUT", "qty": -q,
+            "batch_qty_remaining": int(src_remaining[b]), "ref_transfer_id": transfer.id,
+            "note": f"{note} -> WH#{to_wh}", "workspace_id": ws, "warehouse_id": from_wh,
+        })
+        movements.append({
+            "product_id": pid, "batch_id": dest[b], "movement_type": "IN", "qty": q,
+            "batch_qty_remaining": int(dest_remaining[dest[b]]), "ref_transfer_id": transfer.id,
+            "note": f"{note} <- WH#{from_wh}", "workspace_id": ws, "warehouse_id": to_wh,
+        })
+        moves.append({"product_id": pid, "from_batch_id": b, "to_batch_id": dest[b], "qty": q})
+        deltas[(ws, from_wh, pid)] = deltas.get((ws, from_wh, pid), 0) - q
+        deltas[(ws, to_wh, pid)] = deltas.get((ws, to_wh, pid), 0) + q
+    db.session.execute(insert(StockMovement), movements)
+    apply_stock_deltas(deltas)
+
+    transfer.status = "CONFIRMED"
+    transfer.confirmed_at = utc_now()
+    return moves
@@ -0,0 +1,63 @@
+# services/versioning.py
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, ResourceVersion
+from models._base import utc_now
+from services.cache import invalidate_after_commit
+from services.tenant import SKIP_OPTION
+
+# กลุ่มข้อมูลที่ GET ใช้ทำ ETag
+PRODUCTS = "products"
+STOCK = "stock"        # stock_level / ล็อต (ทุกทางที่ผ่าน apply_stock_deltas)
+SALES = "sales"
+STOCKINS = "stockins"
+CHANNELS = "channels"
+
+
+def bump_versions(workspace_id: int, *resources: str):
+    """
+    +1 เวอร์ชันของกลุ่มข้อมูลที่เพิ่งเขียน (เรียกก่อน commit ใน transaction เดียวกับการเขียน)
+    มีแถวแล้ว -> UPDATE ครั้งเดียวทุก resource ; ยังไม่มี -> INSERT (ชนกับ request อื่น -> UPDATE ซ้ำ)
+    """
+    resources = sorted(set(resources))
+    if not resources or workspace_id is None:
+        return
+    ws = int(workspace_id)
+    # response cache ที่ติดแท็กชื่อเดียวกันถูกลบหลัง commit
+    invalidate_after_commit(ws, *resources)
+    bump = (
+        update(ResourceVersion)
+        .where(ResourceVersion.workspace_id == ws, ResourceVersion.resource.in_(resources))
+        .values(version=ResourceVersion.version + 1, updated_at=utc_now())
+        .returning(ResourceVersion.resource)
+    )
+    done = set(db.session.execute(bump, execution_options={"synchronize_session": False}).scalars())
+    for resource in resources:
+        if resource in done:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(ResourceVersion(workspace_id=ws, resource=resource, version=1))
+        except IntegrityError:
+            db.session.execute(
+                update(ResourceVersion)
+                .where(ResourceVersion.workspace_id == ws, ResourceVersion.resource == resource)
+                .values(version=ResourceVersion.version + 1, updated_at=utc_now()),
+                execution_options={"synchronize_session": False},
+            )
+
+
+def current_versions(workspace_id: int, resources) -> dict:
+    """{resource: version} ใน query เดียวบน primary key ; ยังไม่เคยเขียน = 0"""
+    # กรองร้านเองแล้ว -> ข้าม with_loader_criteria ของทุก model (ต้นทุน Python ต่อ query มากกว่าตัว query เอง)
+    rows = dict(db.session.execute(
+        select(ResourceVersion.resource, ResourceVersion.version)
+        .where(ResourceVersion.workspace_id == int(workspace_id), ResourceVersion.resource.in_(list(resources))),
+        execution_options={SKIP_OPTION: True},
+    ).all())
+    return {r: int(rows.get(r) or 0) for r in resources}
+
+
+def make_etag(workspace_id: int, versions: dict) -> str:
+    # ค่า ETag (ยังไม่ใส่ quote) = ร้าน + เวอร์ชันของทุกกลุ่มที่ endpoint นั้นอ่าน ; ใช้เป็น weak ETag
+    return f"{int(workspace_id)}-" + ".".join(str(versions[r]) for r in sorted(versions))
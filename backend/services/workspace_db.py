@@ -0,0 +1,138 @@
+# services/workspace_db.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import MetaData, create_engine, event, inspect as sa_inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.util import find_tables
+from models import db
+from services.tenant import current_workspace_id
+
+# ตารางกลาง (อยู่ใน catalog DB เสมอ) — ที่เหลือเป็นข้อมูลของร้าน แยกไฟล์ตาม workspace
+GLOBAL_TABLES = frozenset({"user", "membership", "platform", "platform_tier", "workspace", "refresh_token"})
+
+
+class WorkspaceStorage:
+    """
+    STORAGE_MODE=per_workspace: ข้อมูลของแต่ละร้านอยู่ใน SQLite ไฟล์ของตัวเอง (ไม่แย่ง write lock กัน)
+    - engine ต่อร้านเก็บใน LRU (WORKSPACE_ENGINE_CACHE_SIZE) + ปิดทิ้งเมื่อไม่ได้ใช้นาน (WORKSPACE_ENGINE_IDLE_SECONDS)
+    - สร้าง schema ให้อัตโนมัติตอนเปิดร้านครั้งแรก (FK ที่ชี้ไปตารางกลางถูกตัดออก)
+    - catalog DB ถูก ATTACH เข้าทุก connection -> query ที่ join ตารางกลาง (เช่น platform_tier) ยังใช้ได้
+    """
+
+    def __init__(self, app):
+        cfg = app.config
+        catalog_url = make_url(cfg["SQLALCHEMY_DATABASE_URI"])
+        if catalog_url.get_backend_name() != "sqlite":
+            raise RuntimeError("STORAGE_MODE=per_workspace requires a SQLite catalog database")
+
+        self.catalog_path = os.path.abspath(catalog_url.database)
+        self.root = cfg.get("WORKSPACE_DB_DIR") or os.path.join(os.path.dirname(self.catalog_path), "workspaces")
+        self.max_engines = int(cfg.get("WORKSPACE_ENGINE_CACHE_SIZE", 128))
+        self.idle_seconds = float(cfg.get("WORKSPACE_ENGINE_IDLE_SECONDS", 300))
+        os.makedirs(self.root, exist_ok=True)
+
+        self._engines = OrderedDict()   # wsid -> (engine, last_used)
+        self._lock = threading.Lock()
+        self._tenant_metadata = None
+
+    # ---------- schema ----------
+    @property
+    def tenant_metadata(self) -> MetaData:
+        # สำเนา schema เฉพาะตารางของร้าน; ตัด FK ไปตารางกลางออก (ตารางนั้นไม่อยู่ในไฟล์นี้)
+        if self._tenant_metadata is None:
+            md = MetaData(naming_convention=db.metadata.naming_convention)
+            for table in db.metadata.sorted_tables:
+                if table.name not in GLOBAL_TABLES:
+                    table.to_metadata(md)
+            for table in md.tables.values():
+                for fk in list(table.foreign_key_constraints):
+                    if fk.elements[0].target_fullname.split(".")[0] in GLOBAL_TABLES:
+                        table.constraints.discard(fk)
+                        for el in fk.elements:
+                            el.parent.foreign_keys.discard(el)
+                            table.foreign_keys.discard(el)
+            self._tenant_metadata = md
+        return self._tenant_metadata
+
+    def db_path(self, workspace_id: int) -> str:
+        return os.path.join(self.root, f"ws_{int(workspace_id)}.db")
+
+    # ---------- engines ----------
+    def _create_engine(self, workspace_id: int):
+        engine = create_engine(
+            f"sqlite:///{self.db_path(workspace_id)}",
+            connect_args={"timeout": 30},
+        )
+        catalog_path = self.catalog_path
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            if isinstance(dbapi_connection, sqlite3.Connection):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL;")
+                cursor.execute("ATTACH DATABASE ? AS catalog", (catalog_path,))
+                cursor.close()
+
+        self.tenant_metadata.create_all(engine)
+        return engine
+
+    def engine(self, workspace_id: int):
+        wsid = int(workspace_id)
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            entry = self._engines.pop(wsid, None)
+            if entry is None:
+                entry = (self._create_engine(wsid), now)
+            self._engines[wsid] = (entry[0], now)   # ใช้ล่าสุด -> ท้าย OrderedDict
+
+            # ไล่ engine ที่ idle นาน / เกินขนาด LRU (เริ่มจากตัวที่ใช้ล่าสุดนานที่สุด)
+            while self._engines:
+                old_wsid, (old_engine, last_used) = next(iter(self._engines.items()))
+                if old_wsid == wsid:
+                    break
+                if len(self._engines) > self.max_engines or now - last_used > self.idle_seconds:
+                    del self._engines[old_wsid]
+                    evicted.append(old_engine)
+                else:
+                    break
+        for e in evicted:
+            e.dispose()
+        return entry[0]
+
+    def dispose_all(self):
+        with self._lock:
+            engines = [e for e, _ in self._engines.values()]
+            self._engines.clear()
+        for e in engines:
+            e.dispose()
+
+    # ---------- routing (เรียกจาก RoutingSession.get_bind) ----------
+    def _is_tenant(self, mapper, clause) -> bool:
+        if mapper is not None:
+            return sa_inspect(mapper).local_table.name not in GLOBAL_TABLES
+        if clause is not None:
+            return any(
+                getattr(t, "name", None) and t.name not in GLOBAL_TABLES
+                for t in find_tables(clause, include_crud=True)
+            )
+        return False
+
+    def engine_for(self, mapper=None, clause=None):
+        if not self._is_tenant(mapper, clause):
+            return None   # ตารางกลาง -> catalog (engine หลัก)
+        wsid = current_workspace_id()
+        if wsid is None:
+            raise RuntimeError("No workspace bound: per_workspace storage needs a JWT wsid or use_workspace()")
+        return self.engine(wsid)
+
+
+def init_workspace_storage(app):
+    if (app.config.get("STORAGE_MODE") or "shared").lower() != "per_workspace":
+        return None
+    storage = WorkspaceStorage(app)
+    app.extensions["workspace_storage"] = storage
+    return storage
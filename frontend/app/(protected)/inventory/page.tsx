@@ -2,7 +2,7 @@
 import useSWR from "swr";
 import { fetcher } from "@/lib/fetcher";
 import { useCallback, useState } from "react";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import AddButton from "@/components/PrimaryButton";
 import { headerColumns } from "@/constant";
 import { useRouter, usePathname } from "next/navigation";
@@ -43,7 +43,7 @@ export default function InventoryPage() {
 
   const handleDelete = async (id: number) => {
     try {
-      await axios.delete(`http://localhost:5001/api/inventory/${id}`);
+      await axiosInst.delete(`/api/inventory/${id}`);
       mutate(); // refresh data after delete
     } catch (error) {
       console.error("❌ Failed to delete:", error);
@@ -5,7 +5,7 @@ import { useParams } from "next/navigation";
 import Image from "next/image";
 import { DatePicker } from "@/components/DatePicker";
 import { salesOrderHeaderColumn } from "@/constant";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import Form from "@/feature/sale/component/Form";
 import Table from "@/feature/sale/component/Table";
 import { useRef, useState } from "react";
@@ -72,7 +72,7 @@ const StockInPage = () => {
   const handleDelete = async (id: number) => {
     console.log(id);
     try {
-      await axios.delete(`http://localhost:5001/api/sale/${id}`);
+      await axiosInst.delete(`/api/sale/${id}`);
       salesOrderMutate();
     } catch (error) {
       console.error("❌ Failed to delete:", error);
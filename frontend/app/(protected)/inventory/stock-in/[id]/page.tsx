@@ -1,5 +1,6 @@
 "use client";
 import useSWR from "swr";
+import useSWRInfinite from "swr/infinite";
 import { fetcher } from "@/lib/fetcher";
 import { useParams } from "next/navigation";
 import Image from "next/image";
@@ -7,11 +8,18 @@ import { DatePicker } from "@/components/DatePicker";
 import Form from "@/feature/stockIn/component/Form";
 import { stockInHeaderColumn } from "@/constant";
 import Table from "@/feature/stockIn/component/Table";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import BackButton from "@/components/BackButton";
 import { useRef, useState } from "react";
 import { scrollToFormTop } from "@/hooks/scrollToTop";
 
+type StockInHistoryPage = {
+  data: StockIn[];
+  pagination: { limit: number; next_cursor: string | null };
+};
+
+const STOCKIN_PAGE_SIZE = 50;
+
 const StockInPage = () => {
   const params = useParams<{ id: string }>();
   const [editingId, setEditingId] = useState<number | null>(null);
@@ -30,19 +38,33 @@ const StockInPage = () => {
     fetcher
   );
 
+  // ประวัติรับเข้าแบบแบ่งหน้า (cursor) : หน้าถัดไปโหลดเมื่อกด "โหลดเพิ่ม"
+  const getStockinKey = (
+    pageIndex: number,
+    previous: StockInHistoryPage | null
+  ) => {
+    if (!params?.id) return null;
+    if (previous && !previous.pagination.next_cursor) return null;
+    const base = `http://localhost:5001/api/stock-in/${params.id}?limit=${STOCKIN_PAGE_SIZE}`;
+    return pageIndex === 0 || !previous
+      ? base
+      : `${base}&cursor=${previous.pagination.next_cursor}`;
+  };
+
   const {
-    data: stockin,
+    data: stockinPages,
     error: stockinError,
     mutate: mutateStockin,
-  } = useSWR<StockIn[]>(
-    params?.id ? `http://localhost:5001/api/stock-in/${params.id}` : null,
-    fetcher,
-    {
-      revalidateOnFocus: false,
-      revalidateOnReconnect: false,
-      revalidateIfStale: false, // กด edit แล้วจะไม่ยิง GET เอง
-    }
-  );
+    size: stockinSize,
+    setSize: setStockinSize,
+  } = useSWRInfinite<StockInHistoryPage>(getStockinKey, fetcher, {
+    revalidateOnFocus: false,
+    revalidateOnReconnect: false,
+    revalidateIfStale: false, // กด edit แล้วจะไม่ยิง GET เอง
+  });
+  const stockin = stockinPages?.flatMap((page) => page.data);
+  const hasMoreStockin =
+    !!stockinPages?.[stockinPages.length - 1]?.pagination.next_cursor;
 
   const { data: stockinDetail } = useSWR<StockInDetail>(
     editingId ? `http://localhost:5001/api/stock-in/detail/${editingId}` : null,
@@ -65,7 +87,7 @@ const StockInPage = () => {
 
   const handleDelete = async (id: number) => {
     try {
-      await axios.delete(`http://localhost:5001/api/stock-in/${id}`);
+      await axiosInst.delete(`/api/stock-in/${id}`);
       mutateStockin();
     } catch (error) {
       console.error("❌ Failed to delete:", error);
@@ -164,6 +186,17 @@ const StockInPage = () => {
             ไม่มีสินค้าที่จะแสดง
           </div>
         )}
+        {hasMoreStockin && (
+          <div className="mt-3 flex justify-center">
+            <button
+              type="button"
+              onClick={() => setStockinSize(stockinSize + 1)}
+              className="rounded-lg border px-3 py-1.5 text-sm hover:bg-gray-50"
+            >
+              โหลดเพิ่ม
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -139,8 +139,8 @@ const Form = ({ mode, initialData }: Props) => {
         if (mode === "add") {
           await axiosInst.post("/api/inventory", formData);
         } else if (mode === "edit" && initialData?.id) {
-          await axios.patch(
-            `http://localhost:5001/api/inventory/${initialData.id}`,
+          await axiosInst.patch(
+            `/api/inventory/${initialData.id}`,
             formData
           );
         }
@@ -158,8 +158,8 @@ const Form = ({ mode, initialData }: Props) => {
     setModalState({ ...modalState, show: false });
 
     try {
-      await axios.delete(
-        `http://localhost:5001/api/inventory/variant/${modalState.variantId}`
+      await axiosInst.delete(
+        `/api/inventory/variant/${modalState.variantId}`
       );
       remove(modalState.variantIndex); // ลบออกจาก UI หลังจากลบจาก Backend สำเร็จ
     } catch (error) {
@@ -1,6 +1,6 @@
 import Modal from "@/components/Modal";
 import TextInput from "@/components/TextInput";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import { fetcher } from "@/lib/fetcher";
 import React, { useCallback } from "react";
 import { SubmitHandler, useForm } from "react-hook-form";
@@ -44,7 +44,7 @@ const ChannelModal = ({ isOpen, onClose, title, salesChannel }: Props) => {
     const formData = buildFormData(data);
 
     try {
-      await axios.post("http://localhost:5001/api/channel", formData);
+      await axiosInst.post("/api/channel", formData);
     } catch (error) {
       console.error("❌ Upload failed:", error);
     }
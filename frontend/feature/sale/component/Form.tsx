@@ -12,7 +12,7 @@ import { TimerOff } from "lucide-react";
 // import ToggleSwitchCard from "./ToggleSwitchCard";
 import ImageUploader from "@/components/ImageUploader";
 import TextArea from "@/components/TextArea";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import { formatISO } from "date-fns";
 import Modal from "@/components/Modal";
 import ChannelModal from "./ChannelModal";
@@ -149,15 +149,15 @@ const Form = ({
 
     try {
       if (editingId) {
-        await axios.patch(
-          `http://localhost:5001/api/sale/${editingId}`,
+        await axiosInst.patch(
+          `/api/sale/${editingId}`,
           formData
         );
         handleCancel();
         handleEdit(null);
       } else {
-        await axios.post(
-          `http://localhost:5001/api/sale/${product.id}`,
+        await axiosInst.post(
+          `/api/sale/${product.id}`,
           formData
         );
       }
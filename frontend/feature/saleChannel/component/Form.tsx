@@ -1,7 +1,7 @@
 "use client";
 import Modal from "@/components/Modal";
 import TextInput from "@/components/TextInput";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import { fetcher } from "@/lib/fetcher";
 import React, { useCallback, useState } from "react";
 import { SubmitHandler, useForm, Controller } from "react-hook-form";
@@ -40,7 +40,7 @@ const Form = () => {
   ) => {
     const formData = buildFormData(data);
     try {
-      await axios.post("http://localhost:5001/api/channel", formData);
+      await axiosInst.post("/api/channel", formData);
       reset();
     } catch (error) {
       console.error("❌ Upload failed:", error);
@@ -59,9 +59,7 @@ const Form = () => {
 
   const getPlatformTeir = async (platform: string) => {
     try {
-      const res = await axios.get(
-        `http://localhost:5001/api/platforms/${platform}`
-      );
+      const res = await axiosInst.get(`/api/platforms/${platform}`);
       setTiers(res.data); // เก็บ tiers ไว้ใช้ Step 2
     } catch (err) {
       console.error("Error fetching tiers", err);
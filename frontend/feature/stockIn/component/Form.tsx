@@ -14,7 +14,7 @@ import { TimerOff } from "lucide-react";
 import ToggleSwitchCard from "./ToggleSwitchCard";
 import ImageUploader from "@/components/ImageUploader";
 import TextArea from "@/components/TextArea";
-import axios from "axios";
+import { axiosInst } from "@/lib/api";
 import { formatISO, format } from "date-fns";
 import { fmtISODateOrNull, toIntOrNull, toIntOrZero } from "@/lib/format";
 import VariantField from "./VariantField";
@@ -207,14 +207,14 @@ const Form = ({
 
     try {
       if (editingId) {
-        await axios.patch(
-          `http://localhost:5001/api/stock-in/${editingId}`,
+        await axiosInst.patch(
+          `/api/stock-in/${editingId}`,
           formData
         );
         handleCancel();
         handleEdit(null);
       } else {
-        await axios.post("http://localhost:5001/api/stock-in", formData);
+        await axiosInst.post("/api/stock-in", formData);
       }
       reset();
       onSuccess();
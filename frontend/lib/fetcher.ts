@@ -1 +1,4 @@
-export const fetcher = (url: string) => fetch(url).then((res) => res.json());
+import { axiosInst } from "./api";
+
+// ผ่าน axiosInst -> แนบ Authorization + refresh token อัตโนมัติ (API ของข้อมูลร้านต้องมี JWT)
+export const fetcher = (url: string) => axiosInst.get(url).then((res) => res.data);